@@ -0,0 +1,272 @@
+"""
+Asyncio GitHub client with a pooled keep-alive HTTP connection.
+
+Mirrors the GitHubClient methods used by a run (status, create branch/PR/
+comment, close, delete branch) so a poll tick over N PRs, or the trigger
+comments of one PR, are issued concurrently instead of back to back. It shares
+the rate-limit governor and the conditional-request cache with the sync client.
+"""
+
+import base64
+import asyncio
+import logging
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+import aiohttp
+from github import GithubException
+
+from check_index import CheckResultIndex
+from github_client import add_empty_line
+from pr_status import PRStatus, checks_from_rest
+from rate_limiter import RateLimitGovernor, READ, WRITE, is_transient
+from rest_cache import API_URL, LINK_NEXT_RE, CacheEntry, ConditionalRequestCache
+
+
+def _is_transient_async(error: Exception) -> bool:
+    """aiohttp connection problems and timeouts are retried like their requests counterparts"""
+    return isinstance(error, (aiohttp.ClientError, asyncio.TimeoutError)) or is_transient(error)
+
+
+class AsyncGitHubClient:
+    """Concurrent GitHub REST client; use as an async context manager or call close()"""
+
+    def __init__(self, token: str, username: str, repo_owner: str, repo_name: str, fork_full_name: str,
+                 concurrency: int = 10, governor: Optional[RateLimitGovernor] = None,
+                 cache: Optional[ConditionalRequestCache] = None, index: Optional[CheckResultIndex] = None,
+                 base_branch: str = 'master'):
+        self.username = username
+        self.repo_owner = repo_owner
+        self.repo_name = repo_name
+        self.fork_full_name = fork_full_name
+        self.base_branch = base_branch
+        self.concurrency = concurrency
+        self.governor = governor or RateLimitGovernor()
+        self.cache = cache or ConditionalRequestCache()
+        self.index = index or CheckResultIndex()
+        self.headers = {
+            'Authorization': f'token {token}',
+            'Accept': 'application/vnd.github+json'
+        }
+        self.session = None
+        self.semaphore = None
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_client(cls, github_client, concurrency: int = 10) -> 'AsyncGitHubClient':
+        """Build an async client sharing a GitHubClient's token, governor and cache"""
+        return cls(
+            github_client.token,
+            github_client.username,
+            github_client.repo_owner,
+            github_client.repo_name,
+            github_client.fork_full_name,
+            concurrency=concurrency,
+            governor=github_client.governor,
+            cache=github_client.rest.cache,
+            index=github_client.check_index,
+            base_branch=github_client.base_branch
+        )
+
+    async def __aenter__(self) -> 'AsyncGitHubClient':
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def _ensure_session(self):
+        """Open the pooled session lazily, inside the running event loop"""
+        if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(limit=self.concurrency, keepalive_timeout=60)
+            self.session = aiohttp.ClientSession(connector=connector, headers=self.headers)
+            self.semaphore = asyncio.Semaphore(self.concurrency)
+
+    async def close(self):
+        """Close the connection pool"""
+        if self.session is not None and not self.session.closed:
+            await self.session.close()
+
+    async def _send(self, method: str, url: str, payload: Optional[Dict]) -> Tuple[Any, Optional[str]]:
+        """Send one request (conditional for GETs) and return (body, next page URL)"""
+        headers = {}
+        cached = self.cache.get(url) if method == 'GET' else None
+        if cached is not None:
+            if cached.etag:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                headers['If-Modified-Since'] = cached.last_modified
+
+        async with self.semaphore:
+            async with self.session.request(method, url, json=payload, headers=headers) as response:
+                self.governor.update(response.headers, response.status)
+
+                if response.status == 304 and cached is not None:
+                    self.cache.record_hit()
+                    return cached.body, cached.next_url
+
+                if response.status >= 400:
+                    raise GithubException(response.status, await response.text(), dict(response.headers))
+
+                body = await response.json(content_type=None) if response.status != 204 else None
+                if method != 'GET':
+                    return body, None
+
+                self.cache.record_miss()
+                link = LINK_NEXT_RE.search(response.headers.get('Link', ''))
+                entry = CacheEntry(
+                    body=body,
+                    etag=response.headers.get('ETag'),
+                    last_modified=response.headers.get('Last-Modified'),
+                    next_url=link.group(1) if link else None
+                )
+                if entry.etag or entry.last_modified:
+                    self.cache.put(url, entry)
+                return entry.body, entry.next_url
+
+    async def _request(self, method: str, url: str, payload: Optional[Dict] = None) -> Tuple[Any, Optional[str]]:
+        """Send a request under the governor, with the same retry policy as the sync client"""
+        self._ensure_session()
+        path = READ if method == 'GET' else WRITE
+        for attempt in range(self.governor.max_retries):
+            await asyncio.sleep(self.governor.schedule('core', path))
+            try:
+                return await self._send(method, url, payload)
+            except Exception as e:
+                backoff = self.governor.on_error(e, 'core', path, attempt, _is_transient_async)
+                if backoff is None:
+                    raise
+                await asyncio.sleep(backoff)
+
+    async def _get_json(self, path: str) -> Any:
+        body, _ = await self._request('GET', f"{API_URL}{path}")
+        return body
+
+    async def _get_paginated(self, path: str, items_key: Optional[str] = None) -> List:
+        separator = '&' if '?' in path else '?'
+        url = f"{API_URL}{path}{separator}per_page=100"
+        items = []
+        while url:
+            body, url = await self._request('GET', url)
+            items.extend(body[items_key] if items_key else body)
+        return items
+
+    async def get_latest_base_sha(self) -> str:
+        """Get the latest commit SHA from the base branch"""
+        base_branch = await self._get_json(f"/repos/{self.repo_owner}/{self.repo_name}/branches/{self.base_branch}")
+        return base_branch['commit']['sha']
+
+    async def get_makefile_content(self) -> str:
+        """Get the current Makefile content from the base branch"""
+        makefile = await self._get_json(
+            f"/repos/{self.repo_owner}/{self.repo_name}/contents/Makefile?ref={self.base_branch}"
+        )
+        return base64.b64decode(makefile['content']).decode('utf-8')
+
+    async def create_branch(self, branch_name: str, base_sha: str) -> bool:
+        """Create a new branch from base_sha in fork"""
+        try:
+            await self._request('POST', f"{API_URL}/repos/{self.fork_full_name}/git/refs",
+                                {'ref': f"refs/heads/{branch_name}", 'sha': base_sha})
+            self.logger.info(f"Created branch: {branch_name}")
+            return True
+        except GithubException as e:
+            self.logger.error(f"Failed to create branch {branch_name}: {e}")
+            return False
+
+    async def update_makefile(self, branch_name: str, content: str) -> bool:
+        """Update Makefile by adding an empty line at the end"""
+        try:
+            content = add_empty_line(content)
+            contents_path = f"/repos/{self.fork_full_name}/contents/Makefile"
+            current = await self._get_json(f"{contents_path}?ref={branch_name}")
+            await self._request('PUT', f"{API_URL}{contents_path}", {
+                'message': f"Add empty line for stability test - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
+                'content': base64.b64encode(content.encode('utf-8')).decode('ascii'),
+                'sha': current['sha'],
+                'branch': branch_name
+            })
+            self.logger.info(f"Updated Makefile in branch: {branch_name}")
+            return True
+        except GithubException as e:
+            self.logger.error(f"Failed to update Makefile in branch {branch_name}: {e}")
+            return False
+
+    async def create_pull_request(self, branch_name: str, title: str, body: str) -> Optional[int]:
+        """Create a pull request and return its number"""
+        try:
+            pr, _ = await self._request('POST', f"{API_URL}/repos/{self.repo_owner}/{self.repo_name}/pulls", {
+                'title': title,
+                'body': body,
+                'head': f"{self.username}:{branch_name}",
+                'base': self.base_branch
+            })
+            self.logger.info(f"Created PR #{pr['number']}: {title}")
+            return pr['number']
+        except GithubException as e:
+            self.logger.error(f"Failed to create PR for branch {branch_name}: {e}")
+            return None
+
+    async def get_pr_snapshot(self, pr_number: int) -> PRStatus:
+        """Fetch PR status including CI checks as an immutable snapshot"""
+        try:
+            repo_path = f"/repos/{self.repo_owner}/{self.repo_name}"
+            pr = await self._get_json(f"{repo_path}/pulls/{pr_number}")
+            head_sha = pr['head']['sha']
+
+            check_runs, status_checks = await asyncio.gather(
+                self._get_paginated(f"{repo_path}/commits/{head_sha}/check-runs", items_key='check_runs'),
+                self._get_paginated(f"{repo_path}/commits/{head_sha}/statuses")
+            )
+            return PRStatus.build(
+                pr_number,
+                pr['state'],
+                self.index.observe(pr_number, head_sha, checks_from_rest(check_runs, status_checks)),
+                merged=pr['merged'],
+                head_sha=head_sha,
+                mergeable=pr.get('mergeable'),
+                mergeable_state=pr.get('mergeable_state')
+            )
+        except Exception as e:
+            self.logger.error(f"Failed to get PR #{pr_number} status: {e}")
+            return PRStatus.unknown(pr_number)
+
+    async def get_pr_snapshots(self, pr_numbers: List[int]) -> Dict[int, PRStatus]:
+        """Fetch snapshots for all PRs concurrently"""
+        snapshots = await asyncio.gather(*(self.get_pr_snapshot(pr_number) for pr_number in pr_numbers))
+        return dict(zip(pr_numbers, snapshots))
+
+    async def close_pull_request(self, pr_number: int) -> bool:
+        """Close a pull request"""
+        try:
+            await self._request('PATCH', f"{API_URL}/repos/{self.repo_owner}/{self.repo_name}/pulls/{pr_number}",
+                                {'state': 'closed'})
+            self.logger.info(f"Closed PR #{pr_number}")
+            return True
+        except GithubException as e:
+            self.logger.error(f"Failed to close PR #{pr_number}: {e}")
+            return False
+
+    async def create_pr_comment(self, pr_number: int, comment: str) -> bool:
+        """Create a comment on a pull request"""
+        try:
+            await self._request('POST', f"{API_URL}/repos/{self.repo_owner}/{self.repo_name}/issues/{pr_number}/comments",
+                                {'body': comment})
+            self.logger.info(f"Created comment on PR #{pr_number}: {comment}")
+            return True
+        except GithubException as e:
+            self.logger.error(f"Failed to create comment on PR #{pr_number}: {e}")
+            return False
+
+    async def create_pr_comments(self, pr_number: int, comments: List[str]) -> List[bool]:
+        """Create several comments on a pull request concurrently"""
+        return list(await asyncio.gather(*(self.create_pr_comment(pr_number, comment) for comment in comments)))
+
+    async def delete_branch(self, branch_name: str) -> bool:
+        """Delete a branch from fork"""
+        try:
+            await self._request('DELETE', f"{API_URL}/repos/{self.fork_full_name}/git/refs/heads/{branch_name}")
+            self.logger.info(f"Deleted branch: {branch_name}")
+            return True
+        except GithubException as e:
+            self.logger.error(f"Failed to delete branch {branch_name}: {e}")
+            return False
@@ -4,8 +4,10 @@ Check detailed failure information for a specific PR
 """
 
 import os
+import sys
 from dotenv import load_dotenv
 from github_client import GitHubClient
+from failure_logs import FailureLogAnalyzer
 
 def check_detailed_failure(pr_number: int):
     """Check detailed failure information for a PR"""
@@ -58,6 +60,8 @@ def check_detailed_failure(pr_number: int):
                        if check['status'] == 'completed' and check['conclusion'] not in ['success', 'skipped']]
         
         if failed_tests:
+            # None when FAILURE_LOG_ANALYSIS_ENABLED is off: no build logs are fetched then
+            analyzer = FailureLogAnalyzer.from_env()
             print("FAILED TESTS SUMMARY:")
             print("=" * 30)
             for check in failed_tests:
@@ -66,11 +70,18 @@ def check_detailed_failure(pr_number: int):
                     print(f"   Details: {check['description']}")
                 if 'target_url' in check and check['target_url']:
                     print(f"   URL: {check['target_url']}")
+                
+                # Error signatures from the build log (served from the log cache if fetched before)
+                if analyzer:
+                    failure = analyzer.analyze_check(pr_number, check)
+                    if failure.fetched:
+                        for signature in failure.signatures or ['no error signature found']:
+                            print(f"   Log: {signature}")
                 print()
         
     except Exception as e:
         print(f"Error checking PR #{pr_number}: {e}")
 
 if __name__ == "__main__":
-    # Check one of yesterday's failed PRs
-    check_detailed_failure(1703)
+    # Check one of yesterday's failed PRs (or the PR given on the command line)
+    check_detailed_failure(int(sys.argv[1]) if len(sys.argv) > 1 else 1703)
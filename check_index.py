@@ -0,0 +1,95 @@
+"""
+Per-(head SHA, check name) index of CI check results.
+
+Once a check reaches `completed` on a given head SHA its result cannot change,
+so it is frozen here and pollers only ask GitHub for the checks still in
+progress. A retest of a frozen check has to unfreeze it first; a full fetch
+showing a later run of a frozen check (e.g. a /retest issued by hand)
+unfreezes it too.
+"""
+
+import threading
+from dataclasses import dataclass
+from types import MappingProxyType
+from typing import Iterable, List, Mapping, Optional
+
+
+def supersedes(fresh: Mapping, frozen: Mapping) -> bool:
+    """True if a freshly fetched check is a later run than its frozen result"""
+    for key in ('started_at', 'completed_at'):
+        if fresh.get(key) and frozen.get(key):
+            return fresh[key] > frozen[key]
+    # Not started yet (a rerun is queued), or a commit status, which has no start time: the API reports the
+    # latest run, so an unfinished one after a completed one is a retest
+    return fresh['status'] != 'completed'
+
+
+@dataclass(frozen=True)
+class PollPlan:
+    """What an incremental poll of one PR needs to ask for"""
+    head_sha: str
+    known_count: int
+    pending_status_checks: List[str]
+    pending_check_runs: List[str]
+
+
+class CheckResultIndex:
+    """Freezes concluded checks per head SHA and tracks the ones still running"""
+
+    def __init__(self):
+        self.heads = {}
+        self.frozen = {}
+        self.pending = {}
+        self.order = {}
+        self.lock = threading.Lock()
+
+    def observe(self, pr_number: int, head_sha: str, checks: Iterable[Mapping]) -> List[Mapping]:
+        """Merge fresh checks for a head SHA and return the full check list (frozen results win unless a check
+        was run again since)"""
+        with self.lock:
+            self.heads[pr_number] = head_sha
+            frozen = self.frozen.setdefault(head_sha, {})
+            pending = self.pending.setdefault(head_sha, {})
+            order = self.order.setdefault(head_sha, [])
+
+            for check in checks:
+                name = check['name']
+                if name in frozen:
+                    if not supersedes(check, frozen[name]):
+                        continue
+                    del frozen[name]
+                if name not in order:
+                    order.append(name)
+                if check['status'] == 'completed':
+                    frozen[name] = MappingProxyType(dict(check))
+                    pending.pop(name, None)
+                else:
+                    pending[name] = MappingProxyType(dict(check))
+
+            return [frozen.get(name) or pending[name] for name in order if name in frozen or name in pending]
+
+    def plan(self, pr_number: int) -> Optional[PollPlan]:
+        """Return an incremental poll plan, or None when the PR needs a full fetch"""
+        with self.lock:
+            head_sha = self.heads.get(pr_number)
+            if head_sha is None:
+                return None
+            pending = self.pending.get(head_sha, {})
+            return PollPlan(
+                head_sha=head_sha,
+                known_count=len(self.frozen.get(head_sha, {})) + len(pending),
+                pending_status_checks=[name for name, check in pending.items() if check['type'] == 'status_check'],
+                pending_check_runs=[name for name, check in pending.items() if check['type'] == 'check_run']
+            )
+
+    def unfreeze(self, head_sha: str, name: str):
+        """Forget a frozen result so the next poll fetches it again (e.g. after a retest)"""
+        with self.lock:
+            check = self.frozen.get(head_sha, {}).pop(name, None)
+            if check is not None:
+                self.pending.setdefault(head_sha, {})[name] = check
+
+    def frozen_count(self) -> int:
+        """Number of frozen results across all head SHAs"""
+        with self.lock:
+            return sum(len(checks) for checks in self.frozen.values())
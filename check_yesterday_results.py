@@ -4,11 +4,13 @@ Check yesterday's PR test results
 """
 
 import os
+import sys
 from dotenv import load_dotenv
 from github_client import GitHubClient
+from run_ledger import RunLedger
 
-def check_yesterday_results():
-    """Check yesterday's PR test results"""
+def check_yesterday_results(run_id=None):
+    """Check the PR test results of a run (default: the latest run in the ledger)"""
     load_dotenv('config.env')
     
     github_client = GitHubClient(
@@ -18,8 +20,15 @@ def check_yesterday_results():
         repo_name=os.getenv('REPO_NAME')
     )
     
-    # Yesterday's PR numbers (from the log)
-    pr_numbers = [1703, 1704, 1705, 1706, 1707, 1708, 1709, 1710, 1711, 1712]
+    # PR numbers of the run, from the run ledger
+    ledger = RunLedger(os.getenv('LEDGER_PATH', 'stability_ledger.db'))
+    if run_id is None:
+        run_id = ledger.latest_run_id()
+    if run_id is None:
+        print("No runs recorded in the ledger")
+        return
+    pr_numbers = [run.pr_number for run in ledger.load_prs(run_id)]
+    print(f"Run {run_id}: {len(pr_numbers)} PRs")
     
     print("=" * 60)
     print("Yesterday's PR Test Results")
@@ -33,8 +42,9 @@ def check_yesterday_results():
         print(f"\nChecking PR #{pr_number}...")
         
         try:
-            # Get PR status
-            status = github_client.get_pr_status(pr_number)
+            # Get PR status (one fetch, evaluated locally below)
+            snapshot = github_client.get_pr_snapshot(pr_number)
+            status = snapshot.to_dict()
             
             print(f"  State: {status['state']}")
             print(f"  Merged: {status['merged']}")
@@ -56,8 +66,8 @@ def check_yesterday_results():
                 failed_prs.append(pr_number)
             elif status['state'] == 'open':
                 # Check if tests are complete
-                if github_client.is_pr_tests_complete(pr_number):
-                    if github_client.are_pr_tests_passed(pr_number):
+                if github_client.is_pr_tests_complete(pr_number, snapshot):
+                    if github_client.are_pr_tests_passed(pr_number, snapshot):
                         print(f"  ✅ Tests PASSED")
                         passed_count += 1
                     else:
@@ -95,4 +105,4 @@ def check_yesterday_results():
             print(f"  https://github.com/pingcap/ticdc/pull/{pr_number}")
 
 if __name__ == "__main__":
-    check_yesterday_results()
+    check_yesterday_results(int(sys.argv[1]) if len(sys.argv) > 1 else None)
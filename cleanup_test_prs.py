@@ -4,11 +4,13 @@ Clean up test PRs created during testing
 """
 
 import os
+import sys
 from dotenv import load_dotenv
 from github_client import GitHubClient
+from run_ledger import RunLedger
 
-def cleanup_test_prs():
-    """Clean up test PRs"""
+def cleanup_test_prs(run_id=None):
+    """Clean up test PRs: every PR of run_id, or the passed PRs of all runs that were never cleaned up"""
     load_dotenv('config.env')
     
     github_client = GitHubClient(
@@ -18,16 +20,14 @@ def cleanup_test_prs():
         repo_name=os.getenv('REPO_NAME')
     )
     
-    # Test PRs to clean up
-    test_prs = [
-        (1716, "test-staggered-20250821_201713-hgrvgh"),
-        (1717, "test-staggered-20250821_201817-wgkyys"),
-        (1718, "test-staggered-20250821_201923-lrmqmx")
-    ]
+    # Test PRs to clean up, from the run ledger
+    ledger = RunLedger(os.getenv('LEDGER_PATH', 'stability_ledger.db'))
+    test_prs = ledger.prs_to_clean_up(run_id)
     
-    print("Cleaning up test PRs...")
+    print(f"Cleaning up {len(test_prs)} test PRs...")
     
-    for pr_number, branch_name in test_prs:
+    for pr in test_prs:
+        pr_number, branch_name = pr['pr_number'], pr['branch_name']
         print(f"Cleaning up PR #{pr_number}...")
         
         try:
@@ -38,6 +38,7 @@ def cleanup_test_prs():
                 # Delete branch
                 if github_client.delete_branch(branch_name):
                     print(f"✅ Deleted branch {branch_name}")
+                    ledger.mark_cleaned_up(pr['run_id'], pr_number)
                 else:
                     print(f"❌ Failed to delete branch {branch_name}")
             else:
@@ -49,4 +50,4 @@ def cleanup_test_prs():
     print("Cleanup completed!")
 
 if __name__ == "__main__":
-    cleanup_test_prs()
+    cleanup_test_prs(int(sys.argv[1]) if len(sys.argv) > 1 else None)
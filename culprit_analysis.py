@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Culprit-commit correlation across runs.
+
+Every PR is branched from the base (master) SHA of its run, and the results
+warehouse records it with each check result. Per job of one repository's
+base branch (SHAs of different branches are not one history), the base SHAs
+are put in the order they were first run and every split point of that
+sequence is tested: the first-attempt failure rates before and after it are
+compared with a two-proportion z-test. The strongest split where the rate
+rose significantly names a commit range, (last SHA before, first SHA after]:
+the failure came in with one of those commits.
+
+The commit list of a range is fetched once through the compare API and kept
+in an on-disk JSON cache (a range between two fixed SHAs never changes);
+the PR numbers in the commit messages ('title (#1234)', 'Merge pull request
+#1234') are the likely culprits.
+
+    python culprit_analysis.py [days]   (for REPO_OWNER/REPO_NAME@BASE_BRANCH)
+"""
+
+import os
+import re
+import sys
+import json
+import math
+import logging
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from results_warehouse import ResultsWarehouse
+
+PR_REFERENCE_RE = re.compile(r'\(#(\d+)\)|Merge pull request #(\d+)')
+
+
+def referenced_prs(message: str) -> List[int]:
+    """PR numbers a commit message refers to (squash-merge '(#N)' suffixes, merge commits)"""
+    return [int(squash or merge) for squash, merge in PR_REFERENCE_RE.findall(message)]
+
+
+@dataclass
+class FailureJump:
+    """A job whose failure rate rose between two consecutive base SHAs it ran on"""
+    name: str
+    good_sha: str
+    bad_sha: str
+    runs_before: int
+    failures_before: int
+    runs_after: int
+    failures_after: int
+    z: float
+    commits: List[Dict] = field(default_factory=list)
+    total_commits: Optional[int] = None
+
+    @property
+    def rate_before(self) -> float:
+        return self.failures_before / self.runs_before
+
+    @property
+    def rate_after(self) -> float:
+        return self.failures_after / self.runs_after
+
+    @property
+    def culprit_prs(self) -> List[int]:
+        return list(dict.fromkeys(number for commit in self.commits for number in referenced_prs(commit['message'])))
+
+
+def find_jumps(results: List[Dict], min_runs: int = 5, z_threshold: float = 2.58,
+               min_increase: float = 0.2) -> List[FailureJump]:
+    """Strongest significant failure-rate rise per job, from ResultsWarehouse.base_sha_results rows, strongest first"""
+    per_job: Dict[str, List[Tuple[str, int, int]]] = {}
+    for row in results:
+        per_job.setdefault(row['name'], []).append((row['base_sha'], row['failed'], row['total']))
+
+    jumps = []
+    for name, shas in per_job.items():
+        total_failures = sum(failed for sha, failed, total in shas)
+        total_runs = sum(total for sha, failed, total in shas)
+        best = None
+        failures_before = runs_before = 0
+        for index in range(1, len(shas)):
+            failures_before += shas[index - 1][1]
+            runs_before += shas[index - 1][2]
+            failures_after = total_failures - failures_before
+            runs_after = total_runs - runs_before
+            if runs_before < min_runs or runs_after < min_runs:
+                continue
+            before, after = failures_before / runs_before, failures_after / runs_after
+            pooled = total_failures / total_runs
+            if after - before < min_increase or pooled in (0, 1):
+                continue
+            z = (after - before) / math.sqrt(pooled * (1 - pooled) * (1 / runs_before + 1 / runs_after))
+            if z >= z_threshold and (best is None or z > best.z):
+                best = FailureJump(name, shas[index - 1][0], shas[index][0], runs_before, failures_before,
+                                   runs_after, failures_after, z)
+        if best:
+            jumps.append(best)
+    jumps.sort(key=lambda jump: jump.z, reverse=True)
+    return jumps
+
+
+class CommitRangeCache:
+    """JSON file of commit lists per repo and base...head range (a range between fixed SHAs never changes)"""
+
+    def __init__(self, path: str = '.commit_range_cache.json'):
+        self.path = path
+        self.logger = logging.getLogger(__name__)
+
+    def _load(self) -> Dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _key(repo: str, base_sha: str, head_sha: str) -> str:
+        return f"{repo}:{base_sha}...{head_sha}"
+
+    def get(self, repo: str, base_sha: str, head_sha: str) -> Optional[Dict]:
+        return self._load().get(self._key(repo, base_sha, head_sha))
+
+    def put(self, repo: str, base_sha: str, head_sha: str, commits: List[Dict], total_commits: int):
+        """Store a range (written atomically)"""
+        entries = self._load()
+        entries[self._key(repo, base_sha, head_sha)] = {'commits': commits, 'total_commits': total_commits}
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(entries, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            self.logger.warning(f"Could not write commit range cache {self.path}: {e}")
+
+
+class CulpritAnalyzer:
+    """Finds failure-rate jumps of one repo's base branch and the commits (and PRs) that came in with them"""
+
+    def __init__(self, warehouse: ResultsWarehouse, repo: str, base_branch: str, github_client=None,
+                 cache: Optional[CommitRangeCache] = None, min_runs: int = 5, z_threshold: float = 2.58,
+                 prefix: str = 'pull-cdc-'):
+        self.warehouse = warehouse
+        self.repo = repo
+        self.base_branch = base_branch
+        self.github_client = github_client
+        self.cache = cache or CommitRangeCache()
+        self.min_runs = min_runs
+        self.z_threshold = z_threshold
+        self.prefix = prefix
+        self.logger = logging.getLogger(__name__)
+
+    def commit_range(self, good_sha: str, bad_sha: str) -> Tuple[List[Dict], Optional[int]]:
+        """Commits after good_sha up to bad_sha, from the cache or fetched once"""
+        cached = self.cache.get(self.repo, good_sha, bad_sha)
+        if cached is not None:
+            return cached['commits'], cached['total_commits']
+        if self.github_client is None:
+            return [], None
+        commits, total_commits = self.github_client.compare_commits(good_sha, bad_sha)
+        self.cache.put(self.repo, good_sha, bad_sha, commits, total_commits)
+        return commits, total_commits
+
+    def analyze(self, days: int = 14) -> List[FailureJump]:
+        """Failure-rate jumps of the last days with the commits of their ranges"""
+        results = self.warehouse.base_sha_results(self.repo, self.base_branch, days, self.prefix)
+        jumps = find_jumps(results, self.min_runs, self.z_threshold)
+        for jump in jumps:
+            try:
+                jump.commits, jump.total_commits = self.commit_range(jump.good_sha, jump.bad_sha)
+            except Exception as e:
+                self.logger.warning(f"Could not fetch commits {jump.good_sha[:8]}...{jump.bad_sha[:8]}: {e}")
+        return jumps
+
+
+def format_jumps(jumps: List[FailureJump], days: int) -> str:
+    """Plain-text culprit report for logs and notifications"""
+    if not jumps:
+        return f"Likely culprits (last {days} days): no job's failure rate jumped between base commits"
+    lines = [f"Likely culprits (last {days} days, jobs whose failure rate jumped between base commits):"]
+    for jump in jumps:
+        line = (f"  {jump.name}: {jump.rate_before:.0%} -> {jump.rate_after:.0%} failed "
+                f"after {jump.good_sha[:8]}..{jump.bad_sha[:8]}")
+        if jump.total_commits is not None:
+            line += f" ({jump.total_commits} commit{'s' if jump.total_commits != 1 else ''})"
+        lines.append(line)
+        if jump.culprit_prs:
+            lines.append("    PRs: " + ', '.join(f"#{number}" for number in jump.culprit_prs))
+        elif jump.commits:
+            lines.append("    Commits: " + ', '.join(commit['sha'][:8] for commit in jump.commits))
+        if jump.total_commits is not None and jump.total_commits > len(jump.commits):
+            lines.append(f"    (only the first {len(jump.commits)} commits listed)")
+    return '\n'.join(lines)
+
+
+def main():
+    """Print failure-rate jumps and their likely culprit PRs (GitHub is only asked for uncached commit ranges)"""
+    load_dotenv('config.env')
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 14
+    warehouse = ResultsWarehouse(os.getenv('WAREHOUSE_PATH', 'stability_results.db'))
+
+    github_client = None
+    if os.getenv('GITHUB_TOKEN'):
+        from github_client import GitHubClient
+        github_client = GitHubClient(
+            token=os.getenv('GITHUB_TOKEN'),
+            username=os.getenv('GITHUB_USERNAME'),
+            repo_owner=os.getenv('REPO_OWNER'),
+            repo_name=os.getenv('REPO_NAME')
+        )
+
+    repo = f"{os.getenv('REPO_OWNER')}/{os.getenv('REPO_NAME')}"
+    analyzer = CulpritAnalyzer(warehouse, repo, os.getenv('BASE_BRANCH', 'master'), github_client,
+                               CommitRangeCache(os.getenv('COMMIT_RANGE_CACHE_PATH', '.commit_range_cache.json')),
+                               min_runs=int(os.getenv('CULPRIT_MIN_RUNS', 5)),
+                               z_threshold=float(os.getenv('CULPRIT_Z_THRESHOLD', 2.58)))
+    print(format_jumps(analyzer.analyze(days), days))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Per-job duration history, predictions and deadlines.
+
+Durations are measured the way a run experiences them: from the PR's trigger
+time to the job's completion, taken from the ledger's check observations of
+earlier runs (results of retested jobs are left out). Predictions are
+duration quantiles per job, from the trigger's time-of-day bucket when that
+bucket has enough history (CI is slower at busy hours), else from all of it.
+
+A job's deadline is a high quantile of its history times a safety factor; a
+job still unfinished past its deadline is considered hung. Jobs with too
+little history get no deadline and only the global TEST_TIMEOUT_HOURS applies
+to them.
+"""
+
+import os
+import math
+import logging
+from dataclasses import replace
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from pr_status import PRStatus, FINISHED_STATUSES, pull_checks
+
+HUNG_CONCLUSION = 'timed_out'
+
+
+def quantile(values: List[float], q: float) -> float:
+    """Linear-interpolated quantile of values (0 <= q <= 1)"""
+    ordered = sorted(values)
+    position = (len(ordered) - 1) * q
+    lower = math.floor(position)
+    upper = math.ceil(position)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class DurationModel:
+    """Historical trigger-to-completion durations per job name, bucketed by trigger time of day"""
+
+    def __init__(self, samples: Optional[Dict[str, List[Tuple[float, int]]]] = None, bucket_hours: int = 6,
+                 min_bucket_samples: int = 5):
+        # Job name -> [(seconds, hour of day the PR was triggered)]
+        self.samples = samples or {}
+        self.bucket_hours = bucket_hours
+        self.min_bucket_samples = min_bucket_samples
+
+    @classmethod
+    def from_ledger(cls, ledger, days: int = 30, **kwargs) -> 'DurationModel':
+        """Build the model from the last days of check observations in a RunLedger"""
+        since = datetime.now() - timedelta(days=days)
+        samples = {}
+        for name, triggered_at, completed_at in ledger.job_completions(since):
+            # Ledger times are local, check timestamps are UTC (both naive)
+            seconds = (completed_at - triggered_at.astimezone(timezone.utc).replace(tzinfo=None)).total_seconds()
+            if seconds > 0:
+                samples.setdefault(name, []).append((seconds, triggered_at.hour))
+        return cls(samples, **kwargs)
+
+    def sample_count(self, name: str) -> int:
+        return len(self.samples.get(name, []))
+
+    def durations(self, name: str, at: Optional[datetime] = None) -> List[float]:
+        """Past durations of a job: those triggered in the same time-of-day bucket as at, if there are enough"""
+        samples = self.samples.get(name, [])
+        if at is not None:
+            bucket = at.hour // self.bucket_hours
+            in_bucket = [seconds for seconds, hour in samples if hour // self.bucket_hours == bucket]
+            if len(in_bucket) >= self.min_bucket_samples:
+                return in_bucket
+        return [seconds for seconds, hour in samples]
+
+    def quantile(self, name: str, q: float, at: Optional[datetime] = None) -> Optional[float]:
+        """Duration quantile of a job in seconds (for a trigger at a time of day), or None without history"""
+        values = self.durations(name, at)
+        return quantile(values, q) if values else None
+
+    def predict(self, name: str, at: Optional[datetime] = None,
+                quantiles: Iterable[float] = (0.5, 0.9)) -> Optional[Dict[float, timedelta]]:
+        """Predicted duration quantiles of a job triggered at at, or None without history"""
+        values = self.durations(name, at)
+        if not values:
+            return None
+        return {q: timedelta(seconds=quantile(values, q)) for q in quantiles}
+
+
+class JobDeadlines:
+    """Deadlines of p(quantile) x factor per job, measured from the PR's trigger time"""
+
+    def __init__(self, model: DurationModel, factor: float = 1.5, quantile: float = 0.99, min_samples: int = 5):
+        self.model = model
+        self.factor = factor
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_env(cls, ledger) -> 'JobDeadlines':
+        """Deadlines from the ledger history, configured by the JOB_DEADLINE_* settings"""
+        model = DurationModel.from_ledger(
+            ledger,
+            days=int(os.getenv('DURATION_HISTORY_DAYS', 30)),
+            bucket_hours=int(os.getenv('DURATION_BUCKET_HOURS', 6)),
+            min_bucket_samples=int(os.getenv('JOB_DEADLINE_MIN_SAMPLES', 5))
+        )
+        return cls(
+            model,
+            factor=float(os.getenv('JOB_DEADLINE_FACTOR', 1.5)),
+            quantile=float(os.getenv('JOB_DEADLINE_QUANTILE', 0.99)),
+            min_samples=int(os.getenv('JOB_DEADLINE_MIN_SAMPLES', 5))
+        )
+
+    def deadline(self, name: str) -> Optional[timedelta]:
+        """How long after the trigger the job may take, or None with too little history"""
+        if self.model.sample_count(name) < self.min_samples:
+            return None
+        return timedelta(seconds=self.model.quantile(name, self.quantile) * self.factor)
+
+    def deadlines(self, names: Iterable[str]) -> Dict[str, timedelta]:
+        """Deadlines of the jobs that have one"""
+        return {name: deadline for name, deadline in ((name, self.deadline(name)) for name in names) if deadline}
+
+    def overdue(self, status: PRStatus, expected: Optional[List[str]], elapsed: timedelta) -> List[str]:
+        """Jobs still unfinished (or never reported) elapsed after the trigger, past their deadline"""
+        finished = {check['name'] for check in pull_checks(status, expected) if check['status'] in FINISHED_STATUSES}
+        names = expected if expected is not None else [check['name'] for check in pull_checks(status)]
+        return [name for name, deadline in self.deadlines(names).items()
+                if name not in finished and elapsed > deadline]
+
+    def give_up(self, status: PRStatus, hung: List[str], elapsed: timedelta) -> PRStatus:
+        """The snapshot with hung jobs concluded as timed out, so the PR can conclude without them"""
+        description = f"Hung: no result {elapsed.total_seconds() / 60:.0f} minutes after trigger"
+        checks = [dict(check, status='completed', conclusion=HUNG_CONCLUSION, description=description)
+                  if check['name'] in hung else check for check in status.checks]
+        reported = {check['name'] for check in status.checks}
+        checks += [{'name': name, 'status': 'completed', 'conclusion': HUNG_CONCLUSION, 'started_at': None,
+                    'completed_at': None, 'type': 'status_check', 'description': description, 'target_url': None}
+                   for name in hung if name not in reported]
+        return replace(status, checks=PRStatus.build(status.pr_number, status.state, checks).checks)
@@ -0,0 +1,241 @@
+"""
+Build-log fetching and failure-signature clustering.
+
+For every failed check the build log behind its target_url is fetched (Prow
+job pages map to their build-log.txt, Jenkins builds to consoleText) and
+scanned for error signatures:
+
+- panics, with the top frames of the panicking goroutine's stack
+- failing cases (Go '--- FAIL:' tests, integration 'run test case X failed')
+- timeouts
+
+Signatures are normalized (timestamps, addresses and numbers removed) and
+fingerprinted with a 64-bit simhash; failures whose fingerprints are within a
+few bits of each other share a cause. A failure whose log cannot be fetched
+falls back to its status description. Logs are streamed through the
+on-disk log cache (log_cache.py) and scanned line by line.
+"""
+
+import os
+import re
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Iterable, List, Mapping, Optional, Tuple
+
+from log_cache import LogCache
+
+PROW_VIEW_RE = re.compile(r'^https?://[^/]+/view/gs/(.+?)/?$')
+JENKINS_BUILD_RE = re.compile(r'^(https?://.+/job/[^/]+/\d+)(/.*)?$')
+
+PANIC_RE = re.compile(r'^panic: (.+)')
+GOROUTINE_RE = re.compile(r'^goroutine \d+ \[')
+GO_FAIL_RE = re.compile(r'^\s*--- FAIL: (\S+)')
+CASE_FAIL_RE = re.compile(r'run test case (\S+) failed')
+TEST_FAILED_RE = re.compile(r'TEST FAILED: (.+)')
+TIMEOUT_RE = re.compile(r'\btimed out\b|Timeout has been exceeded|deadline exceeded', re.IGNORECASE)
+ERROR_RE = re.compile(r'\b(error|fatal)\b', re.IGNORECASE)
+
+TIMESTAMP_RE = re.compile(r'\[?\d{4}[-/]\d{2}[-/]\d{2}[ T]\d{2}:\d{2}:\d{2}[.,\d]*(Z|[+-]\d{2}:?\d{2})?\]?')
+HEX_RE = re.compile(r'0x[0-9a-fA-F]+')
+NUMBER_RE = re.compile(r'\d+')
+
+STACK_FRAMES = 3
+MAX_SIGNATURES = 5
+SIGNATURE_LENGTH = 200
+
+
+def log_url(target_url: Optional[str]) -> Optional[str]:
+    """Raw log URL behind a check's target_url (Prow job page, Jenkins build, or a plain log URL)"""
+    if not target_url:
+        return None
+    match = PROW_VIEW_RE.match(target_url)
+    if match:
+        return f"https://storage.googleapis.com/{match.group(1)}/build-log.txt"
+    match = JENKINS_BUILD_RE.match(target_url)
+    if match:
+        return f"{match.group(1)}/consoleText"
+    return target_url
+
+
+def normalize(line: str) -> str:
+    """Line without the parts that differ between occurrences of the same error"""
+    line = TIMESTAMP_RE.sub('', line)
+    line = HEX_RE.sub('0x?', line)
+    line = NUMBER_RE.sub('N', line)
+    return ' '.join(line.split())[:SIGNATURE_LENGTH]
+
+
+def _frame_function(line: str) -> Optional[str]:
+    """Function name of a goroutine stack frame line (file:line lines are indented and skipped)"""
+    if not line or line[0].isspace() or '(' not in line or line.startswith('created by'):
+        return None
+    function = line[:line.rindex('(')]
+    if function.startswith(('runtime.', 'testing.', 'panic')):
+        return None
+    return function
+
+
+def extract_signatures(lines: Iterable[str], max_signatures: int = MAX_SIGNATURES) -> List[str]:
+    """Error signatures of a log, read line by line: panics first, then failing cases, then timeouts"""
+    panics, cases, timeouts = [], [], []
+    last_error = None
+    panic, frames, in_stack = None, [], False
+
+    def finish_panic():
+        if panic is not None:
+            panics.append(f"panic: {normalize(panic)}" + (f" at {' < '.join(frames)}" if frames else ''))
+
+    for line in lines:
+        line = line.rstrip('\r\n')
+        if panic is not None:
+            if GOROUTINE_RE.match(line):
+                in_stack = True
+                continue
+            function = _frame_function(line) if in_stack else None
+            if function:
+                frames.append(function)
+            if (in_stack and not line) or line.startswith('created by') or len(frames) >= STACK_FRAMES:
+                finish_panic()
+                panic, frames, in_stack = None, [], False
+            continue
+
+        match = PANIC_RE.search(line)
+        if match:
+            panic = match.group(1)
+            continue
+        match = GO_FAIL_RE.match(line) or CASE_FAIL_RE.search(line)
+        if match:
+            cases.append(f"failed: {match.group(1)}")
+            continue
+        match = TEST_FAILED_RE.search(line)
+        if match:
+            cases.append(f"failed: {normalize(match.group(1))}")
+            continue
+        if TIMEOUT_RE.search(line):
+            timeouts.append(f"timeout: {normalize(line)}")
+        elif ERROR_RE.search(line):
+            last_error = line
+    finish_panic()
+
+    signatures = list(dict.fromkeys(panics + cases + timeouts))
+    if not signatures and last_error:
+        signatures = [f"error: {normalize(last_error)}"]
+    return signatures[:max_signatures]
+
+
+def simhash(text: str, bits: int = 64) -> int:
+    """Similarity hash of text over its word bigrams: similar texts differ in few bits"""
+    words = text.split()
+    features = [' '.join(pair) for pair in zip(words, words[1:])] or words
+    weights = [0] * bits
+    for feature in features:
+        value = int.from_bytes(hashlib.blake2b(feature.encode(), digest_size=bits // 8).digest(), 'big')
+        for bit in range(bits):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(bits) if weights[bit] > 0)
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count('1')
+
+
+@dataclass
+class FailureLog:
+    """Signatures of one failed check's log"""
+    pr_number: int
+    name: str
+    url: Optional[str]
+    signatures: List[str]
+    fetched: bool
+    fingerprint: int = 0
+
+    def __post_init__(self):
+        self.fingerprint = simhash('\n'.join(self.signatures))
+
+    @property
+    def summary(self) -> str:
+        return self.signatures[0] if self.signatures else 'no error signature found'
+
+
+@dataclass
+class FailureCause:
+    """Failures sharing one signature fingerprint (within the clustering distance)"""
+    fingerprint: int
+    failures: List[FailureLog] = field(default_factory=list)
+
+    @property
+    def summary(self) -> str:
+        return self.failures[0].summary
+
+
+def cluster_failures(failures: Iterable[FailureLog], max_distance: int = 3) -> List[FailureCause]:
+    """Group failures whose fingerprints are within max_distance bits of a cause's first failure, largest first"""
+    causes: List[FailureCause] = []
+    for failure in failures:
+        for cause in causes:
+            if hamming(cause.fingerprint, failure.fingerprint) <= max_distance:
+                cause.failures.append(failure)
+                break
+        else:
+            causes.append(FailureCause(failure.fingerprint, [failure]))
+    causes.sort(key=lambda cause: len(cause.failures), reverse=True)
+    return causes
+
+
+def summarize(causes: List[FailureCause]) -> str:
+    """'4 failures, 2 distinct causes'"""
+    failures = sum(len(cause.failures) for cause in causes)
+    return (f"{failures} failure{'s' if failures != 1 else ''}, "
+            f"{len(causes)} distinct cause{'s' if len(causes) != 1 else ''}")
+
+
+def format_causes(causes: List[FailureCause]) -> List[str]:
+    """Report lines: the summary, then each cause with the failed jobs it explains"""
+    lines = [f"Failure causes: {summarize(causes)}"]
+    for index, cause in enumerate(causes, 1):
+        lines.append(f"  Cause {index} ({len(cause.failures)}x): {cause.summary}")
+        lines.append("    " + ', '.join(f"PR #{failure.pr_number} {failure.name}" for failure in cause.failures))
+    return lines
+
+
+class FailureLogAnalyzer:
+    """Fetches the logs of failed checks in parallel and clusters their error signatures into causes"""
+
+    def __init__(self, log_cache: Optional[LogCache] = None, max_distance: int = 3, workers: int = 4):
+        self.log_cache = log_cache or LogCache()
+        self.max_distance = max_distance
+        self.workers = workers
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_env(cls) -> Optional['FailureLogAnalyzer']:
+        """The analyzer configured by FAILURE_LOG_* and LOG_CACHE_*, or None if disabled"""
+        if os.getenv('FAILURE_LOG_ANALYSIS_ENABLED', 'true').lower() != 'true':
+            return None
+        return cls(LogCache.from_env(),
+                   max_distance=int(os.getenv('FAILURE_LOG_CLUSTER_DISTANCE', 3)),
+                   workers=int(os.getenv('FAILURE_LOG_WORKERS', 4)))
+
+    def analyze_check(self, pr_number: int, check: Mapping) -> FailureLog:
+        """Signatures of one failed check (its description when the log is unavailable)"""
+        url = log_url(check.get('target_url'))
+        if url:
+            try:
+                with self.log_cache.lines(url) as log:
+                    signatures = extract_signatures(log)
+                return FailureLog(pr_number, check['name'], url, signatures, fetched=True)
+            except Exception as e:
+                self.logger.warning(f"Could not fetch log of {check['name']} on PR #{pr_number} ({url}): {e}")
+        description = check.get('description') or check.get('conclusion') or 'unknown'
+        return FailureLog(pr_number, check['name'], url, [f"{check['name']}: {normalize(description)}"], fetched=False)
+
+    def analyze(self, failed: Iterable[Tuple[int, Mapping]]) -> List[FailureCause]:
+        """Causes behind (PR number, failed check) pairs"""
+        failed = list(failed)
+        if not failed:
+            return []
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='failure-log') as executor:
+            failures = list(executor.map(lambda item: self.analyze_check(*item), failed))
+        return cluster_failures(failures, self.max_distance)
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""
+Flakiness scoring of pull-cdc-* jobs over the results warehouse.
+
+Every stored check result becomes a row of a few columns (job, day,
+failed on first attempt, flaky pass on retry); results are binned per job
+and time bucket with NumPy and scored in bulk:
+
+- failure rate with a Wilson 95% confidence interval (jobs are ranked by its
+  lower bound, so a job with 1 failure in 2 runs does not outrank one with
+  30 in 100)
+- rolling failure rate over the last few buckets
+- change points: buckets where the rolling window's interval (99.9%) no
+  longer overlaps the interval of the window before it (failure rate jumped
+  or dropped)
+
+Checks that never reported ('missing') or were still running when their PR
+timed out ('timed_out') are left out: they say nothing about the job itself.
+
+    python flakiness.py [days] [bucket_days]
+"""
+
+import os
+import sys
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from typing import List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from results_warehouse import ResultsWarehouse, UNREPORTED_CONCLUSIONS
+
+Z_95 = 1.96
+# Change points compare many window pairs, so they need a much stricter interval to avoid false alarms
+Z_CHANGE = 3.29
+
+
+def wilson_interval(failures: np.ndarray, totals: np.ndarray, z: float = Z_95) -> Tuple[np.ndarray, np.ndarray]:
+    """Wilson score interval of failures/totals, element-wise ([0, 1] where totals is 0)"""
+    failures = np.asarray(failures, dtype=float)
+    totals = np.asarray(totals, dtype=float)
+    n = np.where(totals > 0, totals, 1.0)
+    p = failures / n
+    denominator = 1 + z ** 2 / n
+    centre = (p + z ** 2 / (2 * n)) / denominator
+    margin = z * np.sqrt(p * (1 - p) / n + z ** 2 / (4 * n ** 2)) / denominator
+    low = np.where(totals > 0, np.clip(centre - margin, 0.0, 1.0), 0.0)
+    high = np.where(totals > 0, np.clip(centre + margin, 0.0, 1.0), 1.0)
+    return low, high
+
+
+def rolling_sum(values: np.ndarray, window: int) -> np.ndarray:
+    """Sum over the last window buckets along the last axis"""
+    cumulative = np.cumsum(values, axis=-1)
+    shifted = np.zeros_like(cumulative)
+    shifted[..., window:] = cumulative[..., :-window]
+    return cumulative - shifted
+
+
+@dataclass
+class JobScore:
+    """Flakiness of one job over the scored period"""
+    name: str
+    runs: int
+    failures: int
+    flaky_passes: int
+    failure_rate: float
+    ci_low: float
+    ci_high: float
+    recent_rate: Optional[float]
+    # (bucket start, 'up' or 'down') where the rolling failure rate changed significantly
+    change_points: List[Tuple[date, str]] = field(default_factory=list)
+
+
+def score_jobs(names: np.ndarray, days: np.ndarray, failed: np.ndarray, flaky: np.ndarray,
+               bucket_days: int = 7, window: int = 4, min_window_runs: int = 5) -> List[JobScore]:
+    """Score every job from column arrays (days as datetime64[D]), flakiest first"""
+    if len(names) == 0:
+        return []
+
+    job_names, job_index = np.unique(names, return_inverse=True)
+    day_numbers = days.astype('datetime64[D]').astype(np.int64)
+    first_day = day_numbers.min()
+    bucket = (day_numbers - first_day) // bucket_days
+    n_jobs, n_buckets = len(job_names), int(bucket.max()) + 1
+
+    # jobs x buckets matrices of run, failure and flaky counts
+    cell = job_index * n_buckets + bucket
+    size = n_jobs * n_buckets
+    totals = np.bincount(cell, minlength=size).reshape(n_jobs, n_buckets)
+    failures = np.bincount(cell, weights=failed, minlength=size).reshape(n_jobs, n_buckets)
+    flaky_counts = np.bincount(cell, weights=flaky, minlength=size).reshape(n_jobs, n_buckets)
+
+    job_totals = totals.sum(axis=1)
+    job_failures = failures.sum(axis=1)
+    ci_low, ci_high = wilson_interval(job_failures, job_totals)
+
+    window = max(1, min(window, n_buckets))
+    window_totals = rolling_sum(totals, window)
+    window_failures = rolling_sum(failures, window)
+    window_low, window_high = wilson_interval(window_failures, window_totals, z=Z_CHANGE)
+
+    # Compare each window with the non-overlapping window just before it
+    changes = np.zeros((n_jobs, n_buckets), dtype=np.int8)
+    if n_buckets > window:
+        enough = (window_totals[:, window:] >= min_window_runs) & (window_totals[:, :-window] >= min_window_runs)
+        up = enough & (window_low[:, window:] > window_high[:, :-window])
+        down = enough & (window_high[:, window:] < window_low[:, :-window])
+        changes[:, window:] = up.astype(np.int8) - down.astype(np.int8)
+    # Report where a change starts, not every bucket it lasts
+    starts = (changes != 0) & (changes != np.concatenate([np.zeros((n_jobs, 1), np.int8), changes[:, :-1]], axis=1))
+
+    start_date = date(1970, 1, 1) + timedelta(days=int(first_day))
+    recent = np.where(window_totals[:, -1] > 0, window_failures[:, -1] / np.maximum(window_totals[:, -1], 1), np.nan)
+    scores = []
+    for j, name in enumerate(job_names):
+        change_points = [(start_date + timedelta(days=int(b) * bucket_days), 'up' if changes[j, b] > 0 else 'down')
+                         for b in np.flatnonzero(starts[j])]
+        scores.append(JobScore(
+            name=str(name),
+            runs=int(job_totals[j]),
+            failures=int(job_failures[j]),
+            flaky_passes=int(flaky_counts[j].sum()),
+            failure_rate=float(job_failures[j] / job_totals[j]) if job_totals[j] else 0.0,
+            ci_low=float(ci_low[j]),
+            ci_high=float(ci_high[j]),
+            recent_rate=None if np.isnan(recent[j]) else float(recent[j]),
+            change_points=change_points
+        ))
+
+    scores.sort(key=lambda score: (score.ci_low, score.failure_rate), reverse=True)
+    return scores
+
+
+def score_warehouse(warehouse: ResultsWarehouse, days: int = 30, bucket_days: int = 7,
+                    prefix: str = 'pull-cdc-') -> List[JobScore]:
+    """Load the last days of check results as columns and score them"""
+    rows = warehouse.check_outcomes(days, prefix)
+    if not rows:
+        return []
+    names, result_days, conclusions, outcomes = (np.array(column, dtype=object) for column in zip(*rows))
+    reported = ~np.isin(conclusions, UNREPORTED_CONCLUSIONS)
+    passed = np.isin(conclusions, ['success', 'skipped'])
+    flaky = outcomes == 'flaky-pass-on-retry'
+    failed = ~passed | flaky  # a flaky pass failed its first attempt
+    return score_jobs(names[reported], result_days[reported].astype('datetime64[D]'),
+                      failed[reported].astype(float), flaky[reported].astype(float), bucket_days=bucket_days)
+
+
+def format_report(scores: List[JobScore], days: int, top: int = 10) -> str:
+    """Plain-text ranking for logs and notifications"""
+    if not scores:
+        return f"Flakiness (last {days} days): no results recorded"
+    lines = [f"Flakiest jobs (last {days} days, failure rate with 95% CI):"]
+    for score in scores[:top]:
+        line = (f"  {score.name}: {score.failures}/{score.runs} failed ({score.failure_rate:.1%}, "
+                f"CI {score.ci_low:.1%}-{score.ci_high:.1%})")
+        if score.flaky_passes:
+            line += f", {score.flaky_passes} flaky passes"
+        if score.change_points:
+            when, direction = score.change_points[-1]
+            line += f", failure rate {'jumped' if direction == 'up' else 'dropped'} from {when}"
+        lines.append(line)
+    return '\n'.join(lines)
+
+
+def main():
+    """Print the flakiness ranking of the last days (no GitHub access needed)"""
+    load_dotenv('config.env')
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 30
+    bucket_days = int(sys.argv[2]) if len(sys.argv) > 2 else 7
+    warehouse = ResultsWarehouse(os.getenv('WAREHOUSE_PATH', 'stability_results.db'))
+
+    scores = score_warehouse(warehouse, days, bucket_days)
+    print(format_report(scores, days, top=len(scores)))
+    for score in scores:
+        for when, direction in score.change_points:
+            print(f"  change point: {score.name} failure rate {direction} in the {bucket_days}-day bucket from {when}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,32 @@
-import os
-import time
+import base64
+import calendar
 import logging
-from datetime import datetime, timedelta
-from github import Github, GithubException
-from typing import List, Dict, Optional
+import requests
+from datetime import datetime
+from github import Github, GithubException, BadCredentialsException, InputGitTreeElement
+from github.GitCommit import GitCommit
+from github.GitTree import GitTree
+from typing import List, Dict, Optional, Tuple
+from check_index import CheckResultIndex
+from graphql_client import GraphQLStatusPoller
+from repo_cache import RepoMetadataCache
+from rest_cache import CachedRestReader, ConditionalRequestCache
+from rate_limiter import RateLimitGovernor, READ, WRITE
+from pr_status import PRStatus, checks_from_rest, pull_checks, missing_checks, incomplete_checks, failed_checks, are_tests_passed
+
+def add_empty_line(content: str) -> str:
+    """Return Makefile content with one more empty line at the end"""
+    # Add empty line if not already present
+    if not content.endswith('\n'):
+        content += '\n'
+    return content + '\n'  # Add one more empty line
 
 class GitHubClient:
-    def __init__(self, token: str, username: str, repo_owner: str, repo_name: str):
+    def __init__(self, token: str, username: str, repo_owner: str, repo_name: str,
+                 status_backend: str = 'graphql', governor: Optional[RateLimitGovernor] = None,
+                 metadata_cache: Optional[RepoMetadataCache] = None, base_branch: str = 'master',
+                 session: Optional[requests.Session] = None, rest_cache: Optional[ConditionalRequestCache] = None,
+                 validate: bool = True, timeout: float = 30):
         # Setup logging first
         logging.basicConfig(
             level=logging.INFO,
@@ -17,47 +37,165 @@ class GitHubClient:
             ]
         )
         self.logger = logging.getLogger(__name__)
-        
-        self.github = Github(token)
+
+        if not token:
+            raise ValueError("GITHUB_TOKEN is required")
+
+        self.github = Github(token, timeout=int(timeout))
+        self.token = token
+        self.timeout = timeout
         self.username = username
         self.repo_owner = repo_owner
         self.repo_name = repo_name
-        self.repo = self.github.get_repo(f"{repo_owner}/{repo_name}")
+        self.base_branch = base_branch
+        self.status_backend = status_backend
         
-        # Get or create fork
-        self.user = self.github.get_user()
+        # Every GitHub request goes through the governor, which tracks the rate-limit budgets
+        self.governor = governor or RateLimitGovernor()
+        
+        # Raw HTTP readers share one session; REST reads are conditional and cached
+        self.session = session or requests.Session()
+        self.rest = CachedRestReader(token, cache=rest_cache, session=self.session, governor=self.governor,
+                                     timeout=timeout)
+        # Concluded checks are frozen per head SHA so later polls only ask for the running ones
+        self.check_index = CheckResultIndex()
+        self.graphql_poller = GraphQLStatusPoller(token, repo_owner, repo_name, session=self.session,
+                                                  governor=self.governor, index=self.check_index, timeout=timeout)
+        
+        # Repo, user and fork handles are resolved lazily; fork metadata is cached on disk
+        self.metadata_cache = metadata_cache or RepoMetadataCache()
+        self.metadata_key = RepoMetadataCache.make_key(token, f"{repo_owner}/{repo_name}")
+        self._repo = None
+        self._user = None
+        self._fork_repo = None
+        self._fork_full_name = None
+        self._stability_base = None
+        
+        # Fail fast on a bad token with one call that is not charged to the quota
+        if validate:
+            self.validate_token()
+    
+    def for_target(self, repo_owner: str, repo_name: str, base_branch: str = 'master') -> 'GitHubClient':
+        """Client for another repo/base branch sharing this client's caches and rate-limit budget
+        (with its own HTTP session and PyGithub requester: targets run on separate threads)"""
+        return GitHubClient(
+            self.token, self.username, repo_owner, repo_name,
+            status_backend=self.status_backend,
+            governor=self.governor,
+            metadata_cache=self.metadata_cache,
+            base_branch=base_branch,
+            rest_cache=self.rest.cache,
+            validate=False,
+            timeout=self.timeout
+        )
+    
+    def validate_token(self):
+        """Check the token via /rate_limit (free) and seed the governor with the current budgets"""
         try:
-            self.fork_repo = self.user.get_repo(self.repo_name)
+            rate_limit = self.github.get_rate_limit()
+        except BadCredentialsException:
+            self.logger.error("GitHub token is invalid or expired")
+            raise
+        
+        for resource in ('core', 'search', 'graphql'):
+            rate = getattr(rate_limit, resource)
+            self.governor.update_budget(resource, rate.remaining, rate.limit, calendar.timegm(rate.reset.timetuple()))
+    
+    @property
+    def repo(self):
+        """Upstream repository handle (lazy: no request until it is used)"""
+        if self._repo is None:
+            self._repo = self.github.get_repo(f"{self.repo_owner}/{self.repo_name}", lazy=True)
+        return self._repo
+    
+    @property
+    def user(self):
+        """Authenticated user handle (lazy)"""
+        if self._user is None:
+            self._user = self.github.get_user()
+        return self._user
+    
+    @property
+    def fork_full_name(self) -> str:
+        """owner/name of the fork PR branches live in, from the on-disk cache when fresh"""
+        if self._fork_full_name is None:
+            cached = self.metadata_cache.get(self.metadata_key)
+            if cached:
+                self._fork_full_name = cached['fork_full_name']
+            else:
+                self._fork_full_name = self._resolve_fork().full_name
+                self.metadata_cache.put(self.metadata_key, {'fork_full_name': self._fork_full_name})
+        return self._fork_full_name
+    
+    @property
+    def fork_repo(self):
+        """Fork repository handle (lazy)"""
+        if self._fork_repo is None:
+            self._fork_repo = self.github.get_repo(self.fork_full_name, lazy=True)
+        return self._fork_repo
+    
+    def _resolve_fork(self):
+        """Get or create the fork of the upstream repository"""
+        try:
+            fork_repo = self._call(lambda: self.user.get_repo(self.repo_name))
             self.logger.info(f"Using existing fork: {self.username}/{self.repo_name}")
         except GithubException:
             self.logger.info(f"Creating fork of {self.repo_owner}/{self.repo_name}")
-            self.fork_repo = self.user.create_fork(self.repo)
+            fork_repo = self._call(lambda: self.user.create_fork(self.repo), WRITE)
             self.logger.info(f"Created fork: {self.username}/{self.repo_name}")
+        self._fork_repo = fork_repo
+        return fork_repo
     
-    def get_latest_master_sha(self) -> str:
-        """Get the latest commit SHA from master branch"""
+    def _call(self, fn, path: str = READ):
+        """Run a PyGithub call through the governor and record the budget it reported"""
+        result = self.governor.call(fn, resource='core', path=path)
+        remaining, limit = self.github.rate_limiting
+        self.governor.update_budget('core', remaining, limit, self.github.rate_limiting_resettime)
+        return result
+    
+    def get_latest_base_sha(self) -> str:
+        """Get the latest commit SHA from the base branch (master by default)"""
         try:
-            master_branch = self.repo.get_branch("master")
-            return master_branch.commit.sha
+            base_branch = self.rest.get_json(f"/repos/{self.repo_owner}/{self.repo_name}/branches/{self.base_branch}")
+            return base_branch['commit']['sha']
         except GithubException as e:
-            self.logger.error(f"Failed to get master branch SHA: {e}")
+            self.logger.error(f"Failed to get {self.base_branch} branch SHA: {e}")
             raise
     
+    def get_latest_master_sha(self) -> str:
+        """Get the latest commit SHA from the base branch (kept for the helper scripts)"""
+        return self.get_latest_base_sha()
+    
+    def compare_commits(self, base_sha: str, head_sha: str) -> Tuple[List[Dict], int]:
+        """Commits in head_sha but not base_sha, oldest first ({'sha', 'message', 'author'}), and their total count
+        (the compare API lists at most 250)"""
+        comparison = self.rest.get_json(f"/repos/{self.repo_owner}/{self.repo_name}/compare/{base_sha}...{head_sha}")
+        commits = [{'sha': commit['sha'], 'message': commit['commit']['message'],
+                    'author': (commit.get('author') or {}).get('login') or commit['commit']['author']['name']}
+                   for commit in comparison['commits']]
+        return commits, comparison['total_commits']
+    
     def create_branch(self, branch_name: str, base_sha: str) -> bool:
-        """Create a new branch from master in fork"""
+        """Create a new branch from base_sha in fork"""
         try:
-            self.fork_repo.create_git_ref(f"refs/heads/{branch_name}", base_sha)
+            self._call(lambda: self.fork_repo.create_git_ref(f"refs/heads/{branch_name}", base_sha), WRITE)
             self.logger.info(f"Created branch: {branch_name}")
             return True
         except GithubException as e:
+            if e.status == 404:
+                # The cached fork may be gone; resolve it again next time
+                self.metadata_cache.invalidate(self.metadata_key)
+                self._fork_full_name = None
+                self._fork_repo = None
             self.logger.error(f"Failed to create branch {branch_name}: {e}")
             return False
     
-    def get_makefile_content(self) -> str:
-        """Get the current Makefile content from master branch"""
+    def get_makefile_content(self, ref: Optional[str] = None) -> str:
+        """Get the current Makefile content from the base branch (or another ref)"""
+        ref = ref or self.base_branch
         try:
-            makefile = self.repo.get_contents("Makefile", ref="master")
-            return makefile.decoded_content.decode('utf-8')
+            makefile = self.rest.get_json(f"/repos/{self.repo_owner}/{self.repo_name}/contents/Makefile?ref={ref}")
+            return base64.b64decode(makefile['content']).decode('utf-8')
         except GithubException as e:
             self.logger.error(f"Failed to get Makefile content: {e}")
             raise
@@ -65,186 +203,182 @@ class GitHubClient:
     def update_makefile(self, branch_name: str, content: str) -> bool:
         """Update Makefile by adding an empty line at the end"""
         try:
-            # Add empty line if not already present
-            if not content.endswith('\n'):
-                content += '\n'
-            content += '\n'  # Add one more empty line
+            content = add_empty_line(content)
             
-            self.fork_repo.update_file(
+            makefile_sha = self.rest.get_json(f"/repos/{self.fork_full_name}/contents/Makefile?ref={branch_name}")['sha']
+            self._call(lambda: self.fork_repo.update_file(
                 "Makefile",
                 f"Add empty line for stability test - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}",
                 content,
-                self.fork_repo.get_contents("Makefile", ref=branch_name).sha,
+                makefile_sha,
                 branch=branch_name
-            )
+            ), WRITE)
             self.logger.info(f"Updated Makefile in branch: {branch_name}")
             return True
         except GithubException as e:
             self.logger.error(f"Failed to update Makefile in branch {branch_name}: {e}")
             return False
     
+    def prepare_stability_tree(self, master_sha: str) -> Tuple[GitCommit, GitTree]:
+        """Build the modified Makefile tree on top of master_sha once (Git Data API), reused for every branch"""
+        if self._stability_base is not None and self._stability_base[0] == master_sha:
+            return self._stability_base[1:]
+        
+        content = add_empty_line(self.get_makefile_content(ref=master_sha))
+        parent = self._call(lambda: self.fork_repo.get_git_commit(master_sha))
+        tree = self._call(lambda: self.fork_repo.create_git_tree(
+            [InputGitTreeElement("Makefile", "100644", "blob", content=content)],
+            base_tree=parent.tree
+        ), WRITE)
+        
+        self._stability_base = (master_sha, parent, tree)
+        self.logger.info(f"Prepared stability test tree {tree.sha[:8]} on {self.base_branch} {master_sha[:8]}")
+        return parent, tree
+    
+    def create_branch_with_commit(self, branch_name: str, master_sha: str) -> bool:
+        """Create a branch whose single commit adds the empty line, without any content downloads"""
+        try:
+            parent, tree = self.prepare_stability_tree(master_sha)
+            
+            # Commits differ only in message, so every branch gets its own head SHA (and its own CI statuses)
+            message = f"Add empty line for stability test - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')} ({branch_name})"
+            commit = self._call(lambda: self.fork_repo.create_git_commit(message, tree, [parent]), WRITE)
+            self._call(lambda: self.fork_repo.create_git_ref(f"refs/heads/{branch_name}", commit.sha), WRITE)
+            self.logger.info(f"Created branch {branch_name} at {commit.sha[:8]}")
+            return True
+        except GithubException as e:
+            self.logger.error(f"Failed to create branch {branch_name} via Git Data API: {e}")
+            return False
+    
     def create_pull_request(self, branch_name: str, title: str, body: str) -> Optional[int]:
         """Create a pull request and return its number"""
         try:
             # Create PR from fork to original repository
-            pr = self.repo.create_pull(
+            pr = self._call(lambda: self.repo.create_pull(
                 title=title,
                 body=body,
                 head=f"{self.username}:{branch_name}",
-                base="master"
-            )
+                base=self.base_branch
+            ), WRITE)
             self.logger.info(f"Created PR #{pr.number}: {title}")
             return pr.number
         except GithubException as e:
             self.logger.error(f"Failed to create PR for branch {branch_name}: {e}")
             return None
     
-    def get_pr_status(self, pr_number: int) -> Dict:
-        """Get PR status including CI checks (GitHub Actions, Prow, etc.)"""
-        import time
-        max_retries = 3
-        retry_delay = 5
+    def get_pr_snapshot(self, pr_number: int) -> PRStatus:
+        """Fetch PR status including CI checks (GitHub Actions, Prow, etc.) as an immutable snapshot"""
+        try:
+            return self._fetch_pr_snapshot(pr_number)
+        except Exception as e:
+            self.logger.error(f"Failed to get PR #{pr_number} status: {e}")
+            return PRStatus.unknown(pr_number)
+    
+    def _fetch_pr_snapshot(self, pr_number: int) -> PRStatus:
+        """Fetch one PR snapshot over conditional REST reads"""
+        repo_path = f"/repos/{self.repo_owner}/{self.repo_name}"
+        pr = self.rest.get_json(f"{repo_path}/pulls/{pr_number}")
+        
+        # The head commit of the PR is the latest one
+        head_sha = pr['head']['sha']
+        
+        # Get both check runs (GitHub Actions) and status checks (Prow/Jenkins)
+        check_runs = self.rest.get_paginated(f"{repo_path}/commits/{head_sha}/check-runs", items_key='check_runs')
+        status_checks = self.rest.get_paginated(f"{repo_path}/commits/{head_sha}/statuses")
         
-        for attempt in range(max_retries):
+        status = PRStatus.build(
+            pr_number,
+            pr['state'],
+            self.check_index.observe(pr_number, head_sha, checks_from_rest(check_runs, status_checks)),
+            merged=pr['merged'],
+            head_sha=head_sha,
+            mergeable=pr.get('mergeable'),
+            mergeable_state=pr.get('mergeable_state')
+        )
+        
+        self.logger.debug(f"PR #{pr_number} status: {len(status.checks)} checks ({len(check_runs)} check_runs + {len(status_checks)} status_checks), state: {status.state}")
+        return status
+    
+    def get_pr_snapshots(self, pr_numbers: List[int]) -> Dict[int, PRStatus]:
+        """Fetch snapshots for many PRs, in one GraphQL query when that backend is enabled"""
+        if self.status_backend == 'graphql' and pr_numbers:
             try:
-                pr = self.repo.get_pull(pr_number)
-                
-                # Get the latest commit
-                commits = pr.get_commits()
-                if not commits:
-                    self.logger.warning(f"PR #{pr_number} has no commits")
-                    return {'state': pr.state, 'merged': pr.merged, 'checks': []}
-                
-                latest_commit = commits.reversed[0]
-                
-                # Get both check runs (GitHub Actions) and status checks (Prow/Jenkins)
-                check_runs = latest_commit.get_check_runs()
-                status_checks = latest_commit.get_statuses()
-                
-                status = {
-                    'state': pr.state,
-                    'merged': pr.merged,
-                    'checks': [],
-                    'commit_sha': latest_commit.sha[:8],
-                    'mergeable': pr.mergeable,
-                    'mergeable_state': pr.mergeable_state
-                }
-                
-                # Add GitHub Actions check runs
-                for check in check_runs:
-                    status['checks'].append({
-                        'name': check.name,
-                        'status': check.status,
-                        'conclusion': check.conclusion,
-                        'started_at': check.started_at,
-                        'completed_at': check.completed_at,
-                        'type': 'check_run'
-                    })
-                
-                # Add Prow/Jenkins status checks (deduplicate by name)
-                seen_checks = set()
-                for check in status_checks:
-                    # Skip if we've already seen this check name
-                    if check.context in seen_checks:
-                        continue
-                    seen_checks.add(check.context)
-                    
-                    # Map status check states to check run format
-                    check_status = 'completed' if check.state in ['success', 'failure', 'error'] else 'in_progress'
-                    check_conclusion = check.state if check.state in ['success', 'failure', 'error'] else None
-                    
-                    status['checks'].append({
-                        'name': check.context,
-                        'status': check_status,
-                        'conclusion': check_conclusion,
-                        'started_at': check.created_at,
-                        'completed_at': check.updated_at,
-                        'type': 'status_check',
-                        'description': check.description,
-                        'target_url': check.target_url
-                    })
-                
-                self.logger.debug(f"PR #{pr_number} status: {len(status['checks'])} checks ({len(list(check_runs))} check_runs + {len(list(status_checks))} status_checks), state: {status['state']}")
-                return status
-                
+                return self.graphql_poller.fetch_statuses(pr_numbers)
             except Exception as e:
-                if attempt < max_retries - 1:
-                    self.logger.warning(f"Attempt {attempt + 1} failed for PR #{pr_number}: {e}. Retrying in {retry_delay} seconds...")
-                    time.sleep(retry_delay)
-                    retry_delay *= 2  # Exponential backoff
-                else:
-                    self.logger.error(f"Failed to get PR #{pr_number} status after {max_retries} attempts: {e}")
-                    return {'state': 'unknown', 'checks': []}
+                self.logger.warning(f"GraphQL status poll failed, falling back to REST: {e}")
+        
+        return {pr_number: self.get_pr_snapshot(pr_number) for pr_number in pr_numbers}
     
-    def is_pr_tests_complete(self, pr_number: int) -> bool:
-        """Check if all pull_ CI tests for PR are complete"""
-        status = self.get_pr_status(pr_number)
+    def get_poll_interval(self, base_seconds: float, pr_count: int) -> float:
+        """Return the poll interval for pr_count PRs, stretched if the read budget is running low"""
+        if self.status_backend == 'graphql':
+            queries = -(-pr_count // self.graphql_poller.batch_size)
+            return self.governor.poll_interval(base_seconds, queries, resource='graphql')
+        # pull + check-runs + statuses per PR
+        return self.governor.poll_interval(base_seconds, 3 * pr_count, resource='core')
+    
+    def get_cache_stats(self) -> Dict:
+        """Return conditional-request cache counters (hits are requests not charged to the quota)"""
+        return self.rest.cache.stats()
+    
+    def get_pr_status(self, pr_number: int) -> Dict:
+        """Get PR status including CI checks as a plain dict"""
+        return self.get_pr_snapshot(pr_number).to_dict()
+    
+    def is_pr_tests_complete(self, pr_number: int, status: Optional[PRStatus] = None,
+                             expected: Optional[List[str]] = None) -> bool:
+        """Check if all pull_ CI tests (or the expected checks) for PR are complete"""
+        if status is None:
+            status = self.get_pr_snapshot(pr_number)
         
         # If PR is closed or merged, consider it complete
-        if status['state'] in ['closed', 'merged']:
-            self.logger.info(f"PR #{pr_number} is {status['state']}, considering complete")
+        if status.state in ['closed', 'merged']:
+            self.logger.info(f"PR #{pr_number} is {status.state}, considering complete")
             return True
         
-        # Get pull_ checks specifically
-        pull_checks = [check for check in status['checks'] if check['name'].startswith('pull-')]
-        
-        if not pull_checks:
+        if not pull_checks(status, expected):
             self.logger.debug(f"PR #{pr_number} has no pull_ CI checks yet")
             return False
         
-        # Check if all pull_ checks are complete
-        incomplete_checks = []
-        for check in pull_checks:
-            if check['status'] not in ['completed', 'skipped']:
-                incomplete_checks.append(f"{check['name']}({check['status']})")
+        missing = missing_checks(status, expected)
+        if missing:
+            self.logger.debug(f"PR #{pr_number} expected checks not reported yet: {', '.join(missing)}")
+            return False
         
-        if incomplete_checks:
-            self.logger.debug(f"PR #{pr_number} incomplete pull_ checks: {', '.join(incomplete_checks)}")
+        incomplete = [f"{check['name']}({check['status']})" for check in incomplete_checks(status, expected)]
+        if incomplete:
+            self.logger.debug(f"PR #{pr_number} incomplete pull_ checks: {', '.join(incomplete)}")
             return False
         
         self.logger.info(f"PR #{pr_number} all pull_ CI checks completed")
         return True
     
-    def are_pr_tests_passed(self, pr_number: int) -> bool:
-        """Check if all pull_ CI tests for PR passed"""
-        status = self.get_pr_status(pr_number)
+    def are_pr_tests_passed(self, pr_number: int, status: Optional[PRStatus] = None,
+                            expected: Optional[List[str]] = None) -> bool:
+        """Check if all pull_ CI tests (or the expected checks) for PR passed"""
+        if status is None:
+            status = self.get_pr_snapshot(pr_number)
         
-        # If PR is merged, consider it passed
-        if status['state'] == 'merged':
+        passed = are_tests_passed(status, expected)
+        if status.merged or status.state == 'merged':
             self.logger.info(f"PR #{pr_number} is merged, considering passed")
-            return True
-        
-        # If PR is closed but not merged, consider it failed
-        if status['state'] == 'closed':
+        elif status.state == 'closed':
             self.logger.info(f"PR #{pr_number} is closed but not merged, considering failed")
-            return False
-        
-        # Get pull_ checks specifically
-        pull_checks = [check for check in status['checks'] if check['name'].startswith('pull-')]
-        
-        if not pull_checks:
+        elif not pull_checks(status, expected):
             self.logger.debug(f"PR #{pr_number} has no pull_ CI checks yet")
-            return False
-        
-        # Check if all completed pull_ checks passed
-        failed_checks = []
-        for check in pull_checks:
-            if check['status'] == 'completed':
-                if check['conclusion'] not in ['success', 'skipped']:
-                    failed_checks.append(f"{check['name']}({check['conclusion']})")
-        
-        if failed_checks:
-            self.logger.info(f"PR #{pr_number} failed pull_ checks: {', '.join(failed_checks)}")
-            return False
-        
-        self.logger.info(f"PR #{pr_number} all pull_ CI checks passed")
-        return True
+        elif not passed:
+            failed = [f"{check['name']}({check['conclusion']})" for check in failed_checks(status, expected)]
+            failed += [f"{name}(missing)" for name in missing_checks(status, expected)]
+            self.logger.info(f"PR #{pr_number} failed pull_ checks: {', '.join(failed)}")
+        else:
+            self.logger.info(f"PR #{pr_number} all pull_ CI checks passed")
+        return passed
     
     def close_pull_request(self, pr_number: int) -> bool:
         """Close a pull request"""
         try:
-            pr = self.repo.get_pull(pr_number)
-            pr.edit(state='closed')
+            pr = self._call(lambda: self.repo.get_pull(pr_number))
+            self._call(lambda: pr.edit(state='closed'), WRITE)
             self.logger.info(f"Closed PR #{pr_number}")
             return True
         except GithubException as e:
@@ -254,8 +388,8 @@ class GitHubClient:
     def create_pr_comment(self, pr_number: int, comment: str) -> bool:
         """Create a comment on a pull request"""
         try:
-            pr = self.repo.get_pull(pr_number)
-            pr.create_issue_comment(comment)
+            pr = self._call(lambda: self.repo.get_pull(pr_number))
+            self._call(lambda: pr.create_issue_comment(comment), WRITE)
             self.logger.info(f"Created comment on PR #{pr_number}: {comment}")
             return True
         except GithubException as e:
@@ -265,8 +399,8 @@ class GitHubClient:
     def delete_branch(self, branch_name: str) -> bool:
         """Delete a branch from fork"""
         try:
-            ref = self.fork_repo.get_git_ref(f"heads/{branch_name}")
-            ref.delete()
+            ref = self._call(lambda: self.fork_repo.get_git_ref(f"heads/{branch_name}"))
+            self._call(ref.delete, WRITE)
             self.logger.info(f"Deleted branch: {branch_name}")
             return True
         except GithubException as e:
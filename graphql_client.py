@@ -0,0 +1,248 @@
+"""
+GraphQL backend for batch PR status polling.
+
+Fetches PR state plus statusCheckRollup (check runs and status contexts) for a
+whole list of PRs in one aliased query, instead of 4+ REST round-trips per PR.
+With a CheckResultIndex, PRs seen before are polled incrementally: only their
+unfinished checks are requested, plus a context count to spot new ones.
+"""
+
+import json
+import logging
+from typing import Dict, List, Optional
+
+import requests
+from github import GithubException
+
+from check_index import CheckResultIndex, PollPlan
+from rate_limiter import RateLimitGovernor
+from pr_status import PRStatus, STATUS_STATES_DONE, parse_timestamp
+
+GRAPHQL_URL = 'https://api.github.com/graphql'
+
+CHECK_RUN_FIELDS = '__typename name status conclusion startedAt completedAt detailsUrl'
+STATUS_CONTEXT_FIELDS = '__typename context state description targetUrl createdAt'
+
+CONTEXT_FIELDS = f'''
+          pageInfo {{ hasNextPage endCursor }}
+          nodes {{
+            ... on CheckRun {{ {CHECK_RUN_FIELDS} }}
+            ... on StatusContext {{ {STATUS_CONTEXT_FIELDS} }}
+          }}'''
+
+
+class GraphQLError(Exception):
+    """Raised when the GraphQL endpoint returns no usable data"""
+
+
+def context_to_check(node: Dict) -> Dict:
+    """Convert a statusCheckRollup context node into the get_pr_status check dict shape"""
+    if node['__typename'] == 'CheckRun':
+        return {
+            'name': node['name'],
+            'status': node['status'].lower(),
+            'conclusion': node['conclusion'].lower() if node.get('conclusion') else None,
+            'started_at': parse_timestamp(node.get('startedAt')),
+            'completed_at': parse_timestamp(node.get('completedAt')),
+            'type': 'check_run'
+        }
+
+    # A status context only carries the time of its latest state: the completion time once it is terminal,
+    # while the start of the job is unknown
+    state = node['state'].lower()
+    done = state in STATUS_STATES_DONE
+    return {
+        'name': node['context'],
+        'status': 'completed' if done else 'in_progress',
+        'conclusion': state if done else None,
+        'started_at': None,
+        'completed_at': parse_timestamp(node.get('createdAt')) if done else None,
+        'type': 'status_check',
+        'description': node.get('description'),
+        'target_url': node.get('targetUrl')
+    }
+
+
+class GraphQLStatusPoller:
+    """Batch PR status fetcher built on a single aliased GraphQL query"""
+
+    def __init__(self, token: str, repo_owner: str, repo_name: str,
+                 batch_size: int = 50, session: Optional[requests.Session] = None,
+                 governor: Optional[RateLimitGovernor] = None, index: Optional[CheckResultIndex] = None,
+                 timeout: float = 30):
+        self.repo_owner = repo_owner
+        self.repo_name = repo_name
+        self.batch_size = batch_size
+        self.session = session or requests.Session()
+        self.governor = governor or RateLimitGovernor()
+        self.index = index
+        self.timeout = timeout
+        self.headers = {'Authorization': f'bearer {token}'}
+        self.logger = logging.getLogger(__name__)
+
+    def _pr_selection(self, pr_number: int, cursor: Optional[str]) -> str:
+        """Build the aliased selection for one PR, starting its contexts at cursor"""
+        after = f', after: "{cursor}"' if cursor else ''
+        return f'''
+    pr{pr_number}: pullRequest(number: {pr_number}) {{
+      state merged mergeable
+      commits(last: 1) {{ nodes {{ commit {{ oid
+        statusCheckRollup {{ contexts(first: 100{after}) {{{CONTEXT_FIELDS}
+        }} }}
+      }} }} }}
+    }}'''
+
+    def _incremental_selection(self, pr_number: int, plan: PollPlan) -> str:
+        """Build a selection that asks only for the checks of a PR that have not concluded"""
+        statuses = ''.join(f'\n          s{i}: context(name: {json.dumps(name)}) {{ {STATUS_CONTEXT_FIELDS} }}'
+                           for i, name in enumerate(plan.pending_status_checks))
+        check_runs = ''.join(f'\n          r{i}: checkRuns(last: 1, filterBy: {{checkName: {json.dumps(name)}}}) '
+                             f'{{ nodes {{ {CHECK_RUN_FIELDS} }} }}'
+                             for i, name in enumerate(plan.pending_check_runs))
+        pending = ''
+        if statuses:
+            pending += f'\n        status {{{statuses}\n        }}'
+        if check_runs:
+            pending += f'\n        checkSuites(first: 50) {{ nodes {{{check_runs}\n        }} }}'
+        return f'''
+    pr{pr_number}: pullRequest(number: {pr_number}) {{
+      state merged mergeable
+      commits(last: 1) {{ nodes {{ commit {{ oid
+        statusCheckRollup {{ contexts {{ totalCount }} }}{pending}
+      }} }} }}
+    }}'''
+
+    def _post(self, query: str) -> requests.Response:
+        """POST one query, feeding the response headers to the governor"""
+        response = self.session.post(GRAPHQL_URL, json={'query': query}, headers=self.headers,
+                                     timeout=self.timeout)
+        self.governor.update(response.headers, response.status_code)
+        if response.status_code >= 400:
+            raise GithubException(response.status_code, response.text, dict(response.headers))
+        return response
+
+    def _query(self, cursors: Dict[int, Optional[str]], plans: Optional[Dict[int, PollPlan]] = None) -> Dict:
+        """Run one aliased query for the given PRs (full or incremental) and return the repository data"""
+        selections = ''.join(self._pr_selection(pr_number, cursor) for pr_number, cursor in cursors.items())
+        selections += ''.join(self._incremental_selection(pr_number, plan) for pr_number, plan in (plans or {}).items())
+        query = f'query {{\n  repository(owner: "{self.repo_owner}", name: "{self.repo_name}") {{{selections}\n  }}\n}}'
+
+        response = self.governor.call(lambda: self._post(query), resource='graphql')
+        payload = response.json()
+
+        data = payload.get('data')
+        if payload.get('errors'):
+            messages = '; '.join(error.get('message', '') for error in payload['errors'])
+            if not data or not data.get('repository'):
+                raise GraphQLError(messages)
+            self.logger.warning(f"GraphQL status query returned partial errors: {messages}")
+        return data['repository']
+
+    def _fetch_batch(self, pr_numbers: List[int]) -> Dict[int, PRStatus]:
+        """Fetch one batch of PRs: incremental where the index allows it, full (paged) otherwise"""
+        prs = {}
+        nodes = {pr_number: [] for pr_number in pr_numbers}
+        plans = {}
+        if self.index is not None:
+            plans = {pr_number: plan for pr_number in pr_numbers
+                     if (plan := self.index.plan(pr_number)) is not None}
+        cursors = {pr_number: None for pr_number in pr_numbers if pr_number not in plans}
+        incremental = 0
+
+        while cursors or plans:
+            repository = self._query(cursors, plans)
+            next_cursors = {}
+
+            for pr_number, plan in plans.items():
+                pr = repository.get(f'pr{pr_number}')
+                if pr is None:
+                    continue
+                commit_nodes = pr['commits']['nodes']
+                commit = commit_nodes[0]['commit'] if commit_nodes else None
+                rollup = commit['statusCheckRollup'] if commit else None
+                total = rollup['contexts']['totalCount'] if rollup else 0
+
+                if commit is None or commit['oid'] != plan.head_sha or total != plan.known_count:
+                    # New head commit or new contexts (e.g. after a retest): fall back to a full fetch
+                    next_cursors[pr_number] = None
+                    continue
+
+                prs[pr_number] = pr
+                nodes[pr_number] = self._pending_nodes(commit)
+                incremental += 1
+
+            for pr_number in cursors:
+                pr = repository.get(f'pr{pr_number}')
+                if pr is None:
+                    continue
+                prs[pr_number] = pr
+                if cursors[pr_number] is None:
+                    nodes[pr_number] = []
+
+                commit_nodes = pr['commits']['nodes']
+                rollup = commit_nodes[0]['commit']['statusCheckRollup'] if commit_nodes else None
+                if not rollup:
+                    continue
+
+                contexts = rollup['contexts']
+                nodes[pr_number].extend(contexts['nodes'])
+                if contexts['pageInfo']['hasNextPage']:
+                    next_cursors[pr_number] = contexts['pageInfo']['endCursor']
+
+            cursors = next_cursors
+            plans = {}
+
+        if incremental:
+            self.logger.debug(f"Incremental poll for {incremental}/{len(pr_numbers)} PRs "
+                              f"({self.index.frozen_count()} check results frozen)")
+        return {pr_number: self._build_status(pr_number, prs.get(pr_number), nodes[pr_number])
+                for pr_number in pr_numbers}
+
+    def _pending_nodes(self, commit: Dict) -> List[Dict]:
+        """Collect the check nodes returned by an incremental selection"""
+        collected = [node for node in (commit.get('status') or {}).values() if node]
+        for suite in (commit.get('checkSuites') or {}).get('nodes', []):
+            for runs in suite.values():
+                collected.extend(runs['nodes'])
+        return collected
+
+    def _build_status(self, pr_number: int, pr: Optional[Dict], nodes: List[Dict]) -> PRStatus:
+        """Turn the raw PR node and its collected contexts into a snapshot"""
+        if pr is None:
+            self.logger.warning(f"PR #{pr_number} not returned by GraphQL query")
+            return PRStatus.unknown(pr_number)
+
+        checks = []
+        seen_checks = set()
+        for node in nodes:
+            check = context_to_check(node)
+            if check['type'] == 'status_check':
+                # Deduplicate status contexts by name, as the REST path does
+                if check['name'] in seen_checks:
+                    continue
+                seen_checks.add(check['name'])
+            checks.append(check)
+
+        commit_nodes = pr['commits']['nodes']
+        head_sha = commit_nodes[0]['commit']['oid'] if commit_nodes else None
+        if self.index is not None and head_sha:
+            checks = self.index.observe(pr_number, head_sha, checks)
+
+        mergeable = {'MERGEABLE': True, 'CONFLICTING': False}.get(pr.get('mergeable'))
+        return PRStatus.build(
+            pr_number,
+            'open' if pr['state'] == 'OPEN' else 'closed',
+            checks,
+            merged=pr['merged'],
+            head_sha=head_sha,
+            mergeable=mergeable
+        )
+
+    def fetch_statuses(self, pr_numbers: List[int]) -> Dict[int, PRStatus]:
+        """Fetch status snapshots for all given PRs, batch_size PRs per query"""
+        statuses = {}
+        for i in range(0, len(pr_numbers), self.batch_size):
+            batch = pr_numbers[i:i + self.batch_size]
+            statuses.update(self._fetch_batch(batch))
+        self.logger.debug(f"Fetched status of {len(statuses)} PRs via GraphQL")
+        return statuses
@@ -0,0 +1,184 @@
+"""
+Streaming build-log download with a content-addressed on-disk LRU cache.
+
+Logs are downloaded in chunks and written gzip-compressed to disk while
+being hashed, so memory use does not depend on the log's size (heavy
+integration logs run to hundreds of MB). gzip content encoding is decoded
+on the fly, as are logs stored gzip-compressed themselves; an interrupted
+download is resumed with a Range request where the server supports it.
+Callers then scan the cached file line by line.
+
+Each log is stored once under the SHA-256 of its content (URLs with the
+same log share it); a small SQLite index maps URLs to contents and records
+when each was last used. Once the cache grows past its size cap the least
+recently used logs are evicted. Logs of finished builds do not change, so a
+cached URL is never downloaded again: re-run reports and
+check_detailed_failure.py read the same logs from disk.
+"""
+
+import os
+import gzip
+import zlib
+import time
+import sqlite3
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import IO, Dict, Optional
+
+import requests
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS objects (
+    digest TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS urls (
+    url TEXT PRIMARY KEY,
+    digest TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS objects_last_used ON objects(last_used);
+"""
+
+CHUNK_SIZE = 64 * 1024
+GZIP_MAGIC = b'\x1f\x8b'
+
+
+class LogCache:
+    """Downloads logs by URL into a size-capped, content-addressed LRU cache on disk (safe to share between threads)"""
+
+    def __init__(self, directory: str = 'log_cache', max_bytes: int = 1024 * 1024 * 1024, timeout: float = 30,
+                 retries: int = 3):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.timeout = timeout
+        self.retries = retries
+        self.session = requests.Session()
+        os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(os.path.join(directory, 'index.db'), check_same_thread=False)
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.executescript(SCHEMA)
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_env(cls) -> 'LogCache':
+        """The cache configured by LOG_CACHE_DIR/LOG_CACHE_MAX_MB and FAILURE_LOG_TIMEOUT"""
+        return cls(directory=os.getenv('LOG_CACHE_DIR', 'log_cache'),
+                   max_bytes=int(float(os.getenv('LOG_CACHE_MAX_MB', 1024)) * 1024 * 1024),
+                   timeout=float(os.getenv('FAILURE_LOG_TIMEOUT', 30)))
+
+    def close(self):
+        self.conn.close()
+
+    def _object_path(self, digest: str) -> str:
+        return os.path.join(self.directory, f"{digest}.gz")
+
+    def _cached(self, url: str) -> Optional[str]:
+        """Path of the URL's cached log (marked as just used), if it is cached"""
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT digest FROM urls WHERE url = ?", (url,)).fetchone()
+            if row is None or not os.path.exists(self._object_path(row[0])):
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.conn.execute("UPDATE objects SET last_used = ? WHERE digest = ?", (time.time(), row[0]))
+            return self._object_path(row[0])
+
+    def path(self, url: str) -> str:
+        """Path of the URL's log (gzip-compressed), downloading it unless cached"""
+        path = self._cached(url)
+        if path:
+            return path
+
+        digest, size = self._download(url)
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO objects (digest, size, last_used) VALUES (?, ?, ?)",
+                              (digest, size, time.time()))
+            self.conn.execute("INSERT OR REPLACE INTO urls (url, digest) VALUES (?, ?)", (url, digest))
+            self._evict(keep=digest)
+        return self._object_path(digest)
+
+    def lines(self, url: str) -> IO[str]:
+        """The log opened from the cache, to be read line by line (close it when done)
+
+        The file is opened before returning, so a concurrent eviction cannot remove it before it is read.
+        """
+        try:
+            return gzip.open(self.path(url), 'rt', encoding='utf-8', errors='replace')
+        except FileNotFoundError:
+            # Evicted by another thread between the lookup and the open
+            return gzip.open(self.path(url), 'rt', encoding='utf-8', errors='replace')
+
+    def _download(self, url: str):
+        """Stream the log into the cache directory; returns (content digest, size on disk)"""
+        received = 0  # bytes of the response body so far, the offset a resumed download continues from
+        hasher = hashlib.sha256()
+        decompressor = None
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.part')
+        os.close(handle)
+        writer = gzip.open(temp_path, 'wb')
+        try:
+            for attempt in range(self.retries + 1):
+                # A resumed download asks for the identity encoding so the byte offset means the same thing
+                headers = {'Range': f"bytes={received}-", 'Accept-Encoding': 'identity'} if received else {}
+                try:
+                    with self.session.get(url, headers=headers, stream=True, timeout=self.timeout) as response:
+                        if received and response.status_code != 206:
+                            self.logger.info(f"{url} does not support resuming, downloading it again")
+                            received, hasher, decompressor = 0, hashlib.sha256(), None
+                            writer.close()
+                            writer = gzip.open(temp_path, 'wb')
+                        response.raise_for_status()
+                        for chunk in response.iter_content(CHUNK_SIZE):
+                            if received == 0 and chunk.startswith(GZIP_MAGIC):
+                                # The log itself is stored gzip-compressed (not just sent with gzip encoding)
+                                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                            received += len(chunk)
+                            data = decompressor.decompress(chunk) if decompressor else chunk
+                            hasher.update(data)
+                            writer.write(data)
+                    break
+                except (requests.ConnectionError, requests.exceptions.ChunkedEncodingError) as e:
+                    if attempt == self.retries:
+                        raise
+                    self.logger.warning(f"Download of {url} interrupted after {received} bytes, resuming: {e}")
+            if decompressor:
+                data = decompressor.flush()
+                hasher.update(data)
+                writer.write(data)
+            writer.close()
+
+            digest = hasher.hexdigest()
+            os.replace(temp_path, self._object_path(digest))
+            return digest, os.path.getsize(self._object_path(digest))
+        except Exception:
+            writer.close()
+            os.remove(temp_path)
+            raise
+
+    def _evict(self, keep: str):
+        """Drop least recently used logs until the cache fits its cap (caller holds the lock)"""
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM objects").fetchone()[0]
+        for digest, size in self.conn.execute(
+                "SELECT digest, size FROM objects WHERE digest != ? ORDER BY last_used", (keep,)).fetchall():
+            if total <= self.max_bytes:
+                break
+            self.conn.execute("DELETE FROM objects WHERE digest = ?", (digest,))
+            self.conn.execute("DELETE FROM urls WHERE digest = ?", (digest,))
+            try:
+                os.remove(self._object_path(digest))
+            except FileNotFoundError:
+                pass
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            count, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM objects").fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions, 'logs': count, 'bytes': size}
@@ -4,10 +4,16 @@ import requests
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime
-from typing import Dict, List, Tuple
+from typing import Dict, List, Optional, Tuple
+from pr_status import failed_checks
+from failure_logs import FailureLogAnalyzer, format_causes
 
 class NotificationManager:
-    def __init__(self):
+    def __init__(self, repo_full_name: str = 'pingcap/ticdc', target_name: Optional[str] = None):
+        # Repository the PR links point at, and the target named in reports when several run side by side
+        self.repo_full_name = repo_full_name
+        self.target_label = f" [{target_name}]" if target_name else ""
+        
         # Load configuration
         self.email_enabled = os.getenv('EMAIL_ENABLED', 'false').lower() == 'true'
         self.feishu_enabled = os.getenv('FEISHU_ENABLED', 'false').lower() == 'true'
@@ -21,19 +27,24 @@ class NotificationManager:
         
         # Feishu configuration
         self.feishu_webhook_url = os.getenv('FEISHU_WEBHOOK_URL')
+        
+        # Groups failed checks of detailed reports by the cause found in their build logs
+        self.failure_analyzer = FailureLogAnalyzer.from_env()
     
     def send_email_report(self, test_results: Dict, failed_prs: List[Tuple[int, str]], 
-                         total_prs: int, passed_count: int, failed_count: int):
+                         total_prs: int, passed_count: int, failed_count: int, failure_details: Optional[Dict] = None,
+                         history_report: Optional[str] = None):
         """Send email notification with test results"""
         if not self.email_enabled or not all([self.email_username, self.email_password, self.email_to]):
             return False
         
         try:
             # Create email content
-            subject = f"TiCDC Stability Test Report - {datetime.now().strftime('%Y-%m-%d')}"
+            subject = f"TiCDC Stability Test Report{self.target_label} - {datetime.now().strftime('%Y-%m-%d')}"
             
             # Build email body
-            body = self._build_email_content(test_results, failed_prs, total_prs, passed_count, failed_count)
+            body = self._build_email_content(test_results, failed_prs, total_prs, passed_count, failed_count,
+                                             failure_details, history_report)
             
             # Create message
             msg = MIMEMultipart()
@@ -58,14 +69,15 @@ class NotificationManager:
             return False
     
     def send_feishu_report(self, test_results: Dict, failed_prs: List[Tuple[int, str]], 
-                          total_prs: int, passed_count: int, failed_count: int):
+                          total_prs: int, passed_count: int, failed_count: int, history_report: Optional[str] = None):
         """Send Feishu notification with test results"""
         if not self.feishu_enabled or not self.feishu_webhook_url:
             return False
         
         try:
             # Build Feishu message
-            message = self._build_feishu_content(test_results, failed_prs, total_prs, passed_count, failed_count)
+            message = self._build_feishu_content(test_results, failed_prs, total_prs, passed_count, failed_count,
+                                                 history_report)
             
             # Send to Feishu webhook
             response = requests.post(
@@ -86,10 +98,11 @@ class NotificationManager:
             return False
     
     def _build_email_content(self, test_results: Dict, failed_prs: List[Tuple[int, str]], 
-                           total_prs: int, passed_count: int, failed_count: int) -> str:
-        """Build email content"""
+                           total_prs: int, passed_count: int, failed_count: int,
+                           failure_details: Optional[Dict] = None, history_report: Optional[str] = None) -> str:
+        """Build email content (failed tests come from the PR conclusions captured during the run)"""
         content = f"""
-TiCDC Stability Test Report
+TiCDC Stability Test Report{self.target_label}
 Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 
 Summary:
@@ -104,31 +117,37 @@ Summary:
             content += "=" * 50 + "\n"
             
             for pr_number, branch_name in failed_prs:
-                pr_link = f"https://github.com/pingcap/ticdc/pull/{pr_number}"
+                pr_link = f"https://github.com/{self.repo_full_name}/pull/{pr_number}"
                 content += f"PR #{pr_number}: {pr_link}\n"
                 
-                # Get failed test details
-                status = self._get_pr_status(pr_number)
-                if status:
-                    pull_checks = [check for check in status['checks'] if check['name'].startswith('pull-')]
-                    failed_tests = [check['name'] for check in pull_checks 
-                                   if check['status'] == 'completed' and check['conclusion'] not in ['success', 'skipped']]
+                # Failed test details, as captured when the PR concluded
+                conclusion = (failure_details or {}).get(pr_number)
+                if conclusion:
+                    failed_tests = [f"{check['name']} ({conclusion.outcomes[check['name']]})"
+                                    if check['name'] in conclusion.outcomes else check['name']
+                                    for check in conclusion.failed]
                     
                     if failed_tests:
                         content += f"  Failed tests: {', '.join(failed_tests)}\n"
+                    elif conclusion.missing:
+                        content += f"  Status: Expected checks never reported: {', '.join(conclusion.missing)}\n"
                     else:
                         content += f"  Status: Tests timed out or not completed\n"
                 
                 content += "\n"
         
+        if history_report:
+            content += "\n" + history_report + "\n"
+        
         content += "\nThis is an automated report from TiCDC Stability Test System."
         return content
     
     def _build_feishu_content(self, test_results: Dict, failed_prs: List[Tuple[int, str]], 
-                             total_prs: int, passed_count: int, failed_count: int) -> Dict:
+                             total_prs: int, passed_count: int, failed_count: int,
+                             history_report: Optional[str] = None) -> Dict:
         """Build Feishu message content"""
         # Create summary text
-        summary_text = f"TiCDC稳定性测试报告 - {datetime.now().strftime('%Y-%m-%d')}\n"
+        summary_text = f"TiCDC稳定性测试报告{self.target_label} - {datetime.now().strftime('%Y-%m-%d')}\n"
         summary_text += f"总PR数: {total_prs} | 通过: {passed_count} | 失败: {failed_count}"
         
         # Create content parts
@@ -140,10 +159,13 @@ Summary:
             content_parts.append([{"tag": "text", "text": "\n**失败的PR:**"}])
             
             for pr_number, branch_name in failed_prs:
-                pr_link = f"https://github.com/pingcap/ticdc/pull/{pr_number}"
+                pr_link = f"https://github.com/{self.repo_full_name}/pull/{pr_number}"
                 pr_text = f"\n• [PR #{pr_number}]({pr_link})"
                 content_parts.append([{"tag": "text", "text": pr_text}])
         
+        if history_report:
+            content_parts.append([{"tag": "text", "text": "\n" + history_report}])
+        
         # Build Feishu message
         message = {
             "msg_type": "post",
@@ -159,26 +181,20 @@ Summary:
         
         return message
     
-    def _get_pr_status(self, pr_number: int) -> Dict:
-        """Get PR status (simplified version for notification)"""
-        try:
-            # This is a simplified version - in practice, you'd pass the status from the main test
-            return None
-        except:
-            return None
-    
     def send_notification(self, test_results: Dict, failed_prs: List[Tuple[int, str]], 
-                         total_prs: int, passed_count: int, failed_count: int):
-        """Send all enabled notifications"""
+                         total_prs: int, passed_count: int, failed_count: int, failure_details: Optional[Dict] = None,
+                         history_report: Optional[str] = None):
+        """Send all enabled notifications (failure_details: PR number -> PRConclusion captured during the run)"""
         print("📧 Sending notifications...")
         
         # Send email notification
         if self.email_enabled:
-            self.send_email_report(test_results, failed_prs, total_prs, passed_count, failed_count)
+            self.send_email_report(test_results, failed_prs, total_prs, passed_count, failed_count, failure_details,
+                                   history_report)
         
         # Send Feishu notification
         if self.feishu_enabled:
-            self.send_feishu_report(test_results, failed_prs, total_prs, passed_count, failed_count)
+            self.send_feishu_report(test_results, failed_prs, total_prs, passed_count, failed_count, history_report)
     
     def send_detailed_notification(self, test_results: Dict, failed_prs: List[Tuple[int, str]], 
                                  total_prs: int, passed_count: int, failed_count: int, github_client=None):
@@ -201,7 +217,7 @@ Summary:
         
         try:
             # Create email content
-            subject = f"TiCDC Stability Test Report - {datetime.now().strftime('%Y-%m-%d')}"
+            subject = f"TiCDC Stability Test Report{self.target_label} - {datetime.now().strftime('%Y-%m-%d')}"
             
             # Build detailed email body
             body = self._build_detailed_email_content(test_results, failed_prs, total_prs, passed_count, failed_count, github_client)
@@ -260,7 +276,7 @@ Summary:
                                     total_prs: int, passed_count: int, failed_count: int, github_client=None) -> str:
         """Build detailed email content with failure details"""
         content = f"""
-TiCDC Stability Test Report
+TiCDC Stability Test Report{self.target_label}
 Date: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}
 
 Summary:
@@ -273,22 +289,23 @@ Summary:
         if failed_count > 0:
             content += "Failed PRs:\n"
             content += "=" * 50 + "\n"
+            snapshots = self._fetch_pr_snapshots(failed_prs, github_client)
+            all_failed = []
             
             for pr_number, branch_name in failed_prs:
-                pr_link = f"https://github.com/pingcap/ticdc/pull/{pr_number}"
+                pr_link = f"https://github.com/{self.repo_full_name}/pull/{pr_number}"
                 content += f"PR #{pr_number}: {pr_link}\n"
                 
                 # Get detailed failed test information
                 if github_client:
                     try:
-                        status = github_client.get_pr_status(pr_number)
-                        pull_checks = [check for check in status['checks'] if check['name'].startswith('pull-')]
-                        failed_checks = [check for check in pull_checks 
-                                       if check['status'] == 'completed' and check['conclusion'] not in ['success', 'skipped']]
+                        snapshot = snapshots.get(pr_number) or github_client.get_pr_snapshot(pr_number)
+                        failed = failed_checks(snapshot)
+                        all_failed += [(pr_number, check) for check in failed]
                         
-                        if failed_checks:
-                            content += f"  Failed tests ({len(failed_checks)}):\n"
-                            for check in failed_checks:
+                        if failed:
+                            content += f"  Failed tests ({len(failed)}):\n"
+                            for check in failed:
                                 content += f"    ❌ {check['name']}\n"
                                 if 'description' in check and check['description']:
                                     content += f"      Details: {check['description']}\n"
@@ -302,6 +319,10 @@ Summary:
                     content += f"  Failed tests: Unable to get details\n"
                 
                 content += "\n"
+            
+            cause_lines = self._failure_causes(all_failed)
+            if cause_lines:
+                content += '\n'.join(cause_lines) + "\n"
         
         content += "\nThis is an automated report from TiCDC Stability Test System."
         return content
@@ -310,7 +331,7 @@ Summary:
                                      total_prs: int, passed_count: int, failed_count: int, github_client=None) -> Dict:
         """Build detailed Feishu message content with failure details"""
         # Create summary text
-        summary_text = f"TiCDC稳定性测试报告 - {datetime.now().strftime('%Y-%m-%d')}\n"
+        summary_text = f"TiCDC稳定性测试报告{self.target_label} - {datetime.now().strftime('%Y-%m-%d')}\n"
         summary_text += f"总PR数: {total_prs} | 通过: {passed_count} | 失败: {failed_count}"
         
         # Create detailed content
@@ -320,22 +341,23 @@ Summary:
         
         if failed_count > 0:
             content_parts.append([{"tag": "text", "text": "\n失败的PR详情:"}])
+            snapshots = self._fetch_pr_snapshots(failed_prs, github_client)
+            all_failed = []
             
             for pr_number, branch_name in failed_prs:
-                pr_link = f"https://github.com/pingcap/ticdc/pull/{pr_number}"
+                pr_link = f"https://github.com/{self.repo_full_name}/pull/{pr_number}"
                 pr_text = f"\n• PR #{pr_number}: {pr_link}"
                 
                 # Get detailed failed test information
                 if github_client:
                     try:
-                        status = github_client.get_pr_status(pr_number)
-                        pull_checks = [check for check in status['checks'] if check['name'].startswith('pull-')]
-                        failed_checks = [check for check in pull_checks 
-                                       if check['status'] == 'completed' and check['conclusion'] not in ['success', 'skipped']]
+                        snapshot = snapshots.get(pr_number) or github_client.get_pr_snapshot(pr_number)
+                        failed = failed_checks(snapshot)
+                        all_failed += [(pr_number, check) for check in failed]
                         
-                        if failed_checks:
-                            pr_text += f"\n  失败测试 ({len(failed_checks)}):"
-                            for check in failed_checks:
+                        if failed:
+                            pr_text += f"\n  失败测试 ({len(failed)}):"
+                            for check in failed:
                                 pr_text += f"\n    ❌ {check['name']}"
                                 if 'description' in check and check['description']:
                                     pr_text += f"\n      详情: {check['description']}"
@@ -349,6 +371,10 @@ Summary:
                     pr_text += f"\n  失败测试: 无法获取详细信息"
                 
                 content_parts.append([{"tag": "text", "text": pr_text}])
+            
+            cause_lines = self._failure_causes(all_failed)
+            if cause_lines:
+                content_parts.append([{"tag": "text", "text": "\n" + '\n'.join(cause_lines)}])
         
         # Build Feishu message
         message = {
@@ -365,6 +391,49 @@ Summary:
         
         return message
     
+    def _fetch_pr_snapshots(self, failed_prs: List[Tuple[int, str]], github_client=None) -> Dict:
+        """Fetch status snapshots for all failed PRs in one batch (empty on failure, callers fetch per PR)"""
+        if not github_client:
+            return {}
+        try:
+            return github_client.get_pr_snapshots([pr_number for pr_number, branch_name in failed_prs])
+        except Exception as e:
+            print(f"⚠️  Batch status fetch failed, fetching per PR: {e}")
+            return {}
+    
+    def _failure_causes(self, failed: List[Tuple[int, Dict]]) -> List[str]:
+        """Report lines grouping (PR number, failed check) pairs by cause (empty if disabled or on error)"""
+        if not self.failure_analyzer or not failed:
+            return []
+        try:
+            return format_causes(self.failure_analyzer.analyze(failed))
+        except Exception as e:
+            print(f"⚠️  Failure log analysis failed: {e}")
+            return []
+    
+    def send_progress_notification(self, message: str):
+        """Send a short progress update (e.g. the run's expected finish time) to Feishu"""
+        if not self.feishu_enabled or not self.feishu_webhook_url:
+            return False
+        
+        try:
+            response = requests.post(
+                self.feishu_webhook_url,
+                json={"msg_type": "text", "content": {"text": message}},
+                headers={'Content-Type': 'application/json'}
+            )
+            
+            if response.status_code == 200:
+                print("✅ Progress notification sent to Feishu")
+                return True
+            else:
+                print(f"❌ Failed to send progress notification: {response.status_code}")
+                return False
+                
+        except Exception as e:
+            print(f"❌ Failed to send progress notification: {e}")
+            return False
+    
     def send_error_notification(self, error_message: str):
         """Send error notification to Feishu"""
         if not self.feishu_enabled or not self.feishu_webhook_url:
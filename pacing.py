@@ -0,0 +1,65 @@
+"""
+CI-load-aware pacing of PR creation.
+
+Rather than a fixed gap between PRs, the next PR is opened when the number of
+our pull-cdc-* jobs still queued or running (plus the jobs the new PR would
+add) fits under a concurrency target, bounded by a minimum and a maximum
+spacing between PRs. The load counts the jobs of every unfinished run in the
+ledger, so overlapping and multi-target runs pace against each other.
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Iterable, Optional
+
+from pr_status import PRStatus, FINISHED_STATUSES
+
+CHECK_PREFIX = 'pull-cdc-'
+
+
+def queued_or_running(status: Optional[PRStatus], expected: Optional[Iterable[str]] = None,
+                      prefix: str = CHECK_PREFIX) -> int:
+    """Count a PR's jobs that are not finished; expected jobs not reported yet count as queued"""
+    if status is None:
+        return len(list(expected or []))
+    unfinished = sum(1 for check in status.checks
+                     if check['name'].startswith(prefix) and check['status'] not in FINISHED_STATUSES)
+    if expected is not None:
+        reported = {check['name'] for check in status.checks}
+        unfinished += sum(1 for name in expected if name not in reported)
+    return unfinished
+
+
+class PacingController:
+    """Decides when the next PR may be opened based on our in-flight CI load"""
+
+    def __init__(self, concurrency_target: int = 21, min_spacing_minutes: float = 10,
+                 max_spacing_minutes: float = 60):
+        self.concurrency_target = concurrency_target
+        self.min_spacing = timedelta(minutes=min_spacing_minutes)
+        self.max_spacing = timedelta(minutes=max_spacing_minutes)
+        self.logger = logging.getLogger(__name__)
+
+    def may_create(self, now: datetime, last_created: Optional[datetime], load: int, new_jobs: int) -> bool:
+        """True if a PR adding new_jobs may be opened now, given load jobs still queued/running"""
+        if last_created is None:
+            return True
+        elapsed = now - last_created
+        if elapsed < self.min_spacing:
+            return False
+        if elapsed >= self.max_spacing:
+            self.logger.info(f"Max spacing reached with {load} jobs in flight, creating next PR anyway")
+            return True
+        if load + new_jobs <= self.concurrency_target:
+            self.logger.info(f"CI load {load} + {new_jobs} within target {self.concurrency_target}, creating next PR")
+            return True
+        self.logger.debug(f"CI load {load} + {new_jobs} above target {self.concurrency_target}, holding next PR")
+        return False
+
+    def next_decision(self, now: datetime, last_created: Optional[datetime]) -> Optional[datetime]:
+        """Latest time the next creation decision is due (min spacing, else max spacing)"""
+        if last_created is None:
+            return now
+        if now < last_created + self.min_spacing:
+            return last_created + self.min_spacing
+        return last_created + self.max_spacing
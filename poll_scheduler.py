@@ -0,0 +1,87 @@
+"""
+ETA-driven poll scheduling.
+
+Instead of polling every PR every CHECK_INTERVAL_MINUTES, each PR sits in a
+heap keyed by its next due time. After a poll, the PR's next poll is planned
+from the expected finish of its slowest outstanding job (median historical
+trigger-to-completion time): far from that ETA it is polled rarely, close to
+it often, and once past it the gap grows back towards the flat interval.
+A PR is also polled at the next job deadline, so hung jobs are not noticed
+late. PRs without history fall back to the flat interval. Gaps stay between
+POLL_MIN_MINUTES and POLL_MAX_MINUTES.
+"""
+
+import heapq
+import itertools
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from pr_status import PRStatus, FINISHED_STATUSES, pull_checks
+
+
+class PollScheduler:
+    """Min-heap of PRs ordered by next poll due time"""
+
+    def __init__(self):
+        self.heap = []
+        self.due_at: Dict[int, datetime] = {}
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+
+    def schedule(self, pr_number: int, due: datetime):
+        """(Re)schedule a PR; an earlier entry for it is superseded"""
+        with self.lock:
+            self.due_at[pr_number] = due
+            heapq.heappush(self.heap, (due, next(self.counter), pr_number))
+
+    def remove(self, pr_number: int):
+        with self.lock:
+            self.due_at.pop(pr_number, None)
+
+    def _prune(self):
+        """Drop heap entries superseded by a later schedule() or remove()"""
+        while self.heap and self.due_at.get(self.heap[0][2]) != self.heap[0][0]:
+            heapq.heappop(self.heap)
+
+    def pop_due(self, now: datetime) -> List[int]:
+        """PRs whose poll is due at now, removed from the schedule"""
+        due = []
+        with self.lock:
+            self._prune()
+            while self.heap and self.heap[0][0] <= now:
+                _, _, pr_number = heapq.heappop(self.heap)
+                del self.due_at[pr_number]
+                due.append(pr_number)
+                self._prune()
+        return due
+
+    def next_due(self) -> Optional[datetime]:
+        with self.lock:
+            self._prune()
+            return self.heap[0][0] if self.heap else None
+
+    def __contains__(self, pr_number: int) -> bool:
+        with self.lock:
+            return pr_number in self.due_at
+
+
+def outstanding_jobs(status: PRStatus, expected: Optional[List[str]] = None) -> List[str]:
+    """Jobs of the PR not finished yet, including expected ones not reported at all"""
+    finished = {check['name'] for check in pull_checks(status, expected) if check['status'] in FINISHED_STATUSES}
+    names = expected if expected is not None else [check['name'] for check in pull_checks(status)]
+    return [name for name in names if name not in finished]
+
+
+def poll_delay(now: datetime, eta: Optional[datetime], base: timedelta, minimum: timedelta,
+               maximum: timedelta, next_deadline: Optional[datetime] = None) -> timedelta:
+    """Gap until a PR's next poll: half the time left to its ETA, growing again once the ETA has passed"""
+    if eta is None:
+        delay = base
+    elif eta > now:
+        delay = min((eta - now) / 2, maximum)
+    else:
+        delay = min((now - eta) / 2, base)
+    if next_deadline is not None and next_deadline > now:
+        delay = min(delay, next_deadline - now)
+    return max(delay, minimum)
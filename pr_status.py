@@ -0,0 +1,154 @@
+"""
+Immutable PR status snapshots and pure evaluation helpers.
+
+A PRStatus is produced by a single fetch and can be evaluated any number of
+times (complete? passed? which checks failed?) without touching the GitHub API.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from types import MappingProxyType
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+PULL_CHECK_PREFIX = 'pull-'
+FINISHED_STATUSES = ('completed', 'skipped')
+PASSING_CONCLUSIONS = ('success', 'skipped')
+STATUS_STATES_DONE = ('success', 'failure', 'error')
+
+
+def parse_timestamp(value: Optional[str]) -> Optional[datetime]:
+    """Parse a GitHub ISO-8601 timestamp into a naive UTC datetime (same as PyGithub)"""
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
+
+def check_run_to_check(check_run: Dict) -> Dict:
+    """Convert a REST check-run (GitHub Actions) into the check dict shape"""
+    return {
+        'name': check_run['name'],
+        'status': check_run['status'],
+        'conclusion': check_run.get('conclusion'),
+        'started_at': parse_timestamp(check_run.get('started_at')),
+        'completed_at': parse_timestamp(check_run.get('completed_at')),
+        'type': 'check_run'
+    }
+
+
+def status_to_check(status: Dict) -> Dict:
+    """Convert a REST commit status (Prow/Jenkins) into the check dict shape"""
+    state = status['state']
+    return {
+        'name': status['context'],
+        'status': 'completed' if state in STATUS_STATES_DONE else 'in_progress',
+        'conclusion': state if state in STATUS_STATES_DONE else None,
+        'started_at': parse_timestamp(status.get('created_at')),
+        'completed_at': parse_timestamp(status.get('updated_at')),
+        'type': 'status_check',
+        'description': status.get('description'),
+        'target_url': status.get('target_url')
+    }
+
+
+def checks_from_rest(check_runs: Iterable[Dict], statuses: Iterable[Dict]) -> List[Dict]:
+    """Build the check list from REST check-runs and statuses (newest status per context wins)"""
+    checks = [check_run_to_check(check_run) for check_run in check_runs]
+
+    seen_checks = set()
+    for status in statuses:
+        if status['context'] in seen_checks:
+            continue
+        seen_checks.add(status['context'])
+        checks.append(status_to_check(status))
+    return checks
+
+
+@dataclass(frozen=True)
+class PRStatus:
+    """Point-in-time view of a PR and its CI checks"""
+    pr_number: int
+    state: str
+    merged: bool = False
+    checks: Tuple[Mapping, ...] = ()
+    head_sha: Optional[str] = None
+    mergeable: Optional[bool] = None
+    mergeable_state: Optional[str] = None
+
+    @classmethod
+    def build(cls, pr_number: int, state: str, checks: Iterable[Dict] = (), **kwargs) -> 'PRStatus':
+        """Build a snapshot, freezing every check dict"""
+        frozen_checks = tuple(MappingProxyType(dict(check)) for check in checks)
+        return cls(pr_number=pr_number, state=state, checks=frozen_checks, **kwargs)
+
+    @classmethod
+    def unknown(cls, pr_number: int) -> 'PRStatus':
+        """Snapshot used when the PR status could not be fetched"""
+        return cls(pr_number=pr_number, state='unknown')
+
+    @property
+    def commit_sha(self) -> Optional[str]:
+        """Short head commit SHA, as shown in logs and reports"""
+        return self.head_sha[:8] if self.head_sha else None
+
+    def to_dict(self) -> Dict:
+        """Return the legacy dict shape used by get_pr_status"""
+        return {
+            'state': self.state,
+            'merged': self.merged,
+            'checks': [dict(check) for check in self.checks],
+            'commit_sha': self.commit_sha,
+            'mergeable': self.mergeable,
+            'mergeable_state': self.mergeable_state
+        }
+
+
+def pull_checks(status: PRStatus, expected: Optional[Iterable[str]] = None) -> List[Mapping]:
+    """Return the CI checks a run evaluates: the expected ones if given, else every pull- check"""
+    if expected is not None:
+        expected = set(expected)
+        return [check for check in status.checks if check['name'] in expected]
+    return [check for check in status.checks if check['name'].startswith(PULL_CHECK_PREFIX)]
+
+
+def missing_checks(status: PRStatus, expected: Optional[Iterable[str]] = None) -> List[str]:
+    """Return expected check names that have not been reported on the PR yet"""
+    if expected is None:
+        return []
+    reported = {check['name'] for check in status.checks}
+    return [name for name in expected if name not in reported]
+
+
+def incomplete_checks(status: PRStatus, expected: Optional[Iterable[str]] = None) -> List[Mapping]:
+    """Return evaluated checks that have not finished yet"""
+    return [check for check in pull_checks(status, expected) if check['status'] not in FINISHED_STATUSES]
+
+
+def completed_checks(status: PRStatus, expected: Optional[Iterable[str]] = None) -> List[Mapping]:
+    """Return evaluated checks that have finished"""
+    return [check for check in pull_checks(status, expected) if check['status'] == 'completed']
+
+
+def failed_checks(status: PRStatus, expected: Optional[Iterable[str]] = None) -> List[Mapping]:
+    """Return finished evaluated checks whose conclusion is not a pass"""
+    return [check for check in completed_checks(status, expected) if check['conclusion'] not in PASSING_CONCLUSIONS]
+
+
+def is_tests_complete(status: PRStatus, expected: Optional[Iterable[str]] = None) -> bool:
+    """True when the PR is closed/merged or all of its checks finished (and every expected one was reported)"""
+    if status.state in ['closed', 'merged']:
+        return True
+    return (bool(pull_checks(status, expected)) and not incomplete_checks(status, expected)
+            and not missing_checks(status, expected))
+
+
+def are_tests_passed(status: PRStatus, expected: Optional[Iterable[str]] = None) -> bool:
+    """True when the PR is merged or all of its checks (every expected one) finished and passed"""
+    if status.merged or status.state == 'merged':
+        return True
+    if status.state == 'closed':
+        return False
+    return (bool(pull_checks(status, expected)) and not failed_checks(status, expected)
+            and not missing_checks(status, expected))
@@ -0,0 +1,176 @@
+"""
+Rate-limit-aware request governor for all GitHub calls.
+
+Tracks the remaining core/graphql/search budgets from response headers,
+honours secondary-limit Retry-After, keeps a share of the budget reserved for
+the write path (branch/PR/comment creation) and stretches poll intervals
+smoothly as the read budget shrinks.
+"""
+
+import time
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Mapping, Optional
+
+import requests
+from github import GithubException
+
+RESOURCES = ('core', 'graphql', 'search')
+DEFAULT_LIMITS = {'core': 5000, 'graphql': 5000, 'search': 30}
+
+READ = 'read'
+WRITE = 'write'
+
+
+@dataclass
+class RateBudget:
+    """Last known budget of one rate-limit resource"""
+    limit: int
+    remaining: int
+    reset_at: float = 0.0
+
+
+def is_transient(error: Exception) -> bool:
+    """Connection problems and 5xx responses are worth retrying on the read path"""
+    if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+        return True
+    return isinstance(error, GithubException) and error.status >= 500
+
+
+class RateLimitGovernor:
+    """Central pacing point that every GitHub request goes through"""
+
+    def __init__(self, write_reserve: float = 0.2, min_write_spacing: float = 1.0,
+                 max_retries: int = 3, retry_delay: float = 5.0,
+                 clock: Callable[[], float] = time.time, sleep: Callable[[float], None] = time.sleep):
+        self.write_reserve = write_reserve
+        self.min_write_spacing = min_write_spacing
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.clock = clock
+        self.sleep = sleep
+        self.budgets = {resource: RateBudget(limit, limit) for resource, limit in DEFAULT_LIMITS.items()}
+        self.blocked_until = 0.0
+        self.last_write_at = 0.0
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def update_budget(self, resource: str, remaining: int, limit: int, reset_at: float):
+        """Record the budget reported by GitHub for a resource"""
+        with self.lock:
+            self.budgets[resource] = RateBudget(limit, remaining, reset_at)
+
+    def update(self, headers: Optional[Mapping[str, str]], status_code: Optional[int] = None):
+        """Update budgets and secondary-limit blocks from a response's headers"""
+        if not headers:
+            return
+        headers = {key.lower(): value for key, value in headers.items()}
+
+        if 'x-ratelimit-remaining' in headers:
+            self.update_budget(
+                headers.get('x-ratelimit-resource', 'core'),
+                int(float(headers['x-ratelimit-remaining'])),
+                int(float(headers.get('x-ratelimit-limit', 0))),
+                float(headers.get('x-ratelimit-reset', 0))
+            )
+
+        if status_code in (403, 429):
+            now = self.clock()
+            with self.lock:
+                if 'retry-after' in headers:
+                    # Secondary rate limit: GitHub tells us exactly how long to back off
+                    self.blocked_until = max(self.blocked_until, now + float(headers['retry-after']))
+                elif headers.get('x-ratelimit-remaining') == '0':
+                    self.blocked_until = max(self.blocked_until, float(headers.get('x-ratelimit-reset', now + 60)))
+
+    def _reserve(self, resource: str) -> int:
+        """Number of calls on a resource kept back for the write path"""
+        return int(self.budgets[resource].limit * self.write_reserve)
+
+    def delay(self, resource: str = 'core', path: str = READ) -> float:
+        """Seconds to wait before the next call on resource/path may be issued"""
+        now = self.clock()
+        with self.lock:
+            return self._delay(resource, path, now)
+
+    def _delay(self, resource: str, path: str, now: float) -> float:
+        wait = self.blocked_until - now
+        budget = self.budgets[resource]
+        floor = 0 if path == WRITE else self._reserve(resource)
+        if budget.remaining <= floor and budget.reset_at > now:
+            wait = max(wait, budget.reset_at - now)
+        if path == WRITE:
+            wait = max(wait, self.last_write_at + self.min_write_spacing - now)
+        return max(wait, 0.0)
+
+    def schedule(self, resource: str = 'core', path: str = READ) -> float:
+        """Reserve a slot for one call and return how long to wait for it (never sleeps)"""
+        now = self.clock()
+        with self.lock:
+            wait = self._delay(resource, path, now)
+            if path == WRITE:
+                # Claim the write slot now so concurrent writers queue up behind it
+                self.last_write_at = now + wait
+        if wait > 5:
+            self.logger.info(f"Rate-limit governor pausing {path} path for {wait:.0f}s ({resource} budget)")
+        return wait
+
+    def acquire(self, resource: str = 'core', path: str = READ):
+        """Block until a call on resource/path is allowed"""
+        wait = self.schedule(resource, path)
+        if wait > 0:
+            self.sleep(wait)
+
+    def on_error(self, error: Exception, resource: str, path: str, attempt: int,
+                 transient: Callable[[Exception], bool] = is_transient) -> Optional[float]:
+        """Decide whether a failed call is retried; returns the backoff to sleep, or None to give up
+        (transient tells retryable errors of the caller's HTTP library apart)"""
+        if attempt >= self.max_retries - 1:
+            return None
+        if isinstance(error, GithubException) and error.status in (403, 429) and error.headers:
+            self.update(error.headers, error.status)
+            if self.blocked_until > self.clock():
+                self.logger.warning(f"Rate limited on {resource} ({path}), backing off: {error}")
+                # The next schedule() waits for the block to lift
+                return 0.0
+        if path == READ and transient(error):
+            backoff = self.retry_delay * (2 ** attempt)  # Exponential backoff
+            self.logger.warning(f"Attempt {attempt + 1} failed: {error}. Retrying in {backoff:.0f} seconds...")
+            return backoff
+        return None
+
+    def call(self, fn: Callable, resource: str = 'core', path: str = READ):
+        """Run fn under the governor, retrying rate-limit rejections (and transient read errors)"""
+        for attempt in range(self.max_retries):
+            self.acquire(resource, path)
+            try:
+                return fn()
+            except Exception as e:
+                backoff = self.on_error(e, resource, path, attempt)
+                if backoff is None:
+                    raise
+                if backoff > 0:
+                    self.sleep(backoff)
+
+    def poll_interval(self, base_seconds: float, calls_per_tick: int, resource: str = 'core') -> float:
+        """Stretch a poll interval so the read budget lasts until the next reset"""
+        now = self.clock()
+        with self.lock:
+            budget = self.budgets[resource]
+            available = budget.remaining - self._reserve(resource)
+            until_reset = max(budget.reset_at - now, 0.0)
+
+        if until_reset == 0:
+            return base_seconds
+        if available <= 0:
+            return max(base_seconds, until_reset)
+
+        affordable_ticks = available / max(calls_per_tick, 1)
+        return max(base_seconds, until_reset / affordable_ticks)
+
+    def stats(self) -> Dict[str, Dict]:
+        """Return the last known budget of every resource"""
+        with self.lock:
+            return {resource: {'remaining': budget.remaining, 'limit': budget.limit, 'reset_at': budget.reset_at}
+                    for resource, budget in self.budgets.items()}
@@ -0,0 +1,65 @@
+"""
+Small on-disk cache of resolved repository/fork metadata.
+
+Resolving the fork costs get_user + user.get_repo (and maybe create_fork) on
+every GitHubClient construction. The result rarely changes, so it is kept in a
+JSON file with a TTL, keyed by a hash of the token and the upstream repo.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+from typing import Dict, Optional
+
+
+class RepoMetadataCache:
+    """JSON file cache of fork metadata with a time-to-live"""
+
+    def __init__(self, path: str = '.github_repo_cache.json', ttl_hours: float = 24):
+        self.path = path
+        self.ttl_seconds = ttl_hours * 3600
+        self.logger = logging.getLogger(__name__)
+
+    @staticmethod
+    def make_key(token: str, repo_full_name: str) -> str:
+        """Cache key that changes when the token or the upstream repo changes"""
+        token_hash = hashlib.sha256(token.encode('utf-8')).hexdigest()[:16]
+        return f"{token_hash}:{repo_full_name}"
+
+    def _load(self) -> Dict:
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, key: str) -> Optional[Dict]:
+        """Return cached metadata for key, or None if missing or expired"""
+        entry = self._load().get(key)
+        if entry is None or time.time() - entry.get('saved_at', 0) > self.ttl_seconds:
+            return None
+        return entry
+
+    def _save(self, entries: Dict):
+        """Write all entries (atomically)"""
+        tmp_path = f"{self.path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(entries, f, indent=2)
+            os.replace(tmp_path, self.path)
+        except OSError as e:
+            self.logger.warning(f"Could not write repo metadata cache {self.path}: {e}")
+
+    def put(self, key: str, metadata: Dict):
+        """Store metadata for key"""
+        entries = self._load()
+        entries[key] = dict(metadata, saved_at=time.time())
+        self._save(entries)
+
+    def invalidate(self, key: str):
+        """Drop a cached entry (e.g. when the fork turned out to be gone)"""
+        entries = self._load()
+        if entries.pop(key, None) is not None:
+            self._save(entries)
@@ -0,0 +1,151 @@
+"""
+Conditional-request (ETag / Last-Modified) layer for GitHub REST reads.
+
+GitHub does not count 304 Not Modified responses against the rate limit, so
+every read endpoint is requested with If-None-Match / If-Modified-Since and
+unchanged responses are served from a size-bounded LRU cache.
+"""
+
+import re
+import logging
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+import requests
+from github import GithubException
+
+from rate_limiter import RateLimitGovernor
+
+API_URL = 'https://api.github.com'
+LINK_NEXT_RE = re.compile(r'<([^>]+)>;\s*rel="next"')
+
+
+@dataclass
+class CacheEntry:
+    """Cached body of one GET response plus its validators"""
+    body: Any
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    next_url: Optional[str] = None
+
+
+class ConditionalRequestCache:
+    """Size-bounded LRU cache of conditional-request validators and bodies"""
+
+    def __init__(self, max_entries: int = 512):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, url: str) -> Optional[CacheEntry]:
+        """Return the entry for url, marking it most recently used"""
+        with self.lock:
+            entry = self.entries.get(url)
+            if entry is not None:
+                self.entries.move_to_end(url)
+            return entry
+
+    def put(self, url: str, entry: CacheEntry):
+        """Store an entry, evicting the least recently used ones beyond max_entries"""
+        with self.lock:
+            self.entries[url] = entry
+            self.entries.move_to_end(url)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def record_hit(self):
+        with self.lock:
+            self.hits += 1
+
+    def record_miss(self):
+        with self.lock:
+            self.misses += 1
+
+    def stats(self) -> Dict[str, float]:
+        """Return hit/miss counters; every hit is one request not charged to the quota"""
+        with self.lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self.entries),
+                'hit_rate': self.hits / total if total else 0.0
+            }
+
+
+class CachedRestReader:
+    """Issues conditional GET requests against the GitHub REST API"""
+
+    def __init__(self, token: str, cache: Optional[ConditionalRequestCache] = None,
+                 session: Optional[requests.Session] = None, governor: Optional[RateLimitGovernor] = None,
+                 timeout: float = 30):
+        self.cache = cache or ConditionalRequestCache()
+        self.session = session or requests.Session()
+        self.governor = governor or RateLimitGovernor()
+        self.timeout = timeout
+        self.headers = {
+            'Authorization': f'token {token}',
+            'Accept': 'application/vnd.github+json'
+        }
+        self.logger = logging.getLogger(__name__)
+
+    def _get(self, url: str) -> CacheEntry:
+        """GET one URL under the governor (every page is one request to it), revalidating any cached copy"""
+        return self.governor.call(lambda: self._send(url))
+
+    def _send(self, url: str) -> CacheEntry:
+        headers = dict(self.headers)
+        cached = self.cache.get(url)
+        if cached is not None:
+            if cached.etag:
+                headers['If-None-Match'] = cached.etag
+            if cached.last_modified:
+                headers['If-Modified-Since'] = cached.last_modified
+
+        response = self.session.get(url, headers=headers, timeout=self.timeout)
+        self.governor.update(response.headers, response.status_code)
+
+        if response.status_code == 304 and cached is not None:
+            self.cache.record_hit()
+            return cached
+
+        if response.status_code >= 400:
+            try:
+                data = response.json()
+            except ValueError:
+                data = response.text
+            raise GithubException(response.status_code, data, dict(response.headers))
+
+        self.cache.record_miss()
+        link = LINK_NEXT_RE.search(response.headers.get('Link', ''))
+        entry = CacheEntry(
+            body=response.json(),
+            etag=response.headers.get('ETag'),
+            last_modified=response.headers.get('Last-Modified'),
+            next_url=link.group(1) if link else None
+        )
+        if entry.etag or entry.last_modified:
+            self.cache.put(url, entry)
+        return entry
+
+    def get_json(self, path: str) -> Any:
+        """GET an API path (e.g. /repos/o/r/pulls/1) and return its JSON body"""
+        return self._get(f"{API_URL}{path}").body
+
+    def get_paginated(self, path: str, items_key: Optional[str] = None) -> List:
+        """GET every page of a list endpoint; items_key selects the list in wrapped responses"""
+        separator = '&' if '?' in path else '?'
+        url = f"{API_URL}{path}{separator}per_page=100"
+        items = []
+        while url:
+            entry = self._get(url)
+            items.extend(entry.body[items_key] if items_key else entry.body)
+            url = entry.next_url
+        return items
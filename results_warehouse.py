@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Historical results warehouse.
+
+Every run, its PRs (head SHA and the base/master SHA they branched from) and
+the final outcome of every check with its start/end timestamps are appended
+to an indexed SQLite file as each PR concludes. Unlike the run ledger (the
+working state of runs, kept for resuming them) the warehouse only grows, and
+it is laid out for cross-day questions, which it answers without any GitHub
+calls (see USAGE).
+
+Runs get their own ids, mapped from (ledger file, ledger run id): a recreated
+ledger numbers its runs from 1 again, which must not overwrite earlier runs.
+Checks still running when their PR timed out are stored as 'timed_out' and
+left out of pass/fail counts. Check timestamps are UTC, run and PR times
+local, like everywhere else in the project.
+"""
+
+import os
+import sys
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from pr_status import FINISHED_STATUSES
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ledger_path TEXT,
+    ledger_run_id INTEGER,
+    repo TEXT NOT NULL,
+    base_branch TEXT NOT NULL,
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    status TEXT
+);
+CREATE TABLE IF NOT EXISTS prs (
+    run_id INTEGER NOT NULL,
+    pr_number INTEGER NOT NULL,
+    branch_name TEXT NOT NULL,
+    head_sha TEXT,
+    base_sha TEXT,
+    triggered_at TEXT,
+    concluded_at TEXT NOT NULL,
+    passed INTEGER NOT NULL,
+    timed_out INTEGER NOT NULL,
+    PRIMARY KEY (run_id, pr_number)
+);
+CREATE TABLE IF NOT EXISTS check_results (
+    run_id INTEGER NOT NULL,
+    pr_number INTEGER NOT NULL,
+    day TEXT NOT NULL,
+    repo TEXT NOT NULL,
+    base_branch TEXT NOT NULL,
+    head_sha TEXT,
+    base_sha TEXT,
+    name TEXT NOT NULL,
+    conclusion TEXT NOT NULL,
+    outcome TEXT,
+    started_at TEXT,
+    completed_at TEXT,
+    PRIMARY KEY (run_id, pr_number, name)
+);
+CREATE INDEX IF NOT EXISTS check_results_name_day ON check_results(name, day);
+CREATE INDEX IF NOT EXISTS check_results_day ON check_results(day);
+CREATE INDEX IF NOT EXISTS check_results_base_sha ON check_results(base_sha);
+"""
+
+MISSING_CONCLUSION = 'missing'
+TIMED_OUT_CONCLUSION = 'timed_out'
+# Conclusions that are not a pass or a fail of the job
+UNREPORTED_CONCLUSIONS = (MISSING_CONCLUSION, TIMED_OUT_CONCLUSION)
+# Check statuses stored as conclusions by earlier versions for checks cut off by a timeout
+UNFINISHED_STATUSES = ('queued', 'in_progress', 'waiting', 'pending', 'requested')
+
+USAGE = """Usage:
+  python results_warehouse.py pass-rate [days] [job]  - Pass rate per job (default: last 30 days)
+  python results_warehouse.py runs [days]             - Runs and their PR results"""
+
+
+def _timestamp(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _unconcluded(check) -> str:
+    """What to store for a check without a conclusion: its status if finished, else it was cut off by a timeout"""
+    return check['status'] if check['status'] in FINISHED_STATUSES else TIMED_OUT_CONCLUSION
+
+
+class ResultsWarehouse:
+    """Append-only SQLite store of run, PR and per-check results for analytics (safe to share between threads)"""
+
+    def __init__(self, path: str = 'stability_results.db'):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.executescript(SCHEMA)
+            self._migrate()
+        self.logger = logging.getLogger(__name__)
+
+    def _migrate(self):
+        """Bring warehouse files created by earlier versions up to date"""
+        columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(runs)")}
+        if 'ledger_run_id' not in columns:
+            # Earlier runs were keyed by their ledger run id; which ledger file they came from is unknown
+            self.conn.execute("ALTER TABLE runs ADD COLUMN ledger_path TEXT")
+            self.conn.execute("ALTER TABLE runs ADD COLUMN ledger_run_id INTEGER")
+            self.conn.execute("UPDATE runs SET ledger_run_id = run_id")
+        self.conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS runs_ledger_run ON runs(ledger_path, ledger_run_id)")
+        self.conn.execute(f"UPDATE check_results SET conclusion = ? "
+                          f"WHERE conclusion IN ({', '.join('?' * len(UNFINISHED_STATUSES))})",
+                          (TIMED_OUT_CONCLUSION,) + UNFINISHED_STATUSES)
+
+    def close(self):
+        self.conn.close()
+
+    def _query(self, sql: str, params=()) -> List[sqlite3.Row]:
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def record_run(self, ledger_path: str, ledger_run_id: int, repo: str, base_branch: str,
+                   started_at: Optional[datetime] = None) -> int:
+        """Add a ledger's run and return its warehouse run id (a resumed run gets its existing id and start)"""
+        ledger_path = os.path.abspath(ledger_path)
+        with self.lock, self.conn:
+            row = self.conn.execute("SELECT run_id FROM runs WHERE ledger_path = ? AND ledger_run_id = ?",
+                                    (ledger_path, ledger_run_id)).fetchone()
+            if row is not None:
+                return row['run_id']
+            cursor = self.conn.execute(
+                "INSERT INTO runs (ledger_path, ledger_run_id, repo, base_branch, started_at) VALUES (?, ?, ?, ?, ?)",
+                (ledger_path, ledger_run_id, repo, base_branch, _timestamp(started_at or datetime.now()))
+            )
+            return cursor.lastrowid
+
+    def finish_run(self, run_id: int, status: str):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE runs SET finished_at = ?, status = ? WHERE run_id = ?",
+                              (_timestamp(datetime.now()), status, run_id))
+
+    def record_pr(self, run_id: int, conclusion, triggered_at: Optional[datetime] = None,
+                  base_sha: Optional[str] = None):
+        """Append a concluded PR (a run_orchestrator.PRConclusion) of a warehouse run and the outcome of each of its
+        checks (checks still running when the PR timed out as 'timed_out')"""
+        with self.lock:
+            run = self.conn.execute("SELECT repo, base_branch FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if run is None:
+            self.logger.warning(f"Run {run_id} not in the results warehouse, not recording PR #{conclusion.pr_number}")
+            return
+
+        day = (triggered_at or conclusion.concluded_at).strftime('%Y-%m-%d')
+        rows = [(run_id, conclusion.pr_number, day, run['repo'], run['base_branch'], conclusion.head_sha, base_sha,
+                 check['name'], check.get('conclusion') or _unconcluded(check), conclusion.outcomes.get(check['name']),
+                 _timestamp(check.get('started_at')), _timestamp(check.get('completed_at')))
+                for check in conclusion.checks]
+        rows += [(run_id, conclusion.pr_number, day, run['repo'], run['base_branch'], conclusion.head_sha, base_sha,
+                  name, MISSING_CONCLUSION, None, None, None)
+                 for name in conclusion.missing]
+
+        with self.lock, self.conn:
+            self.conn.execute(
+                """INSERT OR REPLACE INTO prs (run_id, pr_number, branch_name, head_sha, base_sha, triggered_at,
+                                               concluded_at, passed, timed_out)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (run_id, conclusion.pr_number, conclusion.branch_name, conclusion.head_sha, base_sha,
+                 _timestamp(triggered_at), _timestamp(conclusion.concluded_at), int(conclusion.passed),
+                 int(conclusion.timed_out))
+            )
+            self.conn.executemany(
+                """INSERT OR REPLACE INTO check_results (run_id, pr_number, day, repo, base_branch, head_sha, base_sha,
+                                                         name, conclusion, outcome, started_at, completed_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                rows
+            )
+
+    def pass_rates(self, days: int = 30, name: Optional[str] = None) -> List[Dict]:
+        """Per job over the last days: results, passes, failures, flaky passes and pass rate"""
+        since = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+        sql = """SELECT name,
+                        COUNT(*) AS total,
+                        SUM(conclusion IN ('success', 'skipped')) AS passed,
+                        SUM(conclusion NOT IN ('success', 'skipped')) AS failed,
+                        COALESCE(SUM(outcome = 'flaky-pass-on-retry'), 0) AS flaky
+                 FROM check_results WHERE day >= ? AND conclusion != ?"""
+        params = [since, TIMED_OUT_CONCLUSION]
+        if name:
+            sql += " AND name = ?"
+            params.append(name)
+        sql += " GROUP BY name ORDER BY name"
+        return [dict(row, pass_rate=row['passed'] / row['total']) for row in self._query(sql, params)]
+
+    def check_outcomes(self, days: int = 30, prefix: str = '') -> List[Tuple[str, str, str, Optional[str]]]:
+        """(job, day, conclusion, retest outcome) of every check result of the last days, oldest first"""
+        since = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+        rows = self._query("SELECT name, day, conclusion, outcome FROM check_results WHERE day >= ? AND name LIKE ? "
+                           "ORDER BY day", (since, prefix + '%'))
+        return [tuple(row) for row in rows]
+
+    def base_sha_results(self, repo: str, base_branch: str, days: int = 30, prefix: str = '') -> List[Dict]:
+        """Per job and base SHA of one repo's base branch over the last days: results, first-attempt failures and
+        when the SHA was first run, oldest SHA first ('missing' and 'timed_out' results left out)"""
+        since = (datetime.now() - timedelta(days=days)).strftime('%Y-%m-%d')
+        rows = self._query(
+            """SELECT c.name, c.base_sha,
+                      COUNT(*) AS total,
+                      SUM(c.conclusion NOT IN ('success', 'skipped')
+                          OR COALESCE(c.outcome, '') = 'flaky-pass-on-retry') AS failed,
+                      s.first_seen
+               FROM check_results c
+               JOIN (SELECT p.base_sha, MIN(COALESCE(p.triggered_at, p.concluded_at)) AS first_seen
+                     FROM prs p JOIN runs r ON r.run_id = p.run_id
+                     WHERE p.base_sha IS NOT NULL AND r.repo = ? AND r.base_branch = ?
+                     GROUP BY p.base_sha) s ON s.base_sha = c.base_sha
+               WHERE c.repo = ? AND c.base_branch = ? AND c.day >= ? AND c.name LIKE ? AND c.conclusion NOT IN (?, ?)
+               GROUP BY c.name, c.base_sha ORDER BY s.first_seen, c.name""",
+            (repo, base_branch, repo, base_branch, since, prefix + '%') + UNREPORTED_CONCLUSIONS
+        )
+        return [dict(row) for row in rows]
+
+    def run_summaries(self, days: int = 30) -> List[Dict]:
+        """Runs started in the last days with their PR pass/fail counts"""
+        since = _timestamp(datetime.now() - timedelta(days=days))
+        rows = self._query(
+            """SELECT r.run_id, r.repo, r.base_branch, r.started_at, r.status,
+                      COUNT(p.pr_number) AS prs, COALESCE(SUM(p.passed), 0) AS passed
+               FROM runs r LEFT JOIN prs p ON p.run_id = r.run_id
+               WHERE r.started_at >= ? GROUP BY r.run_id ORDER BY r.run_id""",
+            (since,)
+        )
+        return [dict(row) for row in rows]
+
+
+def main():
+    """Command line queries (no GitHub access needed)"""
+    load_dotenv('config.env')
+    warehouse = ResultsWarehouse(os.getenv('WAREHOUSE_PATH', 'stability_results.db'))
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    days = int(sys.argv[2]) if len(sys.argv) > 2 else 30
+
+    if command == 'pass-rate':
+        name = sys.argv[3] if len(sys.argv) > 3 else None
+        print(f"Pass rate per job, last {days} days")
+        print(f"{'job':<45} {'runs':>5} {'pass':>5} {'fail':>5} {'flaky':>5} {'rate':>7}")
+        for row in warehouse.pass_rates(days, name):
+            print(f"{row['name']:<45} {row['total']:>5} {row['passed']:>5} {row['failed']:>5} "
+                  f"{row['flaky']:>5} {row['pass_rate']:>7.1%}")
+    elif command == 'runs':
+        print(f"Runs, last {days} days")
+        for row in warehouse.run_summaries(days):
+            print(f"  Run {row['run_id']} {row['repo']}@{row['base_branch']} {row['started_at'][:16].replace('T', ' ')} "
+                  f"{row['status'] or 'running'}: {row['passed']}/{row['prs']} PRs passed")
+    else:
+        print(USAGE)
+
+
+if __name__ == "__main__":
+    main()
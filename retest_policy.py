@@ -0,0 +1,120 @@
+"""
+Automatic retest of failed pull-* jobs.
+
+When a PR's jobs finish with failures, each failed job with retest budget
+left (per job and per run) is triggered again and the PR keeps running
+instead of concluding. Results reported before the retest was requested are
+stale: until the job reports again they are shown as queued, so neither the
+pass/fail logic nor the frozen check index concludes on them. When the PR
+finally concludes every job is classified:
+
+    pass                 passed on the first attempt
+    flaky-pass-on-retry  failed, then passed when retested
+    consistent-fail      failed again when retested
+    fail                 failed and was not retested (budget exhausted)
+"""
+
+import os
+import logging
+import threading
+from dataclasses import replace
+from datetime import datetime, timezone
+from typing import Dict, Iterable, List, Mapping, Optional, Tuple
+
+from pr_status import PRStatus, PULL_CHECK_PREFIX
+
+OUTCOME_PASS = 'pass'
+OUTCOME_FLAKY = 'flaky-pass-on-retry'
+OUTCOME_CONSISTENT_FAIL = 'consistent-fail'
+OUTCOME_FAIL = 'fail'
+
+
+def _to_utc(value: datetime) -> datetime:
+    """Naive local time -> naive UTC, the form check timestamps are parsed into"""
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+class RetestPolicy:
+    """Retests failed pull-* jobs within per-job and per-run budgets and classifies the outcomes"""
+
+    def __init__(self, per_job_budget: int = 1, per_run_budget: int = 10, prefix: str = PULL_CHECK_PREFIX):
+        self.per_job_budget = per_job_budget
+        self.per_run_budget = per_run_budget
+        self.prefix = prefix
+        self.retests: Dict[Tuple[int, str], int] = {}
+        self.requested_at: Dict[Tuple[int, str], datetime] = {}
+        self.used = 0
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_env(cls) -> Optional['RetestPolicy']:
+        """The policy configured by RETEST_ENABLED/RETEST_PER_JOB/RETEST_PER_RUN, or None if disabled"""
+        if os.getenv('RETEST_ENABLED', 'false').lower() != 'true':
+            return None
+        return cls(per_job_budget=int(os.getenv('RETEST_PER_JOB', 1)),
+                   per_run_budget=int(os.getenv('RETEST_PER_RUN', 10)))
+
+    def select(self, pr_number: int, failed: Iterable[Mapping]) -> List[str]:
+        """Names of failed jobs with retest budget left (nothing is used until record() is called)"""
+        selected = []
+        with self.lock:
+            for check in failed:
+                name = check['name']
+                if not name.startswith(self.prefix):
+                    continue
+                if self.retests.get((pr_number, name), 0) >= self.per_job_budget:
+                    continue
+                if self.used + len(selected) >= self.per_run_budget:
+                    self.logger.info(f"Run retest budget ({self.per_run_budget}) used up, not retesting {name} on PR #{pr_number}")
+                    break
+                selected.append(name)
+        return selected
+
+    def record(self, pr_number: int, names: Iterable[str]):
+        """Use budget for jobs whose retest was actually requested (the /test comment was posted)"""
+        with self.lock:
+            for name in names:
+                self.retests[(pr_number, name)] = self.retests.get((pr_number, name), 0) + 1
+                self.requested_at[(pr_number, name)] = datetime.now()
+                self.used += 1
+
+    def retest_count(self, pr_number: int, name: str) -> int:
+        with self.lock:
+            return self.retests.get((pr_number, name), 0)
+
+    def last_retest(self, pr_number: int) -> Optional[datetime]:
+        """When a retest was last requested on the PR, if ever"""
+        with self.lock:
+            times = [requested for (number, name), requested in self.requested_at.items() if number == pr_number]
+        return max(times) if times else None
+
+    def stale_checks(self, status: PRStatus) -> List[str]:
+        """Retested checks whose latest result still predates the retest request"""
+        stale = []
+        with self.lock:
+            for check in status.checks:
+                requested = self.requested_at.get((status.pr_number, check['name']))
+                if requested is None or check['status'] != 'completed':
+                    continue
+                if check.get('completed_at') is None or check['completed_at'] < _to_utc(requested):
+                    stale.append(check['name'])
+        return stale
+
+    def mask(self, status: PRStatus, stale: List[str]) -> PRStatus:
+        """The snapshot with stale results shown as queued until the retested jobs report again"""
+        if not stale:
+            return status
+        checks = [dict(check, status='queued', conclusion=None, completed_at=None) if check['name'] in stale
+                  else check for check in status.checks]
+        return replace(status, checks=PRStatus.build(status.pr_number, status.state, checks).checks)
+
+    def classify(self, pr_number: int, passed: Iterable[str], failed: Iterable[str]) -> Dict[str, str]:
+        """Outcome of every finished job of a concluded PR"""
+        outcomes = {}
+        with self.lock:
+            for name in passed:
+                outcomes[name] = OUTCOME_FLAKY if (pr_number, name) in self.retests else OUTCOME_PASS
+            for name in failed:
+                outcomes[name] = OUTCOME_CONSISTENT_FAIL if (pr_number, name) in self.retests else OUTCOME_FAIL
+        return outcomes
@@ -0,0 +1,280 @@
+"""
+Durable SQLite ledger of stability runs.
+
+Runs, their PRs (branch, lifecycle state, trigger/conclusion times, expected
+checks), the latest observation of every check and, with retests enabled, the
+outcome of every job (pass / flaky / consistent fail) are written as each step
+completes, so a restarted process can pick unfinished runs back up and the
+helper scripts can look PRs up instead of keeping hand-maintained lists.
+"""
+
+import json
+import sqlite3
+import logging
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from pacing import CHECK_PREFIX, queued_or_running
+from pr_status import PRStatus
+from run_orchestrator import PRRun, ACTIVE_STATES, CLEANED_UP
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    repo TEXT NOT NULL,
+    base_branch TEXT NOT NULL DEFAULT 'master',
+    started_at TEXT NOT NULL,
+    finished_at TEXT,
+    status TEXT NOT NULL DEFAULT 'running',
+    pr_count INTEGER NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS prs (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    pr_number INTEGER NOT NULL,
+    pr_index INTEGER NOT NULL,
+    branch_name TEXT NOT NULL,
+    state TEXT NOT NULL,
+    created_at TEXT NOT NULL,
+    triggered_at TEXT,
+    concluded_at TEXT,
+    passed INTEGER,
+    timed_out INTEGER NOT NULL DEFAULT 0,
+    expected_checks TEXT,
+    base_sha TEXT,
+    PRIMARY KEY (run_id, pr_number)
+);
+CREATE INDEX IF NOT EXISTS prs_state ON prs(state);
+CREATE INDEX IF NOT EXISTS prs_pr_number ON prs(pr_number);
+CREATE TABLE IF NOT EXISTS check_observations (
+    run_id INTEGER REFERENCES runs(id),
+    pr_number INTEGER NOT NULL,
+    head_sha TEXT NOT NULL,
+    name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    conclusion TEXT,
+    started_at TEXT,
+    completed_at TEXT,
+    observed_at TEXT NOT NULL,
+    PRIMARY KEY (pr_number, head_sha, name)
+);
+CREATE TABLE IF NOT EXISTS job_outcomes (
+    run_id INTEGER NOT NULL REFERENCES runs(id),
+    pr_number INTEGER NOT NULL,
+    name TEXT NOT NULL,
+    outcome TEXT NOT NULL,
+    retests INTEGER NOT NULL DEFAULT 0,
+    recorded_at TEXT NOT NULL,
+    PRIMARY KEY (run_id, pr_number, name)
+);
+"""
+
+RUN_RUNNING = 'running'
+RUN_FINISHED = 'finished'
+RUN_FAILED = 'failed'
+RUN_CANCELLED = 'cancelled'
+
+
+def _timestamp(value: Optional[datetime]) -> Optional[str]:
+    return value.isoformat() if value else None
+
+
+def _parse(value: Optional[str]) -> Optional[datetime]:
+    return datetime.fromisoformat(value) if value else None
+
+
+class RunLedger:
+    """SQLite-backed record of runs, PRs and check observations (safe to share between threads)"""
+
+    def __init__(self, path: str = 'stability_ledger.db'):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.lock = threading.Lock()
+        with self.lock, self.conn:
+            self.conn.executescript(SCHEMA)
+            self._migrate()
+        self.logger = logging.getLogger(__name__)
+
+    def _migrate(self):
+        """Add columns introduced after a ledger file was created"""
+        columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(runs)")}
+        if 'base_branch' not in columns:
+            self.conn.execute("ALTER TABLE runs ADD COLUMN base_branch TEXT NOT NULL DEFAULT 'master'")
+        pr_columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(prs)")}
+        if 'base_sha' not in pr_columns:
+            self.conn.execute("ALTER TABLE prs ADD COLUMN base_sha TEXT")
+        check_columns = {row['name'] for row in self.conn.execute("PRAGMA table_info(check_observations)")}
+        if 'run_id' not in check_columns:
+            self.conn.execute("ALTER TABLE check_observations ADD COLUMN run_id INTEGER REFERENCES runs(id)")
+
+    def close(self):
+        self.conn.close()
+
+    def _execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        with self.lock, self.conn:
+            return self.conn.execute(sql, params)
+
+    def _query(self, sql: str, params=()) -> List[sqlite3.Row]:
+        with self.lock:
+            return self.conn.execute(sql, params).fetchall()
+
+    def start_run(self, repo: str, pr_count: int, base_branch: str = 'master') -> int:
+        """Record a new run of a target and return its id"""
+        cursor = self._execute(
+            "INSERT INTO runs (repo, base_branch, started_at, pr_count) VALUES (?, ?, ?, ?)",
+            (repo, base_branch, _timestamp(datetime.now()), pr_count)
+        )
+        self.logger.info(f"Started run {cursor.lastrowid} in ledger {self.path}")
+        return cursor.lastrowid
+
+    def finish_run(self, run_id: int, status: str = RUN_FINISHED):
+        self._execute("UPDATE runs SET finished_at = ?, status = ? WHERE id = ?",
+                      (_timestamp(datetime.now()), status, run_id))
+
+    def record_attempts(self, run_id: int, attempts: int):
+        """Record how many PR creations the run has attempted (resume continues from there)"""
+        self._execute("UPDATE runs SET attempts = ? WHERE id = ?", (attempts, run_id))
+
+    def get_run(self, run_id: int) -> Optional[Dict]:
+        rows = self._query("SELECT * FROM runs WHERE id = ?", (run_id,))
+        return dict(rows[0]) if rows else None
+
+    def unfinished_runs(self) -> List[int]:
+        """Ids of runs that never finished (e.g. the process was killed), oldest first"""
+        return [row['id'] for row in self._query("SELECT id FROM runs WHERE status = ? ORDER BY id", (RUN_RUNNING,))]
+
+    def latest_run_id(self) -> Optional[int]:
+        rows = self._query("SELECT MAX(id) AS id FROM runs")
+        return rows[0]['id'] if rows else None
+
+    def record_pr(self, run_id: int, run: PRRun, expected_checks: Optional[List[str]] = None):
+        """Insert or update a PR of a run"""
+        self._execute(
+            """INSERT INTO prs (run_id, pr_number, pr_index, branch_name, state, created_at, triggered_at,
+                                concluded_at, passed, timed_out, expected_checks, base_sha)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (run_id, pr_number) DO UPDATE SET
+                   state = excluded.state,
+                   triggered_at = excluded.triggered_at,
+                   concluded_at = excluded.concluded_at,
+                   passed = excluded.passed,
+                   timed_out = excluded.timed_out,
+                   expected_checks = COALESCE(excluded.expected_checks, prs.expected_checks),
+                   base_sha = COALESCE(excluded.base_sha, prs.base_sha)""",
+            (run_id, run.pr_number, run.index, run.branch_name, run.state, _timestamp(run.created_at),
+             _timestamp(run.triggered_at), _timestamp(run.concluded_at),
+             None if run.passed is None else int(run.passed), int(run.timed_out),
+             json.dumps(expected_checks) if expected_checks is not None else None, run.base_sha)
+        )
+
+    def record_result(self, run_id: int, pr_number: int, passed: bool):
+        """Record a PR's conclusion (used by the sequential flow, which does not track PRRun objects)"""
+        self._execute("UPDATE prs SET state = 'concluded', concluded_at = ?, passed = ? WHERE run_id = ? AND pr_number = ?",
+                      (_timestamp(datetime.now()), int(passed), run_id, pr_number))
+
+    def mark_cleaned_up(self, run_id: int, pr_number: int):
+        self._execute("UPDATE prs SET state = ? WHERE run_id = ? AND pr_number = ?", (CLEANED_UP, run_id, pr_number))
+
+    @staticmethod
+    def _row_to_run(row: sqlite3.Row) -> PRRun:
+        return PRRun(
+            index=row['pr_index'],
+            pr_number=row['pr_number'],
+            branch_name=row['branch_name'],
+            state=row['state'],
+            created_at=_parse(row['created_at']),
+            triggered_at=_parse(row['triggered_at']),
+            concluded_at=_parse(row['concluded_at']),
+            passed=None if row['passed'] is None else bool(row['passed']),
+            timed_out=bool(row['timed_out']),
+            base_sha=row['base_sha']
+        )
+
+    def load_prs(self, run_id: int) -> List[PRRun]:
+        """PRs of a run in creation order"""
+        rows = self._query("SELECT * FROM prs WHERE run_id = ? ORDER BY pr_index", (run_id,))
+        return [self._row_to_run(row) for row in rows]
+
+    def load_expected_checks(self, run_id: int) -> Dict[int, List[str]]:
+        rows = self._query("SELECT pr_number, expected_checks FROM prs WHERE run_id = ? AND expected_checks IS NOT NULL",
+                           (run_id,))
+        return {row['pr_number']: json.loads(row['expected_checks']) for row in rows}
+
+    def prs_to_clean_up(self, run_id: Optional[int] = None) -> List[Dict]:
+        """PRs still open in the ledger: every one of run_id, or the passed ones of all runs"""
+        if run_id is not None:
+            rows = self._query("SELECT run_id, pr_number, branch_name FROM prs WHERE run_id = ? AND state != ?",
+                               (run_id, CLEANED_UP))
+        else:
+            rows = self._query("SELECT run_id, pr_number, branch_name FROM prs WHERE passed = 1 AND state != ?",
+                               (CLEANED_UP,))
+        return [dict(row) for row in rows]
+
+    def ci_load(self, prefix: str = CHECK_PREFIX) -> int:
+        """Jobs still queued or running on the active PRs of every unfinished run, as of each run's last poll
+        (overlapping and multi-target runs share the CI; expected jobs not reported yet count as queued)"""
+        active = """JOIN runs r ON r.id = p.run_id WHERE r.status = ? AND p.state IN (?, ?)"""
+        params = (RUN_RUNNING,) + ACTIVE_STATES
+        checks = {}
+        # Latest observation of each check (SQLite takes the bare columns from the MAX row)
+        for row in self._query(
+                f"""SELECT c.run_id, c.pr_number, c.name, c.status, MAX(c.observed_at)
+                    FROM check_observations c JOIN prs p ON p.run_id = c.run_id AND p.pr_number = c.pr_number
+                    {active} GROUP BY c.run_id, c.pr_number, c.name""", params):
+            checks.setdefault((row['run_id'], row['pr_number']), []).append(
+                {'name': row['name'], 'status': row['status']})
+        rows = self._query(f"SELECT p.run_id, p.pr_number, p.expected_checks FROM prs p {active}", params)
+        load = 0
+        for row in rows:
+            status = PRStatus.build(row['pr_number'], 'open', checks.get((row['run_id'], row['pr_number']), []))
+            expected = json.loads(row['expected_checks']) if row['expected_checks'] else None
+            load += queued_or_running(status, expected, prefix)
+        return load
+
+    def record_job_outcomes(self, run_id: int, pr_number: int, outcomes: Dict[str, str], retests: Dict[str, int]):
+        """Store the classified outcome of every job of a concluded PR"""
+        recorded_at = _timestamp(datetime.now())
+        with self.lock, self.conn:
+            self.conn.executemany(
+                """INSERT OR REPLACE INTO job_outcomes (run_id, pr_number, name, outcome, retests, recorded_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                [(run_id, pr_number, name, outcome, retests.get(name, 0), recorded_at)
+                 for name, outcome in outcomes.items()]
+            )
+
+    def load_job_outcomes(self, run_id: int) -> Dict[int, Dict[str, str]]:
+        """Classified job outcomes of a run, per PR"""
+        outcomes = {}
+        for row in self._query("SELECT pr_number, name, outcome FROM job_outcomes WHERE run_id = ?", (run_id,)):
+            outcomes.setdefault(row['pr_number'], {})[row['name']] = row['outcome']
+        return outcomes
+
+    def job_completions(self, since: Optional[datetime] = None) -> List[Tuple[str, datetime, datetime]]:
+        """(job name, PR trigger time, completion time) of finished jobs that were not retested"""
+        rows = self._query(
+            """SELECT c.name, p.triggered_at, c.completed_at
+               FROM check_observations c
+               JOIN prs p ON p.run_id = c.run_id AND p.pr_number = c.pr_number
+               LEFT JOIN job_outcomes o ON o.run_id = p.run_id AND o.pr_number = c.pr_number AND o.name = c.name
+               WHERE c.status = 'completed' AND c.completed_at IS NOT NULL AND p.triggered_at IS NOT NULL
+                 AND p.triggered_at >= ? AND COALESCE(o.retests, 0) = 0""",
+            (_timestamp(since or datetime.min),)
+        )
+        return [(row['name'], _parse(row['triggered_at']), _parse(row['completed_at'])) for row in rows]
+
+    def record_checks(self, run_id: int, status: PRStatus):
+        """Store the latest observation of each check of a run's PR snapshot"""
+        if not status.head_sha:
+            return
+        observed_at = _timestamp(datetime.now())
+        with self.lock, self.conn:
+            self.conn.executemany(
+                """INSERT OR REPLACE INTO check_observations
+                   (run_id, pr_number, head_sha, name, status, conclusion, started_at, completed_at, observed_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                [(run_id, status.pr_number, status.head_sha, check['name'], check['status'], check.get('conclusion'),
+                  _timestamp(check.get('started_at')), _timestamp(check.get('completed_at')), observed_at)
+                 for check in status.checks]
+            )
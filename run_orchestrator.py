@@ -0,0 +1,292 @@
+"""
+Pipelined run orchestration.
+
+Instead of creating every PR first (sleeping between them) and only then
+monitoring, each PR moves through its own state machine:
+
+    created -> triggered -> running -> concluded -> cleaned_up
+
+and one loop both opens new PRs on their schedule and polls, reports and
+cleans up the earlier ones, so the first results are acted on while later
+PRs are still being created. A PR is handed to the test's completion hook
+(test.complete_pr) the moment it concludes, with its failure detail taken
+from the concluding snapshot. With a RunLedger every step is persisted, and
+an interrupted run can be resumed from the ledger.
+"""
+
+import logging
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Dict, List, Mapping, Optional
+
+from pacing import PacingController, queued_or_running
+from pr_status import PRStatus, pull_checks, completed_checks, failed_checks, missing_checks
+
+CREATED = 'created'
+TRIGGERED = 'triggered'
+RUNNING = 'running'
+CONCLUDED = 'concluded'
+CLEANED_UP = 'cleaned_up'
+
+ACTIVE_STATES = (TRIGGERED, RUNNING)
+FINAL_STATES = (CONCLUDED, CLEANED_UP)
+
+
+class RunCancelled(Exception):
+    """Raised inside a run when it has been asked to stop"""
+
+
+@dataclass
+class PRRun:
+    """One stability PR of a run and where it is in its lifecycle"""
+    index: int
+    pr_number: int
+    branch_name: str
+    state: str = CREATED
+    created_at: datetime = field(default_factory=datetime.now)
+    triggered_at: Optional[datetime] = None
+    concluded_at: Optional[datetime] = None
+    passed: Optional[bool] = None
+    timed_out: bool = False
+    base_sha: Optional[str] = None
+
+
+@dataclass
+class PRConclusion:
+    """A concluded PR with its failure detail, captured from the snapshot it concluded on"""
+    pr_number: int
+    branch_name: str
+    passed: bool
+    timed_out: bool = False
+    failed: List[Mapping] = field(default_factory=list)
+    missing: List[str] = field(default_factory=list)
+    succeeded: List[str] = field(default_factory=list)
+    checks: List[Mapping] = field(default_factory=list)
+    head_sha: Optional[str] = None
+    concluded_at: datetime = field(default_factory=datetime.now)
+    # Job name -> pass / flaky-pass-on-retry / consistent-fail / fail (set when retests are enabled)
+    outcomes: Dict[str, str] = field(default_factory=dict)
+
+    @classmethod
+    def capture(cls, pr_number: int, branch_name: str, passed: bool, status: Optional[PRStatus],
+                expected: Optional[List[str]] = None, timed_out: bool = False) -> 'PRConclusion':
+        status = status or PRStatus.unknown(pr_number)
+        failed = failed_checks(status, expected)
+        failed_names = {check['name'] for check in failed}
+        return cls(
+            pr_number=pr_number,
+            branch_name=branch_name,
+            passed=passed,
+            timed_out=timed_out,
+            failed=failed,
+            missing=missing_checks(status, expected),
+            succeeded=[check['name'] for check in completed_checks(status, expected) if check['name'] not in failed_names],
+            checks=pull_checks(status, expected),
+            head_sha=status.head_sha
+        )
+
+
+class RunOrchestrator:
+    """Creates a run's PRs on schedule while polling, concluding and cleaning up earlier ones"""
+
+    def __init__(self, test, pr_spacing_seconds: float = 1800, pacer: Optional[PacingController] = None,
+                 ledger=None, run_id: Optional[int] = None):
+        self.test = test
+        self.ledger = ledger
+        self.run_id = run_id
+        self.pr_spacing = timedelta(seconds=pr_spacing_seconds)
+        self.pacer = pacer
+        self.timeout = timedelta(hours=test.test_timeout_hours)
+        self.runs: List[PRRun] = []
+        self.snapshots: Dict[int, PRStatus] = {}
+        self.attempts = 0
+        self.last_created = None
+        self.next_create = None
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def resume(cls, test, ledger, run_id: int, **kwargs) -> 'RunOrchestrator':
+        """Rebuild an interrupted run's orchestrator from the ledger"""
+        orchestrator = cls(test, ledger=ledger, run_id=run_id, **kwargs)
+        orchestrator.runs = ledger.load_prs(run_id)
+        orchestrator.attempts = ledger.get_run(run_id)['attempts']
+        test.expected_checks.update(ledger.load_expected_checks(run_id))
+        test.triggered_at.update({run.pr_number: run.triggered_at for run in orchestrator.runs if run.triggered_at})
+        test.base_shas.update({run.pr_number: run.base_sha for run in orchestrator.runs if run.base_sha})
+        test.concluded_before_resume.update({run.pr_number: run for run in orchestrator.runs
+                                             if run.concluded_at is not None})
+        test.creation_attempts = orchestrator.attempts
+        if orchestrator.runs:
+            orchestrator.last_created = max(run.created_at for run in orchestrator.runs)
+            orchestrator.next_create = orchestrator.last_created + orchestrator.pr_spacing
+        test.last_opened_at = orchestrator.last_created
+
+        unfinished = [run for run in orchestrator.runs if run.state not in FINAL_STATES]
+        orchestrator.logger.info(f"Resuming run {run_id}: {len(orchestrator.runs)} PRs, {len(unfinished)} unfinished, "
+                                 f"{orchestrator.attempts}/{test.pr_count} creations attempted")
+        return orchestrator
+
+    @property
+    def creating(self) -> bool:
+        return self.attempts < self.test.pr_count
+
+    def _save(self, run: PRRun):
+        if self.ledger is not None:
+            self.ledger.record_pr(self.run_id, run, self.test.expected_checks.get(run.pr_number))
+
+    def _transition(self, run: PRRun, state: str):
+        self.logger.info(f"PR #{run.pr_number}: {run.state} -> {state}")
+        run.state = state
+        self._save(run)
+
+    def ci_load(self) -> int:
+        """Our pull-cdc-* jobs still queued or running: of every unfinished run in the ledger (runs share the CI),
+        else of this run, as of the last poll"""
+        if self.ledger is not None:
+            return self.ledger.ci_load()
+        return sum(queued_or_running(self.snapshots.get(run.pr_number), self.test.expected_checks.get(run.pr_number))
+                   for run in self.runs if run.state in ACTIVE_STATES)
+
+    def _may_create(self, now: datetime) -> bool:
+        if self.pacer is None:
+            return now >= self.next_create
+        new_jobs = len(self.test.trigger_matrix.expected_checks(self.attempts))
+        return self.pacer.may_create(now, self.last_created, self.ci_load(), new_jobs)
+
+    def _next_create_due(self, now: datetime) -> datetime:
+        if self.pacer is None:
+            return self.next_create
+        return self.pacer.next_decision(now, self.last_created)
+
+    def _create_next(self):
+        """Open the next PR of the run and trigger its tests"""
+        index = self.attempts
+        self.attempts += 1
+        self.last_created = datetime.now()
+        self.next_create = self.last_created + self.pr_spacing
+        if self.ledger is not None:
+            self.ledger.record_attempts(self.run_id, self.attempts)
+        self.logger.info(f"Creating PR {index + 1}/{self.test.pr_count}")
+
+        success, pr_number, branch_name = self.test.open_pr(index)
+        if not (success and pr_number):
+            self.logger.error(f"Failed to create PR {index + 1}")
+            return
+
+        run = PRRun(index=index, pr_number=pr_number, branch_name=branch_name,
+                    base_sha=self.test.base_shas.get(pr_number))
+        self.runs.append(run)
+        self._save(run)
+        self.logger.info(f"Successfully created PR #{pr_number} with branch {branch_name}")
+        self._trigger(run)
+
+    def _trigger(self, run: PRRun):
+        """Post the trigger comments; a PR whose comments all failed is retried on the next tick"""
+        if self.test.trigger_pr_tests(run.pr_number, run.index):
+            run.triggered_at = datetime.now()
+            self._transition(run, TRIGGERED)
+
+    def _conclude(self, run: PRRun, passed: bool, timed_out: bool = False):
+        run.passed = passed
+        run.timed_out = timed_out
+        run.concluded_at = datetime.now()
+        self._transition(run, CONCLUDED)
+
+        if timed_out:
+            self.logger.warning(f"PR #{run.pr_number} pull_ tests timed out")
+        elif passed:
+            self.logger.info(f"PR #{run.pr_number} pull_ tests PASSED")
+        else:
+            self.logger.info(f"PR #{run.pr_number} pull_ tests FAILED")
+
+        # Hand the PR over right away: a passed one is closed now, not when the whole run ends
+        conclusion = PRConclusion.capture(run.pr_number, run.branch_name, passed, self.snapshots.get(run.pr_number),
+                                          self.test.expected_checks.get(run.pr_number), timed_out)
+        if self.test.complete_pr(conclusion):
+            self._transition(run, CLEANED_UP)
+
+    def _advance(self, run: PRRun, status: PRStatus):
+        """Move a triggered/running PR forward based on a fresh snapshot"""
+        expected = self.test.expected_checks.get(run.pr_number)
+        if run.state == TRIGGERED and pull_checks(status, expected):
+            self._transition(run, RUNNING)
+
+        if self.test.github_client.is_pr_tests_complete(run.pr_number, status, expected):
+            passed = self.test.github_client.are_pr_tests_passed(run.pr_number, status, expected)
+            if not passed and self.test.retest_failed(run.pr_number, status, expected):
+                # Failed jobs were retriggered; the PR keeps running until they report again
+                if run.state == TRIGGERED:
+                    self._transition(run, RUNNING)
+                return
+            self._conclude(run, passed)
+
+    def _started(self, run: PRRun) -> datetime:
+        """Start of the PR's timeout window: its trigger (or creation), or its latest retest"""
+        started = run.triggered_at or run.created_at
+        retested = self.test.last_retest(run.pr_number)
+        return max(started, retested) if retested else started
+
+    def _expire(self, now: datetime):
+        """Time out PRs that have not concluded within the test timeout of their trigger (or latest retest)"""
+        for run in self.runs:
+            if run.state not in FINAL_STATES and now - self._started(run) >= self.timeout:
+                self._conclude(run, False, timed_out=True)
+
+    def _poll(self):
+        """Poll the active PRs that are due and advance them; the ones still active get their next poll planned"""
+        active = [run for run in self.runs if run.state in ACTIVE_STATES]
+        due = self.test.due_for_poll([run.pr_number for run in active])
+        if not due:
+            return
+        snapshots = self.test.collect_pr_snapshots(due)
+        self.snapshots.update(snapshots)
+        for run in active:
+            if run.pr_number not in snapshots:
+                continue
+            if self.ledger is not None:
+                self.ledger.record_checks(self.test.run_id, snapshots[run.pr_number])
+            self._advance(run, snapshots[run.pr_number])
+            if run.state in ACTIVE_STATES:
+                self.test.schedule_next_poll(run.pr_number, snapshots[run.pr_number])
+
+    def run(self) -> List[PRRun]:
+        """Drive the whole run until every PR is created and concluded"""
+        if self.pacer is None:
+            self.logger.info(f"Starting pipelined run of {self.test.pr_count} PRs, "
+                             f"{self.pr_spacing.total_seconds() / 60:.0f} minutes apart")
+        else:
+            self.logger.info(f"Starting pipelined run of {self.test.pr_count} PRs, paced by CI load "
+                             f"(target {self.pacer.concurrency_target} jobs in flight)")
+        if self.next_create is None:
+            self.next_create = datetime.now()
+
+        while True:
+            self.test.check_cancelled()
+            if self.creating and self._may_create(datetime.now()):
+                self._create_next()
+                if not self.creating:
+                    self.test.announce_eta()
+
+            for run in self.runs:
+                if run.state == CREATED:
+                    self._trigger(run)
+
+            self._poll()
+            self._expire(datetime.now())
+
+            unfinished = [run for run in self.runs if run.state not in FINAL_STATES]
+            if not self.creating and not unfinished:
+                break
+
+            max_wait = None
+            if self.creating:
+                now = datetime.now()
+                max_wait = max((self._next_create_due(now) - now).total_seconds(), 0)
+            self.test.wait_for_next_check(len(unfinished), max_wait)
+
+        self.logger.info(f"Pipelined run finished: {len(self.runs)} PRs created out of {self.attempts} attempts")
+        return self.runs
+
+    def results(self) -> Dict[int, bool]:
+        """Map of PR number to passed, in the shape wait_for_tests_completion returns"""
+        return {run.pr_number: bool(run.passed) for run in self.runs}
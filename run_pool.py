@@ -0,0 +1,247 @@
+"""
+Bounded worker pool for stability runs plus a small local control API.
+
+The scheduler loop only submits runs here, so a multi-hour run never blocks
+it. An overlap policy decides what happens when a run is submitted while
+another is still active:
+
+    skip        drop the new run
+    queue       run it after the active one (one worker)
+    parallel:N  run up to N at once, queue the rest
+
+Every submitted run gets an id; runs can be listed, inspected and cancelled
+through the pool or over HTTP (GET /runs, GET /runs/<id>, POST /runs,
+POST /runs/<id>/cancel). A running run also reports its live progress: PRs
+created/concluded and per-PR and run ETAs.
+"""
+
+import json
+import logging
+import threading
+import itertools
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+QUEUED = 'queued'
+RUNNING = 'running'
+FINISHED = 'finished'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+SKIPPED = 'skipped'
+
+ACTIVE_STATES = (QUEUED, RUNNING)
+
+
+def parse_overlap_policy(policy: str) -> Tuple[str, int]:
+    """Parse 'skip', 'queue' or 'parallel:N' into (mode, worker count)"""
+    if policy in ('skip', 'queue'):
+        return policy, 1
+    if policy.startswith('parallel:'):
+        workers = int(policy.split(':', 1)[1])
+        if workers < 1:
+            raise ValueError(f"Invalid overlap policy: {policy}")
+        return 'parallel', workers
+    raise ValueError(f"Unknown overlap policy: {policy}")
+
+
+@dataclass
+class RunJob:
+    """One submitted stability run"""
+    job_id: str
+    source: str
+    resume_run_ids: List[int] = field(default_factory=list)
+    state: str = QUEUED
+    submitted_at: datetime = field(default_factory=datetime.now)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
+    cancel_event: threading.Event = field(default_factory=threading.Event, repr=False)
+    test: Any = field(default=None, repr=False)
+
+    def cancel(self):
+        """Ask the run to stop (a queued run never starts)"""
+        self.cancel_event.set()
+        if self.test is not None:
+            self.test.cancel()
+
+    def to_dict(self) -> Dict:
+        def timestamp(value):
+            return value.strftime('%Y-%m-%d %H:%M:%S') if value else None
+
+        return {
+            'id': self.job_id,
+            'source': self.source,
+            'state': self.state,
+            'ledger_run_id': getattr(self.test, 'run_id', None) or self.resume_run_ids or None,
+            'submitted_at': timestamp(self.submitted_at),
+            'started_at': timestamp(self.started_at),
+            'finished_at': timestamp(self.finished_at),
+            'cancel_requested': self.cancel_event.is_set(),
+            'error': self.error,
+            'progress': self.test.progress() if self.state == RUNNING and hasattr(self.test, 'progress') else None
+        }
+
+
+class RunPool:
+    """Runs jobs on a bounded thread pool according to an overlap policy"""
+
+    def __init__(self, run_fn: Callable[[RunJob], None], policy: str = 'queue', history: int = 100):
+        self.run_fn = run_fn
+        self.policy = policy
+        self.mode, self.workers = parse_overlap_policy(policy)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='stability-run')
+        self.jobs = OrderedDict()
+        self.history = history
+        self.counter = itertools.count(1)
+        self.lock = threading.Lock()
+        self.logger = logging.getLogger(__name__)
+
+    def active(self) -> List[RunJob]:
+        with self.lock:
+            return [job for job in self.jobs.values() if job.state in ACTIVE_STATES]
+
+    def submit(self, source: str, resume_run_ids: Optional[List[int]] = None, force: bool = False) -> RunJob:
+        """Submit a run (or the resumption of interrupted ledger runs); returns its job
+        (state 'skipped' if the policy dropped it, unless force)"""
+        with self.lock:
+            job = RunJob(job_id=f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{next(self.counter)}",
+                         source=source, resume_run_ids=list(resume_run_ids or []))
+            active = [other for other in self.jobs.values() if other.state in ACTIVE_STATES]
+            self.jobs[job.job_id] = job
+            self._trim()
+
+            if self.mode == 'skip' and active and not force:
+                job.state = SKIPPED
+                job.finished_at = datetime.now()
+                self.logger.warning(f"Skipping {source} run {job.job_id}: run {active[0].job_id} is still {active[0].state}")
+                return job
+
+        if active:
+            self.logger.info(f"Queued {source} run {job.job_id} behind {len(active)} active run(s) (policy {self.policy})")
+        else:
+            self.logger.info(f"Submitted {source} run {job.job_id}")
+        self.executor.submit(self._run, job)
+        return job
+
+    def _trim(self):
+        """Forget the oldest finished jobs beyond the history size"""
+        finished = [job_id for job_id, job in self.jobs.items() if job.state not in ACTIVE_STATES]
+        for job_id in finished[:max(len(self.jobs) - self.history, 0)]:
+            del self.jobs[job_id]
+
+    def _run(self, job: RunJob):
+        if job.cancel_event.is_set():
+            job.state = CANCELLED
+            job.finished_at = datetime.now()
+            self.logger.info(f"Run {job.job_id} cancelled before it started")
+            return
+
+        job.state = RUNNING
+        job.started_at = datetime.now()
+        self.logger.info(f"Run {job.job_id} ({job.source}) started")
+        try:
+            self.run_fn(job)
+            job.state = CANCELLED if job.cancel_event.is_set() else FINISHED
+        except Exception as e:
+            job.state = FAILED
+            job.error = str(e)
+            self.logger.error(f"Run {job.job_id} failed: {e}")
+        finally:
+            job.finished_at = datetime.now()
+            self.logger.info(f"Run {job.job_id} {job.state}")
+
+    def get(self, job_id: str) -> Optional[RunJob]:
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self) -> List[RunJob]:
+        with self.lock:
+            return list(self.jobs.values())
+
+    def cancel(self, job_id: str) -> Optional[RunJob]:
+        """Cancel a queued or running job; returns it, or None if unknown"""
+        job = self.get(job_id)
+        if job is not None and job.state in ACTIVE_STATES:
+            self.logger.info(f"Cancelling run {job_id}")
+            job.cancel()
+        return job
+
+    def shutdown(self, cancel_running: bool = False):
+        if cancel_running:
+            for job in self.active():
+                job.cancel()
+        self.executor.shutdown(wait=True)
+
+
+class ControlServer:
+    """Local HTTP API to list, submit and cancel runs of a RunPool"""
+
+    def __init__(self, pool: RunPool, host: str = '127.0.0.1', port: int = 8765):
+        self.pool = pool
+        self.host = host
+        self.port = port
+        self.server = None
+        self.logger = logging.getLogger(__name__)
+
+    def handle(self, method: str, path: str) -> Tuple[int, Any]:
+        """Route one request and return (HTTP status, JSON body)"""
+        parts = [part for part in path.split('?', 1)[0].split('/') if part]
+        if not parts or parts[0] != 'runs':
+            return 404, {'error': 'not found'}
+
+        if method == 'GET' and len(parts) == 1:
+            return 200, [job.to_dict() for job in self.pool.list()]
+        if method == 'POST' and len(parts) == 1:
+            return 202, self.pool.submit('api').to_dict()
+
+        job_id = parts[1]
+        if method == 'GET' and len(parts) == 2:
+            job = self.pool.get(job_id)
+        elif method == 'POST' and len(parts) == 3 and parts[2] == 'cancel':
+            job = self.pool.cancel(job_id)
+        else:
+            return 404, {'error': 'not found'}
+        if job is None:
+            return 404, {'error': f"unknown run {job_id}"}
+        return 200, job.to_dict()
+
+    def _make_handler(self):
+        control = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self, method):
+                status, body = control.handle(method, self.path)
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                self._respond('GET')
+
+            def do_POST(self):
+                self._respond('POST')
+
+            def log_message(self, format, *args):
+                control.logger.debug(f"Control API {self.address_string()} - {format % args}")
+
+        return Handler
+
+    def start(self):
+        """Start serving in a background thread"""
+        self.server = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.logger.info(f"Control API listening on http://{self.host}:{self.port}/runs")
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
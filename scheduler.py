@@ -1,9 +1,23 @@
+import os
 import schedule
 import time
 import logging
 import sys
-from datetime import datetime
+import json
+import requests
+from dotenv import load_dotenv
 from stability_test import StabilityTest
+from run_ledger import RunLedger
+from run_pool import RunPool, RunJob, ControlServer
+from targets import MultiTargetRun, find_target, load_targets
+from webhook_receiver import WebhookReceiver
+
+USAGE = """Usage:
+  python scheduler.py run-now      - Run stability test now (in the running scheduler if there is one)
+  python scheduler.py resume       - Resume runs interrupted by a crash/restart
+  python scheduler.py schedule     - Start the daily scheduler
+  python scheduler.py status [id]  - Show runs of the running scheduler
+  python scheduler.py cancel <id>  - Cancel a queued or running run"""
 
 class StabilityTestScheduler:
     def __init__(self):
@@ -17,62 +31,157 @@ class StabilityTestScheduler:
             ]
         )
         self.logger = logging.getLogger(__name__)
-    
+
+        load_dotenv('config.env')
+        self.ledger = RunLedger(os.getenv('LEDGER_PATH', 'stability_ledger.db'))
+
+        # Runs execute on a worker pool so a long run never blocks the schedule loop
+        self.pool = RunPool(self.execute_run, policy=os.getenv('SCHEDULER_OVERLAP_POLICY', 'queue'))
+        self.control = ControlServer(
+            self.pool,
+            host=os.getenv('SCHEDULER_CONTROL_HOST', '127.0.0.1'),
+            port=int(os.getenv('SCHEDULER_CONTROL_PORT', 8765))
+        )
+
+        # One webhook receiver for every pool run (they may overlap), routing deliveries to a store per repo
+        self.webhook_receiver = WebhookReceiver.from_env()
+        if self.webhook_receiver:
+            self.webhook_receiver.start()
+
+    def webhook_store_for(self, target):
+        """The shared receiver's store for a target's repository, or None without webhooks"""
+        return self.webhook_receiver.store_for_repo(target.repo_full_name) if self.webhook_receiver else None
+
+    def stop_webhook_receiver(self):
+        if self.webhook_receiver:
+            self.webhook_receiver.stop()
+
+    def execute_run(self, job: RunJob):
+        """Run one stability test for a pool job (runs on a worker thread)"""
+        if job.resume_run_ids:
+            # A resumed run continues on the target it was started for
+            runs = [self.ledger.get_run(run_id) for run_id in job.resume_run_ids]
+            targets = [find_target(run['repo'], run['base_branch'], run['pr_count']) for run in runs]
+            if len(targets) > 1:
+                # Resumed together, like a multi-target run: one shared rate-limit budget
+                multi_target_run = MultiTargetRun(targets, cancel_event=job.cancel_event,
+                                                  webhook_receiver=self.webhook_receiver,
+                                                  resume_run_ids=job.resume_run_ids)
+                job.test = multi_target_run
+                multi_target_run.run()
+                return
+            stability_test = StabilityTest(cancel_event=job.cancel_event, target=targets[0],
+                                           webhook_store=self.webhook_store_for(targets[0]))
+            job.test = stability_test
+            stability_test.run_stability_test(resume_run_id=job.resume_run_ids[0])
+            return
+
+        targets = load_targets()
+        if len(targets) > 1:
+            # Every target in one process, sharing connections and the rate-limit budget
+            multi_target_run = MultiTargetRun(targets, cancel_event=job.cancel_event,
+                                              webhook_receiver=self.webhook_receiver)
+            job.test = multi_target_run
+            multi_target_run.run()
+            return
+
+        stability_test = StabilityTest(cancel_event=job.cancel_event, target=targets[0],
+                                       webhook_store=self.webhook_store_for(targets[0]))
+        job.test = stability_test
+        stability_test.run_stability_test()
+
     def run_stability_test_job(self):
-        """Job function to run stability test"""
-        self.logger.info("Scheduled stability test job started")
-        
-        try:
-            stability_test = StabilityTest()
-            stability_test.run_stability_test()
-            self.logger.info("Scheduled stability test job completed successfully")
-        except Exception as e:
-            self.logger.error(f"Scheduled stability test job failed: {e}")
-            # Don't raise the exception to prevent scheduler from stopping
-    
+        """Job function: submit a stability test run to the worker pool"""
+        self.logger.info("Scheduled stability test job triggered")
+        self.pool.submit('daily')
+
+    def resume_unfinished_runs(self):
+        """Submit runs the ledger shows as unfinished (e.g. after a crash or restart)"""
+        run_ids = self.ledger.unfinished_runs()
+        if not run_ids:
+            return
+
+        self.logger.info(f"Found {len(run_ids)} unfinished run(s) in the ledger: {run_ids}")
+        self.pool.submit('resume', resume_run_ids=run_ids, force=True)
+
     def schedule_daily_test(self, hour: int = 20, minute: int = 0):
         """Schedule daily stability test at specified time (UTC+8)"""
         # Schedule job to run daily at specified time
         schedule.every().day.at(f"{hour:02d}:{minute:02d}").do(self.run_stability_test_job)
-        
+
         self.logger.info(f"Scheduled daily stability test at {hour:02d}:{minute:02d} (UTC+8)")
-    
+
     def run_scheduler(self):
         """Run the scheduler loop"""
         self.logger.info("Starting stability test scheduler")
+        self.logger.info(f"Run overlap policy: {self.pool.policy}")
         self.logger.info("Press Ctrl+C to stop the scheduler")
-        
+
+        self.control.start()
         try:
             while True:
                 schedule.run_pending()
                 time.sleep(60)  # Check every minute
         except KeyboardInterrupt:
-            self.logger.info("Scheduler stopped by user")
+            self.logger.info("Scheduler stopped by user, cancelling active runs")
+            self.pool.shutdown(cancel_running=True)
         except Exception as e:
             self.logger.error(f"Scheduler error: {e}")
             raise
+        finally:
+            self.control.stop()
+            self.stop_webhook_receiver()
+
+    def wait_for_runs(self):
+        """Block until every submitted run has finished (for one-shot commands)"""
+        self.pool.shutdown()
+        self.stop_webhook_receiver()
+
+def control_url(path: str) -> str:
+    """URL of the running scheduler's control API"""
+    load_dotenv('config.env')
+    host = os.getenv('SCHEDULER_CONTROL_HOST', '127.0.0.1')
+    port = int(os.getenv('SCHEDULER_CONTROL_PORT', 8765))
+    return f"http://{host}:{port}{path}"
+
+def control_request(method: str, path: str):
+    """Call the running scheduler's control API and print the JSON answer"""
+    response = requests.request(method, control_url(path), timeout=10)
+    print(json.dumps(response.json(), indent=2, ensure_ascii=False))
+    return response
 
 def main():
     """Main entry point for scheduler"""
-    if len(sys.argv) > 1:
-        if sys.argv[1] == "run-now":
-            # Run test immediately
-            scheduler = StabilityTestScheduler()
-            scheduler.run_stability_test_job()
-        elif sys.argv[1] == "schedule":
-            # Run scheduler
-            scheduler = StabilityTestScheduler()
-            # Schedule for 8 PM UTC+8 (which is 12 PM UTC)
-            scheduler.schedule_daily_test(hour=12, minute=0)
-            scheduler.run_scheduler()
-        else:
-            print("Usage:")
-            print("  python scheduler.py run-now  - Run stability test immediately")
-            print("  python scheduler.py schedule - Start the daily scheduler")
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+
+    if command == "run-now":
+        # Hand the run to the running scheduler if there is one, otherwise run it here
+        try:
+            control_request('POST', '/runs')
+            return
+        except requests.ConnectionError:
+            pass
+        scheduler = StabilityTestScheduler()
+        scheduler.pool.submit('run-now')
+        scheduler.wait_for_runs()
+    elif command == "resume":
+        # Finish runs interrupted by a crash or restart
+        scheduler = StabilityTestScheduler()
+        scheduler.resume_unfinished_runs()
+        scheduler.wait_for_runs()
+    elif command == "schedule":
+        # Run scheduler, picking up interrupted runs first
+        scheduler = StabilityTestScheduler()
+        scheduler.resume_unfinished_runs()
+        # Schedule for 8 PM UTC+8 (which is 12 PM UTC)
+        scheduler.schedule_daily_test(hour=12, minute=0)
+        scheduler.run_scheduler()
+    elif command == "status":
+        control_request('GET', f"/runs/{sys.argv[2]}" if len(sys.argv) > 2 else '/runs')
+    elif command == "cancel" and len(sys.argv) > 2:
+        control_request('POST', f"/runs/{sys.argv[2]}/cancel")
     else:
-        print("Usage:")
-        print("  python scheduler.py run-now  - Run stability test immediately")
-        print("  python scheduler.py schedule - Start the daily scheduler")
+        print(USAGE)
 
 if __name__ == "__main__":
     main()
@@ -1,189 +1,639 @@
 import os
-import time
+import asyncio
+import threading
 import random
 import logging
 from datetime import datetime, timedelta
-from typing import List, Dict, Tuple
+from typing import Callable, List, Dict, Optional, Tuple
 from dotenv import load_dotenv
 from github_client import GitHubClient
+from rate_limiter import RateLimitGovernor
+from webhook_receiver import PRStateStore, WebhookReceiver
+from targets import StabilityTarget
+from run_orchestrator import RunOrchestrator, RunCancelled, PRRun, PRConclusion, CREATED, TRIGGERED
+from run_ledger import RunLedger, RUN_FINISHED, RUN_FAILED, RUN_CANCELLED
+from results_warehouse import ResultsWarehouse
+from pacing import PacingController
+from retest_policy import RetestPolicy, OUTCOME_FLAKY, OUTCOME_CONSISTENT_FAIL
+from duration_model import JobDeadlines
+from poll_scheduler import PollScheduler, outstanding_jobs, poll_delay
+from failure_logs import FailureLogAnalyzer, format_causes
+from culprit_analysis import CulpritAnalyzer, CommitRangeCache, format_jumps
 from notification import NotificationManager
+from pr_status import PRStatus, pull_checks, missing_checks, incomplete_checks, completed_checks, failed_checks
 
 class StabilityTest:
-    def __init__(self):
+    def __init__(self, cancel_event: Optional[threading.Event] = None, target: Optional[StabilityTarget] = None,
+                 github_client: Optional[GitHubClient] = None, webhook_store: Optional[PRStateStore] = None,
+                 label_reports: bool = False):
+        # Set to stop the run early (see cancel())
+        self.cancel_event = cancel_event or threading.Event()
+        
         # Load configuration
         load_dotenv('config.env')
         
-        self.github_client = GitHubClient(
+        # Repo, base branch, trigger matrix and PR count (defaults to the single target in config.env)
+        self.target = target or StabilityTarget.from_env()
+        self.github_client = github_client or GitHubClient(
             token=os.getenv('GITHUB_TOKEN'),
             username=os.getenv('GITHUB_USERNAME'),
-            repo_owner=os.getenv('REPO_OWNER'),
-            repo_name=os.getenv('REPO_NAME')
+            repo_owner=self.target.repo_owner,
+            repo_name=self.target.repo_name,
+            status_backend=os.getenv('STATUS_BACKEND', 'graphql'),
+            governor=RateLimitGovernor(write_reserve=float(os.getenv('RATE_LIMIT_WRITE_RESERVE', 0.2))),
+            timeout=float(os.getenv('GITHUB_TIMEOUT', 30)),
+            base_branch=self.target.base_branch
         )
         
-        self.pr_count = int(os.getenv('PR_COUNT', 10))
+        self.pr_count = self.target.pr_count
         self.pr_title_prefix = os.getenv('PR_TITLE_PREFIX', 'stability-test')
         self.pr_body = os.getenv('PR_BODY', 'Automated stability test PR - adding empty line to Makefile')
         self.test_timeout_hours = int(os.getenv('TEST_TIMEOUT_HOURS', 2))
         self.check_interval_minutes = int(os.getenv('CHECK_INTERVAL_MINUTES', 5))
+        self.pr_interval_minutes = int(os.getenv('PR_INTERVAL_MINUTES', 30))
+        # pipelined: monitor/clean up earlier PRs while later ones are created; sequential: create all, then monitor
+        self.run_mode = os.getenv('RUN_MODE', 'pipelined')
+        
+        # adaptive: open the next PR when our in-flight CI jobs fit under a target (pipelined mode only)
+        self.pacer = None
+        if os.getenv('PR_PACING', 'fixed') == 'adaptive':
+            self.pacer = PacingController(
+                concurrency_target=int(os.getenv('PACING_CONCURRENCY_TARGET', 21)),
+                min_spacing_minutes=float(os.getenv('PACING_MIN_SPACING_MINUTES', 10)),
+                max_spacing_minutes=float(os.getenv('PACING_MAX_SPACING_MINUTES', 60))
+            )
+        self.git_data_fast_path = os.getenv('GIT_DATA_FAST_PATH', 'true').lower() == 'true'
+        
+        # Jobs to trigger per PR (target's matrix file / TRIGGER_DISPATCH); also the checks each PR must pass
+        self.trigger_matrix = self.target.load_trigger_matrix()
+        self.expected_checks = {}
+        
+        # Durable record of runs/PRs/check observations; unfinished runs are resumed from it
+        self.ledger = RunLedger(os.getenv('LEDGER_PATH', 'stability_ledger.db'))
+        self.run_id = None
+        self.warehouse_run_id = None
+        self.results = {}
+        
+        # Append-only analytics store of every run, PR and check outcome (queried offline by results_warehouse.py)
+        self.warehouse = ResultsWarehouse(os.getenv('WAREHOUSE_PATH', 'stability_results.db'))
+        self.flakiness_report_enabled = os.getenv('FLAKINESS_REPORT_ENABLED', 'true').lower() == 'true'
+        self.flakiness_report_days = int(os.getenv('FLAKINESS_REPORT_DAYS', 30))
+        # Failure-rate jumps between base SHAs and the PRs merged in between, also for the daily report
+        self.culprit_analyzer = None
+        if os.getenv('CULPRIT_ANALYSIS_ENABLED', 'true').lower() == 'true':
+            self.culprit_analyzer = CulpritAnalyzer(
+                self.warehouse, self.target.repo_full_name, self.target.base_branch, self.github_client,
+                CommitRangeCache(os.getenv('COMMIT_RANGE_CACHE_PATH', '.commit_range_cache.json')),
+                min_runs=int(os.getenv('CULPRIT_MIN_RUNS', 5)),
+                z_threshold=float(os.getenv('CULPRIT_Z_THRESHOLD', 2.58))
+            )
+        self.culprit_analysis_days = int(os.getenv('CULPRIT_ANALYSIS_DAYS', 14))
+        # Fetches the build logs of failed checks for the failure report and groups them by cause
+        self.failure_analyzer = FailureLogAnalyzer.from_env()
+        self.base_shas: Dict[int, str] = {}
+        
+        # Conclusion (with failure detail) of every PR as it concluded; extra per-PR hooks run after cleanup
+        self.conclusions: Dict[int, PRConclusion] = {}
+        # PRs a resumed run found already concluded in the ledger (their failure detail was not kept)
+        self.concluded_before_resume: Dict[int, PRRun] = {}
+        self.completion_hooks: List[Callable[[PRConclusion], None]] = []
+        
+        # Optional automatic retest of failed pull-* jobs (RETEST_ENABLED), within per-job/per-run budgets
+        self.retest_policy = RetestPolicy.from_env()
         
-        # Initialize notification manager
-        self.notification_manager = NotificationManager()
+        # Per-job deadlines learned from earlier runs; jobs past theirs are flagged as hung (and given up on with 'stop')
+        self.triggered_at: Dict[int, datetime] = {}
+        self.job_deadlines = JobDeadlines.from_env(self.ledger)
+        self.job_deadline_action = os.getenv('JOB_DEADLINE_ACTION', 'flag')
+        self.hung_jobs: Dict[int, List[str]] = {}
+        
+        # Live progress: latest snapshot per PR and creation progress, for ETAs (see progress())
+        self.last_snapshots: Dict[int, PRStatus] = {}
+        self.creation_attempts = 0
+        self.last_opened_at = None
+        self.eta_notification_enabled = os.getenv('ETA_NOTIFICATION_ENABLED', 'false').lower() == 'true'
+        
+        # Optional asyncio client: polls PRs and sends trigger comments concurrently over one pooled connection
+        self.async_client = None
+        self.event_loop = None
+        if os.getenv('ASYNC_CLIENT_ENABLED', 'false').lower() == 'true':
+            from async_github_client import AsyncGitHubClient
+            self.async_client = AsyncGitHubClient.from_client(
+                self.github_client, concurrency=int(os.getenv('ASYNC_CONCURRENCY', 10))
+            )
+            self.event_loop = asyncio.new_event_loop()
+        
+        # Optional webhook ingestion: PR state is pushed to us, polling only reconciles occasionally
+        # (a multi-target run passes in its store and owns the shared receiver)
+        self.webhook_store = webhook_store
+        self.webhook_receiver = None
+        self.webhook_version = 0
+        self.next_reconcile = None
+        self.reconcile_interval_minutes = int(os.getenv('WEBHOOK_RECONCILE_MINUTES', 30))
+        if webhook_store is None:
+            self.webhook_receiver = WebhookReceiver.from_env()
+            if self.webhook_receiver:
+                self.webhook_store = PRStateStore()
+                self.webhook_receiver.store = self.webhook_store
+        
+        # Polling mode: poll each PR when due, based on the ETA of its slowest outstanding job (POLL_SCHEDULING=eta)
+        self.poll_scheduler = None
+        if self.webhook_store is None and os.getenv('POLL_SCHEDULING', 'eta') == 'eta':
+            self.poll_scheduler = PollScheduler()
+        self.min_poll_interval = timedelta(minutes=float(os.getenv('POLL_MIN_MINUTES', 1)))
+        self.max_poll_interval = timedelta(minutes=float(os.getenv('POLL_MAX_MINUTES', 30)))
+        
+        # Initialize notification manager (reports name the target when several run side by side)
+        self.notification_manager = NotificationManager(
+            repo_full_name=self.target.repo_full_name,
+            target_name=self.target.name if label_reports else None
+        )
         
         self.logger = logging.getLogger(__name__)
     
+    def cancel(self):
+        """Ask the run to stop at its next wait or step"""
+        self.cancel_event.set()
+        if self.webhook_store is not None:
+            self.webhook_store.wake()
+    
+    def check_cancelled(self):
+        """Raise RunCancelled if the run has been asked to stop"""
+        if self.cancel_event.is_set():
+            raise RunCancelled()
+    
+    def _run_async(self, coro):
+        """Run a coroutine on the run's persistent event loop (keeps the connection pool alive)"""
+        return self.event_loop.run_until_complete(coro)
+    
+    def _close_async_client(self):
+        """Close the async client's connection pool and its event loop"""
+        if self.async_client:
+            self._run_async(self.async_client.close())
+            self.event_loop.close()
+            self.async_client = None
+    
+    def fetch_pr_snapshots(self, pr_numbers: List[int]) -> Dict:
+        """Fetch status snapshots for all PRs, concurrently when the async client is enabled"""
+        if self.async_client and self.github_client.status_backend != 'graphql':
+            return self._run_async(self.async_client.get_pr_snapshots(pr_numbers))
+        return self.github_client.get_pr_snapshots(pr_numbers)
+    
+    def collect_pr_snapshots(self, pr_numbers: List[int]) -> Dict:
+        """Current snapshots of the PRs: from webhook state (reconciling when due) or by polling"""
+        if self.webhook_store is None:
+            snapshots = self.fetch_pr_snapshots(pr_numbers)
+        else:
+            for pr_number in pr_numbers:
+                self.webhook_store.track(pr_number)
+            
+            if self.next_reconcile is None or datetime.now() >= self.next_reconcile:
+                self.logger.info(f"Reconciling webhook state for {len(pr_numbers)} PRs")
+                for snapshot in self.fetch_pr_snapshots(pr_numbers).values():
+                    self.webhook_store.reconcile(snapshot)
+                self.next_reconcile = datetime.now() + timedelta(minutes=self.reconcile_interval_minutes)
+            
+            self.webhook_version = self.webhook_store.version
+            snapshots = {pr_number: self.webhook_store.snapshot(pr_number) for pr_number in pr_numbers}
+        
+        snapshots = self._apply_deadlines(self._mask_retested(snapshots))
+        self.last_snapshots.update(snapshots)
+        return snapshots
+    
+    def _mask_retested(self, snapshots: Dict) -> Dict:
+        """Hide results that predate a retest of their job (and keep them out of the frozen check index)"""
+        if self.retest_policy is None:
+            return snapshots
+        for pr_number, status in snapshots.items():
+            stale = self.retest_policy.stale_checks(status)
+            for name in stale:
+                self.github_client.check_index.unfreeze(status.head_sha, name)
+            snapshots[pr_number] = self.retest_policy.mask(status, stale)
+        return snapshots
+    
+    def _apply_deadlines(self, snapshots: Dict) -> Dict:
+        """Flag jobs past their learned deadline as hung; with JOB_DEADLINE_ACTION=stop, stop waiting on them"""
+        now = datetime.now()
+        for pr_number, status in snapshots.items():
+            if pr_number not in self.triggered_at:
+                continue
+            elapsed = now - self.timeout_start(pr_number)
+            hung = self.job_deadlines.overdue(status, self.expected_checks.get(pr_number), elapsed)
+            if not hung:
+                continue
+            
+            newly_hung = [name for name in hung if name not in self.hung_jobs.get(pr_number, [])]
+            if newly_hung:
+                self.hung_jobs.setdefault(pr_number, []).extend(newly_hung)
+                deadlines = self.job_deadlines.deadlines(newly_hung)
+                self.logger.warning(f"PR #{pr_number} jobs hung ({elapsed.total_seconds() / 60:.0f} minutes since trigger): "
+                                    + ', '.join(f"{name} (deadline {deadlines[name].total_seconds() / 60:.0f}m)"
+                                                for name in newly_hung))
+            if self.job_deadline_action == 'stop':
+                snapshots[pr_number] = self.job_deadlines.give_up(status, hung, elapsed)
+        return snapshots
+    
+    def due_for_poll(self, pr_numbers: List[int]) -> List[int]:
+        """PRs to poll now: all of them with fixed polling, else the due ones and any not scheduled yet"""
+        if self.poll_scheduler is None:
+            return list(pr_numbers)
+        self.poll_scheduler.pop_due(datetime.now())
+        return [pr_number for pr_number in pr_numbers if pr_number not in self.poll_scheduler]
+    
+    def _job_durations(self, names: List[str], at: datetime, q: float) -> List[float]:
+        """Predicted duration quantile (seconds) of each job with enough history, for a trigger at at"""
+        model = self.job_deadlines.model
+        return [model.quantile(name, q, at) for name in names if model.sample_count(name) >= self.job_deadlines.min_samples]
+    
+    def pr_eta(self, pr_number: int, status, q: float = 0.5) -> Optional[datetime]:
+        """Expected finish of the PR's slowest outstanding job (median past duration by default), if known"""
+        started = self.timeout_start(pr_number)
+        if started is None:
+            return None
+        durations = self._job_durations(outstanding_jobs(status, self.expected_checks.get(pr_number)), started, q)
+        return started + timedelta(seconds=max(durations)) if durations else None
+    
+    def progress(self) -> Dict:
+        """Live per-PR and run ETAs (median and p90 of past job durations); None where there is no history"""
+        def timestamp(value):
+            return value.strftime('%Y-%m-%d %H:%M:%S') if value else None
+        
+        now = datetime.now()
+        prs = []
+        etas = {0.5: [], 0.9: []}
+        for pr_number in list(self.triggered_at):
+            conclusion = self.conclusions.get(pr_number)
+            if conclusion is not None:
+                prs.append({'pr_number': pr_number, 'state': 'passed' if conclusion.passed else 'failed',
+                            'concluded_at': timestamp(conclusion.concluded_at)})
+                continue
+            resumed = self.concluded_before_resume.get(pr_number)
+            if resumed is not None:
+                prs.append({'pr_number': pr_number, 'state': 'passed' if resumed.passed else 'failed',
+                            'concluded_at': timestamp(resumed.concluded_at)})
+                continue
+            status = self.last_snapshots.get(pr_number) or PRStatus.unknown(pr_number)
+            pr_etas = {q: self.pr_eta(pr_number, status, q) for q in etas}
+            for q, eta in pr_etas.items():
+                etas[q].append(eta)
+            prs.append({'pr_number': pr_number, 'state': 'running',
+                        'outstanding_jobs': outstanding_jobs(status, self.expected_checks.get(pr_number)),
+                        'hung_jobs': self.hung_jobs.get(pr_number, []),
+                        'eta': timestamp(pr_etas[0.5]), 'eta_p90': timestamp(pr_etas[0.9])})
+        
+        # PRs still to be opened, one spacing apart, each taking as long as its slowest job
+        spacing = self.pacer.min_spacing if self.pacer else timedelta(minutes=self.pr_interval_minutes)
+        next_open = max(now, self.last_opened_at + spacing) if self.last_opened_at else now
+        for pr_index in range(self.creation_attempts, self.pr_count):
+            for q in etas:
+                durations = self._job_durations(self.trigger_matrix.expected_checks(pr_index), next_open, q)
+                etas[q].append(next_open + timedelta(seconds=max(durations)) if durations else None)
+            next_open += spacing
+        
+        run_etas = {q: max(values) if values and None not in values else None for q, values in etas.items()}
+        return {
+            'run_id': self.run_id,
+            'target': self.target.name,
+            'pr_count': self.pr_count,
+            'created': self.creation_attempts,
+            'concluded': len(self.conclusions.keys() | self.concluded_before_resume.keys()),
+            'eta': timestamp(run_etas[0.5]),
+            'eta_p90': timestamp(run_etas[0.9]),
+            'prs': prs
+        }
+    
+    def announce_eta(self):
+        """Log (and optionally notify) when the run is expected to be done, once all PRs are created"""
+        progress = self.progress()
+        if progress['eta'] is None:
+            self.logger.info("Run ETA unknown (not enough duration history)")
+            return
+        message = (f"TiCDC稳定性测试{self.notification_manager.target_label}: {progress['created']} 个PR已创建, "
+                   f"预计完成时间 {progress['eta']} (p90: {progress['eta_p90']})")
+        self.logger.info(f"All PRs created, run expected done at {progress['eta']} (p90 {progress['eta_p90']})")
+        if self.eta_notification_enabled:
+            self.notification_manager.send_progress_notification(message)
+    
+    def schedule_next_poll(self, pr_number: int, status):
+        """Plan a still-running PR's next poll from its ETA (and its next job deadline)"""
+        if self.poll_scheduler is None:
+            return
+        now = datetime.now()
+        next_deadline = None
+        started = self.timeout_start(pr_number)
+        if started is not None:
+            outstanding = [name for name in outstanding_jobs(status, self.expected_checks.get(pr_number))
+                           if name not in self.hung_jobs.get(pr_number, [])]
+            deadlines = self.job_deadlines.deadlines(outstanding)
+            if deadlines:
+                next_deadline = started + min(deadlines.values())
+        
+        delay = poll_delay(now, self.pr_eta(pr_number, status), timedelta(minutes=self.check_interval_minutes),
+                           self.min_poll_interval, self.max_poll_interval, next_deadline)
+        self.poll_scheduler.schedule(pr_number, now + delay)
+        self.logger.debug(f"PR #{pr_number} next poll in {delay.total_seconds() / 60:.1f} minutes")
+    
+    def timeout_start(self, pr_number: int, default: Optional[datetime] = None) -> datetime:
+        """Start of a PR's timeout window: its trigger time, or its latest retest"""
+        started = self.triggered_at.get(pr_number, default)
+        retested = self.last_retest(pr_number)
+        return max(started, retested) if started and retested else started or retested
+    
+    def wait_for_next_check(self, pending_count: int, max_wait: Optional[float] = None):
+        """Sleep until the next poll (at most max_wait seconds), or until a webhook event / reconciliation is due"""
+        if self.webhook_store is None:
+            # Sleep until the next PR is due (flat CHECK_INTERVAL_MINUTES without ETA scheduling),
+            # stretched if the read budget would not last until the next reset
+            base_interval = self.check_interval_minutes * 60
+            next_due = self.poll_scheduler.next_due() if self.poll_scheduler else None
+            if next_due is not None:
+                base_interval = max((next_due - datetime.now()).total_seconds(), 0)
+            interval = self.github_client.get_poll_interval(base_interval, pending_count)
+            if max_wait is not None:
+                interval = min(interval, max_wait)
+            self.logger.info(f"Waiting {interval / 60:.1f} minutes before next check...")
+            self.cancel_event.wait(interval)
+            self.check_cancelled()
+            return
+        
+        if self.next_reconcile is None:
+            timeout = self.check_interval_minutes * 60
+        else:
+            timeout = max((self.next_reconcile - datetime.now()).total_seconds(), 0)
+        if max_wait is not None:
+            timeout = min(timeout, max_wait)
+        self.webhook_store.wait_for_change(self.webhook_version, timeout)
+        self.check_cancelled()
+    
     def generate_branch_name(self) -> str:
         """Generate a unique branch name"""
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         random_suffix = ''.join(random.choices('abcdefghijklmnopqrstuvwxyz', k=6))
         return f"{self.pr_title_prefix}-{timestamp}-{random_suffix}"
     
-    def create_single_pr(self) -> Tuple[bool, int, str]:
-        """Create a single PR and return (success, pr_number, branch_name)"""
+    def open_pr(self, pr_index: int = 0) -> Tuple[bool, int, str]:
+        """Create the branch, commit and PR (without triggering tests) and return (success, pr_number, branch_name)"""
+        self.creation_attempts += 1
+        self.last_opened_at = datetime.now()
         try:
             # Generate unique branch name
             branch_name = self.generate_branch_name()
             
             # Get latest master SHA
-            master_sha = self.github_client.get_latest_master_sha()
+            master_sha = self.github_client.get_latest_base_sha()
             
-            # Create branch
-            if not self.github_client.create_branch(branch_name, master_sha):
-                return False, None, branch_name
-            
-            # Get Makefile content
-            makefile_content = self.github_client.get_makefile_content()
-            
-            # Update Makefile
-            if not self.github_client.update_makefile(branch_name, makefile_content):
-                return False, None, branch_name
+            if self.git_data_fast_path:
+                # Branch + commit via the Git Data API; the modified tree is built once per master SHA
+                if not self.github_client.create_branch_with_commit(branch_name, master_sha):
+                    return False, None, branch_name
+            else:
+                # Create branch
+                if not self.github_client.create_branch(branch_name, master_sha):
+                    return False, None, branch_name
+                
+                # Get Makefile content
+                makefile_content = self.github_client.get_makefile_content()
+                
+                # Update Makefile
+                if not self.github_client.update_makefile(branch_name, makefile_content):
+                    return False, None, branch_name
             
             # Create PR
             pr_title = f"{self.pr_title_prefix} - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+            if self.target.base_branch != 'master':
+                pr_title = f"[{self.target.base_branch}] {pr_title}"
             pr_number = self.github_client.create_pull_request(branch_name, pr_title, self.pr_body)
             
             if pr_number is None:
                 return False, None, branch_name
             
-            # Add specific test commands to trigger tests
-            test_commands = [
-                "/test pull-cdc-kafka-integration-heavy",
-                "/test pull-cdc-kafka-integration-light", 
-                "/test pull-cdc-mysql-integration-heavy",
-                "/test pull-cdc-mysql-integration-light",
-                "/test pull-cdc-storage-integration-heavy",
-                "/test pull-cdc-storage-integration-light",
-                "/test pull-cdc-mysql-integration-light-next-gen"
-            ]
-            
-            # Send each test command as a separate comment
-            for test_command in test_commands:
-                if not self.github_client.create_pr_comment(pr_number, test_command):
-                    self.logger.warning(f"Failed to add {test_command} comment to PR #{pr_number}")
-                else:
-                    self.logger.info(f"Successfully added {test_command} comment to PR #{pr_number}")
-            
+            self.base_shas[pr_number] = master_sha
             return True, pr_number, branch_name
             
         except Exception as e:
             self.logger.error(f"Failed to create PR: {e}")
             return False, None, None
     
+    def trigger_pr_tests(self, pr_number: int, pr_index: int = 0) -> bool:
+        """Post the PR's trigger comments; returns True if at least one was posted"""
+        # Trigger the PR's jobs from the matrix; batched dispatch sends them all in one comment
+        self.expected_checks[pr_number] = self.trigger_matrix.expected_checks(pr_index)
+        comments = self.trigger_matrix.comments_for_pr(pr_index)
+        if not any(self._post_comments(pr_number, comments)):
+            return False
+        self.triggered_at[pr_number] = datetime.now()
+        return True
+    
+    def _post_comments(self, pr_number: int, comments: List[str]) -> List[bool]:
+        """Post command comments on a PR (all at once with the async client) and log each result"""
+        if self.async_client:
+            comment_results = self._run_async(self.async_client.create_pr_comments(pr_number, comments))
+        else:
+            comment_results = [self.github_client.create_pr_comment(pr_number, comment) for comment in comments]
+        
+        for comment, commented in zip(comments, comment_results):
+            commands = comment.replace('\n', ', ')
+            if not commented:
+                self.logger.warning(f"Failed to add {commands} comment to PR #{pr_number}")
+            else:
+                self.logger.info(f"Successfully added {commands} comment to PR #{pr_number}")
+        
+        return comment_results
+    
+    def retest_failed(self, pr_number: int, status, expected: Optional[List[str]] = None) -> bool:
+        """Retrigger a finished PR's failed jobs that have retest budget left; True if any retest was posted"""
+        if self.retest_policy is None:
+            return False
+        names = self.retest_policy.select(pr_number, failed_checks(status, expected))
+        if not names:
+            return False
+        
+        self.logger.info(f"Retesting failed jobs on PR #{pr_number}: {', '.join(names)}")
+        commands = [self.trigger_matrix.command_for(name) for name in names]
+        if self.trigger_matrix.dispatch == 'batched':
+            posted = names if all(self._post_comments(pr_number, ['\n'.join(commands)])) else []
+        else:
+            posted = [name for name, commented in zip(names, self._post_comments(pr_number, commands)) if commented]
+        # Only jobs whose comment went out count as retested (and use budget)
+        self.retest_policy.record(pr_number, posted)
+        for name in posted:
+            self.github_client.check_index.unfreeze(status.head_sha, name)
+        return bool(posted)
+    
+    def last_retest(self, pr_number: int) -> Optional[datetime]:
+        """When failed jobs of the PR were last retriggered, if ever"""
+        return self.retest_policy.last_retest(pr_number) if self.retest_policy else None
+    
+    def create_single_pr(self, pr_index: int = 0) -> Tuple[bool, int, str, bool]:
+        """Create the pr_index-th PR of the run, trigger its tests and return
+        (success, pr_number, branch_name, triggered)"""
+        success, pr_number, branch_name = self.open_pr(pr_index)
+        triggered = success and self.trigger_pr_tests(pr_number, pr_index)
+        return success, pr_number, branch_name, triggered
+    
     def create_multiple_prs(self) -> List[Tuple[int, str]]:
-        """Create multiple PRs with 30-minute intervals and return list of (pr_number, branch_name)"""
+        """Create multiple PRs with PR_INTERVAL_MINUTES intervals and return list of (pr_number, branch_name)"""
         created_prs = []
         
-        self.logger.info(f"Starting to create {self.pr_count} PRs with 30-minute intervals")
+        self.logger.info(f"Starting to create {self.pr_count} PRs with {self.pr_interval_minutes}-minute intervals")
         
         for i in range(self.pr_count):
+            self.check_cancelled()
             self.logger.info(f"Creating PR {i+1}/{self.pr_count}")
             
-            success, pr_number, branch_name = self.create_single_pr()
+            success, pr_number, branch_name, triggered = self.create_single_pr(i)
             
+            self.ledger.record_attempts(self.run_id, i + 1)
             if success and pr_number:
                 created_prs.append((pr_number, branch_name))
+                # Like RunOrchestrator._trigger: a PR whose trigger comments all failed stays CREATED, untriggered
+                self.ledger.record_pr(
+                    self.run_id,
+                    PRRun(index=i, pr_number=pr_number, branch_name=branch_name,
+                          state=TRIGGERED if triggered else CREATED,
+                          triggered_at=self.triggered_at.get(pr_number) if triggered else None,
+                          base_sha=self.base_shas.get(pr_number)),
+                    self.expected_checks.get(pr_number)
+                )
+                if not triggered:
+                    self.logger.warning(f"PR #{pr_number} was created but none of its trigger comments was posted")
                 self.logger.info(f"Successfully created PR #{pr_number} with branch {branch_name}")
             else:
                 self.logger.error(f"Failed to create PR {i+1}")
             
-            # Wait 30 minutes before creating next PR (except for the last one)
+            # Wait before creating next PR (except for the last one)
             if i < self.pr_count - 1:
-                self.logger.info(f"Waiting 30 minutes before creating next PR...")
-                time.sleep(1800)  # 30 minutes = 1800 seconds
+                self.logger.info(f"Waiting {self.pr_interval_minutes} minutes before creating next PR...")
+                self.cancel_event.wait(self.pr_interval_minutes * 60)
         
         self.logger.info(f"Created {len(created_prs)} PRs out of {self.pr_count} attempts")
         return created_prs
     
     def wait_for_tests_completion(self, prs: List[Tuple[int, str]]) -> Dict[int, bool]:
-        """Wait for all PR pull_ tests to complete and return results"""
+        """Wait for all PR pull_ tests to complete, completing each PR as it finishes, and return results"""
         results = {}
+        branches = dict(prs)
+        snapshots = {}
         start_time = datetime.now()
         timeout = timedelta(hours=self.test_timeout_hours)
         
-        self.logger.info(f"Waiting for pull_ tests to complete (timeout: {self.test_timeout_hours} hours)")
+        self.logger.info(f"Waiting for pull_ tests to complete (timeout: {self.test_timeout_hours} hours after each PR's trigger)")
         
-        while datetime.now() - start_time < timeout:
-            all_complete = True
-            
+        while True:
+            # Every PR gets the full timeout from its own trigger (or latest retest), however late it was created
+            now = datetime.now()
             for pr_number, branch_name in prs:
-                if pr_number in results:
-                    continue
-                
-                # Get detailed status
-                status = self.github_client.get_pr_status(pr_number)
-                pull_checks = [check for check in status['checks'] if check['name'].startswith('pull-')]
+                if pr_number not in results and now - self.timeout_start(pr_number, start_time) >= timeout:
+                    self.logger.warning(f"PR #{pr_number} pull_ tests timed out")
+                    results[pr_number] = False
+                    self.ledger.record_result(self.run_id, pr_number, False)
+                    self.complete_pr(PRConclusion.capture(pr_number, branch_name, False, snapshots.get(pr_number),
+                                                          self.expected_checks.get(pr_number), timed_out=True))
+            
+            # One batch fetch for every pending PR that is due; everything below is evaluated on the snapshots
+            pending = [pr_number for pr_number, branch_name in prs if pr_number not in results]
+            if not pending:
+                break
+            due = self.due_for_poll(pending)
+            all_complete = len(due) == len(pending)
+            if due:
+                snapshots.update(self.collect_pr_snapshots(due))
+            
+            for pr_number in due:
+                status = snapshots[pr_number]
+                self.ledger.record_checks(self.run_id, status)
+                expected = self.expected_checks.get(pr_number)
+                pull = pull_checks(status, expected)
                 
                 # Check if pull_ tests are complete
-                if self.github_client.is_pr_tests_complete(pr_number):
-                    passed = self.github_client.are_pr_tests_passed(pr_number)
+                if self.github_client.is_pr_tests_complete(pr_number, status, expected):
+                    passed = self.github_client.are_pr_tests_passed(pr_number, status, expected)
+                    if not passed and self.retest_failed(pr_number, status, expected):
+                        all_complete = False
+                        self.schedule_next_poll(pr_number, status)
+                        continue
                     results[pr_number] = passed
                     
-                    # Log detailed results
-                    failed_checks = [check['name'] for check in pull_checks 
-                                   if check['status'] == 'completed' and check['conclusion'] not in ['success', 'skipped']]
-                    
                     if passed:
-                        self.logger.info(f"PR #{pr_number} pull_ tests PASSED - {len(pull_checks)} checks completed")
+                        self.logger.info(f"PR #{pr_number} pull_ tests PASSED - {len(pull)} checks completed")
                     else:
-                        self.logger.info(f"PR #{pr_number} pull_ tests FAILED - Failed checks: {', '.join(failed_checks)}")
+                        failed = [check['name'] for check in failed_checks(status, expected)]
+                        self.logger.info(f"PR #{pr_number} pull_ tests FAILED - Failed checks: {', '.join(failed)}")
+                    
+                    self.ledger.record_result(self.run_id, pr_number, passed)
+                    conclusion = PRConclusion.capture(pr_number, branches[pr_number], passed, status, expected)
+                    if self.complete_pr(conclusion):
+                        self.ledger.mark_cleaned_up(self.run_id, pr_number)
                 else:
                     all_complete = False
+                    self.schedule_next_poll(pr_number, status)
                     
                     # Log current status
-                    incomplete_checks = [check['name'] for check in pull_checks 
-                                       if check['status'] not in ['completed', 'skipped']]
-                    completed_checks = [check['name'] for check in pull_checks 
-                                      if check['status'] == 'completed']
-                    
-                    self.logger.debug(f"PR #{pr_number} - Completed: {len(completed_checks)}, In Progress: {len(incomplete_checks)}")
+                    self.logger.debug(f"PR #{pr_number} - Completed: {len(completed_checks(status, expected))}, "
+                                      f"In Progress: {len(incomplete_checks(status, expected))}, "
+                                      f"Not reported: {len(missing_checks(status, expected))}")
             
             if all_complete:
                 self.logger.info("All PR pull_ tests completed")
                 break
             
-            self.logger.info(f"Waiting {self.check_interval_minutes} minutes before next check...")
-            time.sleep(self.check_interval_minutes * 60)
-        
-        # Check remaining PRs that might have timed out
-        for pr_number, branch_name in prs:
-            if pr_number not in results:
-                self.logger.warning(f"PR #{pr_number} pull_ tests timed out")
-                results[pr_number] = False
+            self.wait_for_next_check(len(prs) - len(results))
         
         return results
     
+    def complete_pr(self, conclusion: PRConclusion) -> bool:
+        """Per-PR completion hook, run as soon as a PR concludes; returns True if the PR was cleaned up"""
+        self.conclusions[conclusion.pr_number] = conclusion
+        
+        if self.retest_policy is not None:
+            failed = [check['name'] for check in conclusion.failed]
+            conclusion.outcomes = self.retest_policy.classify(conclusion.pr_number, conclusion.succeeded, failed)
+            retests = {name: self.retest_policy.retest_count(conclusion.pr_number, name) for name in conclusion.outcomes}
+            self.ledger.record_job_outcomes(self.run_id, conclusion.pr_number, conclusion.outcomes, retests)
+            flaky = [name for name, outcome in conclusion.outcomes.items() if outcome == OUTCOME_FLAKY]
+            if flaky:
+                self.logger.warning(f"PR #{conclusion.pr_number} flaky jobs (passed on retry): {', '.join(flaky)}")
+        
+        try:
+            self.warehouse.record_pr(self.warehouse_run_id, conclusion, self.triggered_at.get(conclusion.pr_number),
+                                     self.base_shas.get(conclusion.pr_number))
+        except Exception as e:
+            self.logger.error(f"Failed to record PR #{conclusion.pr_number} in the results warehouse: {e}")
+        
+        cleaned_up = False
+        if conclusion.passed:
+            cleaned_up = self.cleanup_pr(conclusion.pr_number, conclusion.branch_name)
+        else:
+            self.logger.info(f"Keeping PR #{conclusion.pr_number} open (pull_ tests failed - needs manual review)")
+        
+        for hook in self.completion_hooks:
+            try:
+                hook(conclusion)
+            except Exception as e:
+                self.logger.error(f"Completion hook failed for PR #{conclusion.pr_number}: {e}")
+        
+        return cleaned_up
+    
+    def cleanup_pr(self, pr_number: int, branch_name: str) -> bool:
+        """Close a passed PR and delete its branch"""
+        self.logger.info(f"Cleaning up PR #{pr_number} (pull_ tests passed)")
+        
+        # Close PR
+        if self.github_client.close_pull_request(pr_number):
+            # Delete branch
+            self.github_client.delete_branch(branch_name)
+            self.logger.info(f"Successfully cleaned up PR #{pr_number}")
+            return True
+        
+        self.logger.error(f"Failed to close PR #{pr_number}")
+        return False
+    
     def cleanup_passed_prs(self, prs: List[Tuple[int, str]], results: Dict[int, bool]):
-        """Close PRs and delete branches for passed pull_ tests"""
+        """Close PRs and delete branches for passed pull_ tests (batch cleanup; runs clean up per PR via complete_pr)"""
         for pr_number, branch_name in prs:
             if results.get(pr_number, False):  # pull_ tests passed
-                self.logger.info(f"Cleaning up PR #{pr_number} (pull_ tests passed)")
-                
-                # Close PR
-                if self.github_client.close_pull_request(pr_number):
-                    # Delete branch
-                    self.github_client.delete_branch(branch_name)
-                    self.logger.info(f"Successfully cleaned up PR #{pr_number}")
-                else:
-                    self.logger.error(f"Failed to close PR #{pr_number}")
+                if self.cleanup_pr(pr_number, branch_name):
+                    self.ledger.mark_cleaned_up(self.run_id, pr_number)
             else:
                 self.logger.info(f"Keeping PR #{pr_number} open (pull_ tests failed - needs manual review)")
     
@@ -196,53 +646,138 @@ class StabilityTest:
         failed_prs = [(pr_number, branch_name) for pr_number, branch_name in prs 
                       if not results.get(pr_number, False)]
         
+        # Failure detail was captured when each PR concluded; only PRs without it (e.g. concluded before a resume) are fetched
+        unknown = [pr_number for pr_number, branch_name in failed_prs if pr_number not in self.conclusions]
+        snapshots = self.fetch_pr_snapshots(unknown) if unknown else {}
+        all_failed = []
+        
         for pr_number, branch_name in failed_prs:
             # Get failed test details
-            status = self.github_client.get_pr_status(pr_number)
-            pull_checks = [check for check in status['checks'] if check['name'].startswith('pull-')]
-            failed_checks = [check for check in pull_checks 
-                           if check['status'] == 'completed' and check['conclusion'] not in ['success', 'skipped']]
+            if pr_number in self.conclusions:
+                failed = self.conclusions[pr_number].failed
+                missing = self.conclusions[pr_number].missing
+            else:
+                expected = self.expected_checks.get(pr_number)
+                failed = failed_checks(snapshots[pr_number], expected)
+                missing = missing_checks(snapshots[pr_number], expected)
             
             # Generate PR link
-            pr_link = f"https://github.com/{self.github_client.repo_owner}/{self.github_client.repo_name}/pull/{pr_number}"
+            pr_link = f"https://github.com/{self.target.repo_full_name}/pull/{pr_number}"
             
             self.logger.info(f"Failed PR #{pr_number}:")
             self.logger.info(f"  Link: {pr_link}")
             
-            if failed_checks:
-                self.logger.info(f"  Failed tests ({len(failed_checks)}):")
-                for check in failed_checks:
-                    self.logger.info(f"    ❌ {check['name']}")
+            all_failed += [(pr_number, check) for check in failed]
+            if failed:
+                self.logger.info(f"  Failed tests ({len(failed)}):")
+                for check in failed:
+                    outcome = self.conclusions[pr_number].outcomes.get(check['name']) if pr_number in self.conclusions else None
+                    self.logger.info(f"    ❌ {check['name']}" + (f" ({outcome})" if outcome else ""))
                     if 'description' in check and check['description']:
                         self.logger.info(f"      Details: {check['description']}")
                     if 'target_url' in check and check['target_url']:
                         self.logger.info(f"      URL: {check['target_url']}")
+            elif missing:
+                self.logger.info(f"  Status: Expected checks never reported: {', '.join(missing)}")
             else:
                 self.logger.info(f"  Status: Tests timed out or not completed")
+            if pr_number in self.hung_jobs:
+                self.logger.info(f"  Hung jobs (past their learned deadline): {', '.join(self.hung_jobs[pr_number])}")
             self.logger.info("")
         
+        if self.failure_analyzer and all_failed:
+            for line in format_causes(self.failure_analyzer.analyze(all_failed)):
+                self.logger.info(line)
+        
         self.logger.info("=" * 60)
     
-    def run_stability_test(self):
-        """Main method to run the complete stability test"""
+    def flakiness_report(self) -> Optional[str]:
+        """Flakiest pull-cdc-* jobs over the warehouse history, for the daily report (None if unavailable)"""
+        if not self.flakiness_report_enabled:
+            return None
+        try:
+            from flakiness import score_warehouse, format_report
+            report = format_report(score_warehouse(self.warehouse, self.flakiness_report_days),
+                                   self.flakiness_report_days)
+        except Exception as e:
+            self.logger.warning(f"Flakiness report unavailable: {e}")
+            return None
+        self.logger.info(report)
+        return report
+    
+    def culprit_report(self) -> Optional[str]:
+        """Jobs whose failure rate jumped between base SHAs and the PRs merged in between (None if unavailable)"""
+        if not self.culprit_analyzer:
+            return None
+        try:
+            report = format_jumps(self.culprit_analyzer.analyze(self.culprit_analysis_days), self.culprit_analysis_days)
+        except Exception as e:
+            self.logger.warning(f"Culprit report unavailable: {e}")
+            return None
+        self.logger.info(report)
+        return report
+    
+    def history_report(self) -> Optional[str]:
+        """Analyses of past runs appended to the daily report"""
+        reports = [report for report in (self.culprit_report(), self.flakiness_report()) if report]
+        return '\n\n'.join(reports) or None
+    
+    def _finish_run(self, status: str):
+        """Mark the run finished (with status) in the ledger and the results warehouse"""
+        self.ledger.finish_run(self.run_id, status)
+        self.warehouse.finish_run(self.warehouse_run_id, status)
+    
+    def run_stability_test(self, resume_run_id: Optional[int] = None):
+        """Main method to run the complete stability test (or resume an interrupted run from the ledger)"""
         self.logger.info("=" * 50)
-        self.logger.info("Starting stability test")
+        if resume_run_id is not None:
+            self.logger.info(f"Resuming stability test run {resume_run_id}")
+        else:
+            self.logger.info("Starting stability test")
+        self.logger.info(f"Target: {self.target.name}")
         self.logger.info(f"Time: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
         self.logger.info("=" * 50)
         
         try:
-            # Step 1: Create multiple PRs with 30-minute intervals
-            created_prs = self.create_multiple_prs()
+            if self.webhook_receiver:
+                self.webhook_receiver.start()
+            
+            if resume_run_id is not None:
+                self.run_id = resume_run_id
+            else:
+                self.run_id = self.ledger.start_run(self.target.repo_full_name, self.pr_count, self.target.base_branch)
+            self.warehouse_run_id = self.warehouse.record_run(self.ledger.path, self.run_id,
+                                                              self.target.repo_full_name, self.target.base_branch)
+            
+            if self.run_mode == 'pipelined' or resume_run_id is not None:
+                # Steps 1, 2 and 4 overlap: PRs are created, monitored and cleaned up in one loop
+                orchestrator_options = dict(pr_spacing_seconds=self.pr_interval_minutes * 60, pacer=self.pacer)
+                if resume_run_id is not None:
+                    orchestrator = RunOrchestrator.resume(self, self.ledger, self.run_id, **orchestrator_options)
+                else:
+                    orchestrator = RunOrchestrator(self, ledger=self.ledger, run_id=self.run_id, **orchestrator_options)
+                runs = orchestrator.run()
+                created_prs = [(run.pr_number, run.branch_name) for run in runs]
+                test_results = orchestrator.results()
+            else:
+                # Step 1: Create multiple PRs with PR_INTERVAL_MINUTES intervals
+                created_prs = self.create_multiple_prs()
+                if created_prs:
+                    self.announce_eta()
+                test_results = {}
             
             if not created_prs:
                 self.logger.error("No PRs were created successfully")
+                self._finish_run(RUN_FINISHED)
                 return
             
-            # Step 2: Wait for pull_ tests to complete (all PRs created)
-            self.logger.info("All PRs created. Now waiting for pull_ tests to complete...")
-            test_results = self.wait_for_tests_completion(created_prs)
+            if not test_results:
+                # Step 2: Wait for pull_ tests to complete (all PRs created); passed PRs are cleaned up as they finish
+                self.logger.info("All PRs created. Now waiting for pull_ tests to complete...")
+                test_results = self.wait_for_tests_completion(created_prs)
             
             # Step 3: Process results
+            self.results = test_results
             passed_count = sum(1 for passed in test_results.values() if passed)
             failed_count = len(test_results) - passed_count
             
@@ -251,26 +786,42 @@ class StabilityTest:
             self.logger.info(f"  Pull_ tests passed: {passed_count}")
             self.logger.info(f"  Pull_ tests failed: {failed_count}")
             
+            if self.retest_policy is not None:
+                outcomes = [outcome for conclusion in self.conclusions.values() for outcome in conclusion.outcomes.values()]
+                self.logger.info(f"  Flaky jobs (passed on retry): {outcomes.count(OUTCOME_FLAKY)}")
+                self.logger.info(f"  Consistently failing jobs: {outcomes.count(OUTCOME_CONSISTENT_FAIL)}")
+                self.logger.info(f"  Retests used: {self.retest_policy.used}/{self.retest_policy.per_run_budget}")
+            
             if failed_count > 0:
                 self.logger.warning(f"⚠️  {failed_count} PR(s) failed - see failure report below for details")
             
-            # Step 4: Cleanup passed PRs (close PRs with passed pull_ tests)
-            self.cleanup_passed_prs(created_prs, test_results)
-            
-            # Step 5: Generate detailed failure report if needed
+            # Step 4: Generate detailed failure report if needed
             if failed_count > 0:
                 self.generate_failure_report(created_prs, test_results)
             
-            # Step 6: Send notifications
+            # Step 5: Send notifications
             failed_prs = [(pr_number, branch_name) for pr_number, branch_name in created_prs 
                           if not test_results.get(pr_number, False)]
             self.notification_manager.send_notification(test_results, failed_prs, 
-                                                       len(created_prs), passed_count, failed_count)
+                                                       len(created_prs), passed_count, failed_count,
+                                                       failure_details=self.conclusions,
+                                                       history_report=self.history_report())
+            
+            cache_stats = self.github_client.get_cache_stats()
+            self.logger.info(f"Conditional-request cache: {cache_stats['hits']} hits (304, not charged), "
+                             f"{cache_stats['misses']} misses, {cache_stats['evictions']} evictions")
             
+            self._finish_run(RUN_FINISHED)
             self.logger.info("Stability test completed")
             
+        except RunCancelled:
+            self.logger.warning(f"Stability test run {self.run_id} cancelled")
+            if self.run_id is not None:
+                self._finish_run(RUN_CANCELLED)
         except Exception as e:
             self.logger.error(f"Stability test failed with error: {e}")
+            if self.run_id is not None:
+                self._finish_run(RUN_FAILED)
             
             # Send error notification
             try:
@@ -280,6 +831,10 @@ class StabilityTest:
                 self.logger.error(f"Failed to send error notification: {notify_error}")
             
             raise
+        finally:
+            self._close_async_client()
+            if self.webhook_receiver:
+                self.webhook_receiver.stop()
 
 def main():
     """Main entry point"""
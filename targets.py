@@ -0,0 +1,187 @@
+"""
+Stability test targets and multi-target runs.
+
+A target is (repository, base branch, trigger matrix, PR count). Several
+targets can run in one process: each gets its own StabilityTest (own ledger
+run, results and report) on its own thread, while all of them share one
+GitHub connection pool, conditional-request cache and rate-limit governor,
+and a single webhook receiver that routes deliveries by repository.
+
+Example targets.json (TARGETS_FILE):
+
+    [
+      {"repo": "pingcap/ticdc", "base_branch": "master", "pr_count": 10},
+      {"repo": "pingcap/ticdc", "base_branch": "release-8.5", "pr_count": 3,
+       "trigger_matrix": "trigger_matrix.release.json"}
+    ]
+"""
+
+import os
+import json
+import logging
+import threading
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from github_client import GitHubClient
+from rate_limiter import RateLimitGovernor
+from trigger_matrix import TriggerMatrix
+from webhook_receiver import WebhookReceiver
+
+
+@dataclass(frozen=True)
+class StabilityTarget:
+    """One repository/base branch to put stability load on"""
+    repo_owner: str
+    repo_name: str
+    base_branch: str = 'master'
+    pr_count: int = 10
+    trigger_matrix_file: Optional[str] = None
+
+    @property
+    def repo_full_name(self) -> str:
+        return f"{self.repo_owner}/{self.repo_name}"
+
+    @property
+    def name(self) -> str:
+        return f"{self.repo_full_name}@{self.base_branch}"
+
+    @classmethod
+    def from_env(cls) -> 'StabilityTarget':
+        """The single target described by REPO_OWNER/REPO_NAME/BASE_BRANCH/PR_COUNT/TRIGGER_MATRIX_FILE"""
+        return cls(
+            repo_owner=os.getenv('REPO_OWNER'),
+            repo_name=os.getenv('REPO_NAME'),
+            base_branch=os.getenv('BASE_BRANCH', 'master'),
+            pr_count=int(os.getenv('PR_COUNT', 10)),
+            trigger_matrix_file=os.getenv('TRIGGER_MATRIX_FILE')
+        )
+
+    @classmethod
+    def from_dict(cls, config: Dict) -> 'StabilityTarget':
+        repo_owner, repo_name = config['repo'].split('/', 1)
+        return cls(
+            repo_owner=repo_owner,
+            repo_name=repo_name,
+            base_branch=config.get('base_branch', 'master'),
+            pr_count=int(config.get('pr_count', os.getenv('PR_COUNT', 10))),
+            trigger_matrix_file=config.get('trigger_matrix', os.getenv('TRIGGER_MATRIX_FILE'))
+        )
+
+    def load_trigger_matrix(self) -> TriggerMatrix:
+        return TriggerMatrix.from_env(self.trigger_matrix_file)
+
+
+def load_targets(path: Optional[str] = None) -> List[StabilityTarget]:
+    """Targets from TARGETS_FILE (a JSON list), or the single target from the environment"""
+    path = path or os.getenv('TARGETS_FILE')
+    if not path:
+        return [StabilityTarget.from_env()]
+    with open(path) as f:
+        return [StabilityTarget.from_dict(config) for config in json.load(f)]
+
+
+def find_target(repo_full_name: str, base_branch: str, pr_count: int) -> StabilityTarget:
+    """The configured target for a repo/base branch (e.g. of a run being resumed), or a default one"""
+    for target in load_targets():
+        if target.repo_full_name == repo_full_name and target.base_branch == base_branch:
+            return target
+    repo_owner, repo_name = repo_full_name.split('/', 1)
+    return StabilityTarget(repo_owner, repo_name, base_branch, pr_count, os.getenv('TRIGGER_MATRIX_FILE'))
+
+
+class MultiTargetRun:
+    """Runs every target concurrently in one process with a shared rate-limit budget and caches
+    (or resumes their interrupted runs, resume_run_ids[i] being the ledger run of targets[i])"""
+
+    def __init__(self, targets: List[StabilityTarget], cancel_event: Optional[threading.Event] = None,
+                 webhook_receiver: Optional[WebhookReceiver] = None, resume_run_ids: Optional[List[int]] = None):
+        self.targets = targets
+        self.resume_run_ids = resume_run_ids or [None] * len(targets)
+        self.cancel_event = cancel_event or threading.Event()
+        self.tests = []
+        # A receiver passed in is shared with other runs and started/stopped by its owner (the scheduler)
+        self.webhook_receiver = webhook_receiver
+        self.owns_receiver = webhook_receiver is None
+        self.logger = logging.getLogger(__name__)
+
+    @property
+    def run_id(self) -> List[int]:
+        """Ledger run ids, one per target"""
+        return [test.run_id for test in self.tests if test.run_id is not None]
+
+    def cancel(self):
+        self.cancel_event.set()
+        for test in self.tests:
+            test.cancel()
+
+    def progress(self) -> Dict[str, Dict]:
+        """Live progress and ETA per target (per run where a target has several, e.g. resumed runs)"""
+        names = [test.target.name for test in self.tests]
+        return {name if names.count(name) == 1 else f"{name} (run {test.run_id})": test.progress()
+                for name, test in zip(names, self.tests)}
+
+    def _build(self):
+        # Imported here: stability_test imports this module for its default target
+        from stability_test import StabilityTest
+
+        load_dotenv('config.env')
+        first = self.targets[0]
+        root_client = GitHubClient(
+            token=os.getenv('GITHUB_TOKEN'),
+            username=os.getenv('GITHUB_USERNAME'),
+            repo_owner=first.repo_owner,
+            repo_name=first.repo_name,
+            status_backend=os.getenv('STATUS_BACKEND', 'graphql'),
+            governor=RateLimitGovernor(write_reserve=float(os.getenv('RATE_LIMIT_WRITE_RESERVE', 0.2))),
+            timeout=float(os.getenv('GITHUB_TIMEOUT', 30)),
+            base_branch=first.base_branch
+        )
+
+        # One receiver for all targets; deliveries are routed to a store per repository
+        if self.owns_receiver:
+            self.webhook_receiver = WebhookReceiver.from_env()
+
+        for index, target in enumerate(self.targets):
+            # Each target gets its own connections; the governor (and its budget) is shared
+            client = root_client if index == 0 else root_client.for_target(
+                target.repo_owner, target.repo_name, target.base_branch
+            )
+            store = self.webhook_receiver.store_for_repo(target.repo_full_name) if self.webhook_receiver else None
+            self.tests.append(StabilityTest(
+                cancel_event=self.cancel_event,
+                target=target,
+                github_client=client,
+                webhook_store=store,
+                label_reports=True
+            ))
+
+    def _run_target(self, test, resume_run_id: Optional[int]):
+        try:
+            test.run_stability_test(resume_run_id=resume_run_id)
+        except Exception as e:
+            # run_stability_test already logged it and sent the error notification
+            self.logger.error(f"Target {test.target.name} failed: {e}")
+
+    def run(self) -> Dict[str, Dict[int, bool]]:
+        """Run all targets to completion and return the results per target"""
+        self._build()
+        self.logger.info(f"Running {len(self.tests)} targets: {', '.join(target.name for target in self.targets)}")
+
+        if self.webhook_receiver and self.owns_receiver:
+            self.webhook_receiver.start()
+        try:
+            threads = [threading.Thread(target=self._run_target, args=(test, resume_run_id),
+                                        name=f"target-{test.target.name}")
+                       for test, resume_run_id in zip(self.tests, self.resume_run_ids)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            if self.webhook_receiver and self.owns_receiver:
+                self.webhook_receiver.stop()
+
+        return {test.target.name: test.results for test in self.tests}
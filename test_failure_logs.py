@@ -0,0 +1,63 @@
+#!/usr/bin/env python3
+"""
+Test script to cluster failure signatures of recorded build logs served by a local HTTP stand-in (offline)
+"""
+
+import os
+import sys
+import tempfile
+import threading
+from functools import partial
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from failure_logs import FailureLogAnalyzer, format_causes
+from log_cache import LogCache
+
+LOG_SAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testdata', 'logs')
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+def test_failure_logs(directory: str = LOG_SAMPLES):
+    """Serve every recorded log in directory and analyze them as failed checks of two PRs"""
+    server = ThreadingHTTPServer(('127.0.0.1', 0), partial(QuietHandler, directory=directory))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base_url = f"http://127.0.0.1:{server.server_port}"
+
+    try:
+        logs = sorted(name for name in os.listdir(directory) if name.endswith('.log'))
+        failed = [(1703 + index % 2, {'name': name[:-len('.log')], 'target_url': f"{base_url}/{name}",
+                                      'description': 'Jenkins job failed'})
+                  for index, name in enumerate(logs)]
+        # A log the stand-in does not have falls back to the status description
+        failed.append((1705, {'name': 'pull-cdc-mysql-integration-light', 'target_url': f"{base_url}/missing.log",
+                              'description': 'Jenkins job failed'}))
+
+        print(f"Analyzing {len(failed)} failed checks served from {base_url}")
+        log_cache = LogCache(tempfile.mkdtemp(prefix='log_cache_'))
+        analyzer = FailureLogAnalyzer(log_cache)
+        causes = analyzer.analyze(failed)
+        # The recorded logs share 3 causes between them; the missing log is a cause of its own
+        assert len(causes) == 4, f"expected 4 causes, got {len(causes)}"
+        assert sum(len(cause.failures) for cause in causes) == len(failed)
+
+        for cause in causes:
+            for failure in cause.failures:
+                print(f"  PR #{failure.pr_number} {failure.name} (fetched: {failure.fetched}, "
+                      f"fingerprint {failure.fingerprint:016x})")
+                for signature in failure.signatures:
+                    print(f"    - {signature}")
+        print()
+        print('\n'.join(format_causes(causes)))
+
+        # A re-run report reads the same logs from the on-disk cache
+        downloaded = log_cache.stats()
+        assert downloaded['hits'] == 0 and downloaded['logs'] == len(logs)
+        assert len(analyzer.analyze(failed)) == len(causes)
+        assert log_cache.stats()['hits'] == len(logs), log_cache.stats()
+        log_cache.close()
+    finally:
+        server.shutdown()
+
+if __name__ == "__main__":
+    test_failure_logs(sys.argv[1] if len(sys.argv) > 1 else LOG_SAMPLES)
@@ -39,7 +39,7 @@ def test_retest_comment():
         
         # Create a single test PR
         logger.info("Creating test PR with /retest all comment...")
-        success, pr_number, branch_name = stability_test.create_single_pr()
+        success, pr_number, branch_name, triggered = stability_test.create_single_pr()
         
         if success and pr_number:
             logger.info(f"✅ Successfully created test PR #{pr_number}")
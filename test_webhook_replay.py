@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Test script to replay recorded webhook deliveries into a local receiver (offline)
+"""
+
+import os
+import sys
+from webhook_receiver import PRStateStore, WebhookReceiver, replay_payloads
+from pr_status import is_tests_complete, are_tests_passed, pull_checks
+
+WEBHOOK_SAMPLES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testdata', 'webhooks')
+
+def test_webhook_replay(directory: str = WEBHOOK_SAMPLES, pr_number: int = 1703):
+    """Replay every recorded delivery in directory and show the resulting PR state"""
+    secret = 'replay-secret'
+    store = PRStateStore()
+    store.track(pr_number)
+    
+    receiver = WebhookReceiver(store, secret, host='127.0.0.1', port=0)
+    receiver.start()
+    
+    try:
+        print(f"Replaying deliveries from {directory} into {receiver.url}")
+        statuses = replay_payloads(receiver.url, secret, directory)
+        assert statuses and all(status == 202 for status in statuses), f"receiver answered {statuses}"
+        
+        # A delivery signed with the wrong secret must be rejected
+        rejected = replay_payloads(receiver.url, 'wrong-secret', directory)
+        assert rejected == [401] * len(statuses), f"bad signatures answered {rejected}"
+        
+        status = store.snapshot(pr_number)
+        print(f"\nPR #{pr_number} state: {status.state} (head {status.commit_sha})")
+        for check in pull_checks(status):
+            print(f"  - {check['name']}: {check['status']} -> {check['conclusion']}")
+        print(f"Pull_ Tests Complete: {is_tests_complete(status)}")
+        print(f"Pull_ Tests Passed: {are_tests_passed(status)}")
+        assert pull_checks(status), "no pull_ checks applied from the deliveries"
+    finally:
+        receiver.stop()
+
+if __name__ == "__main__":
+    test_webhook_replay(sys.argv[1] if len(sys.argv) > 1 else WEBHOOK_SAMPLES)
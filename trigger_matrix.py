@@ -0,0 +1,115 @@
+"""
+Declarative CI trigger matrix.
+
+Defines which jobs a stability PR triggers, the comment command for each job,
+optional per-PR job subsets and how the commands are dispatched (one comment
+per command, or all of a PR's commands in one multi-line comment, which Prow
+accepts). The same matrix is the expected check set used for pass/fail.
+
+Example trigger_matrix.json:
+
+    {
+      "dispatch": "batched",
+      "jobs": [
+        {"name": "pull-cdc-mysql-integration-heavy"},
+        {"name": "pull-cdc-mysql-integration-light", "command": "/test pull-cdc-mysql-integration-light"}
+      ],
+      "pr_subsets": [
+        ["pull-cdc-mysql-integration-heavy", "pull-cdc-mysql-integration-light"],
+        ["pull-cdc-mysql-integration-light"]
+      ]
+    }
+"""
+
+import os
+import json
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+DEFAULT_JOB_NAMES = [
+    "pull-cdc-kafka-integration-heavy",
+    "pull-cdc-kafka-integration-light",
+    "pull-cdc-mysql-integration-heavy",
+    "pull-cdc-mysql-integration-light",
+    "pull-cdc-storage-integration-heavy",
+    "pull-cdc-storage-integration-light",
+    "pull-cdc-mysql-integration-light-next-gen"
+]
+
+DISPATCH_MODES = ('separate', 'batched')
+
+
+@dataclass(frozen=True)
+class TriggerJob:
+    """One CI job and the comment command that triggers it"""
+    name: str
+    command: str
+
+
+class TriggerMatrix:
+    """Jobs to trigger per PR, how to dispatch them and which checks to expect"""
+
+    def __init__(self, jobs: List[TriggerJob], pr_subsets: Optional[List[List[str]]] = None,
+                 dispatch: str = 'separate'):
+        if dispatch not in DISPATCH_MODES:
+            raise ValueError(f"Unknown trigger dispatch mode: {dispatch}")
+        self.jobs = jobs
+        self.jobs_by_name = {job.name: job for job in jobs}
+        self.pr_subsets = pr_subsets or []
+        self.dispatch = dispatch
+
+        for subset in self.pr_subsets:
+            unknown = [name for name in subset if name not in self.jobs_by_name]
+            if unknown:
+                raise ValueError(f"PR subset references unknown jobs: {', '.join(unknown)}")
+
+    @classmethod
+    def default(cls, dispatch: str = 'separate') -> 'TriggerMatrix':
+        """The seven pull-cdc-* integration jobs, each triggered with /test <job>"""
+        return cls([TriggerJob(name, f"/test {name}") for name in DEFAULT_JOB_NAMES], dispatch=dispatch)
+
+    @classmethod
+    def from_dict(cls, config: Dict) -> 'TriggerMatrix':
+        jobs = [TriggerJob(job['name'], job.get('command', f"/test {job['name']}")) for job in config['jobs']]
+        return cls(jobs, config.get('pr_subsets'), config.get('dispatch', 'separate'))
+
+    @classmethod
+    def load(cls, path: str) -> 'TriggerMatrix':
+        with open(path) as f:
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def from_env(cls, path: Optional[str] = None) -> 'TriggerMatrix':
+        """Load path or TRIGGER_MATRIX_FILE if set (else the default jobs); TRIGGER_DISPATCH overrides dispatch"""
+        path = path or os.getenv('TRIGGER_MATRIX_FILE')
+        matrix = cls.load(path) if path else cls.default()
+        dispatch = os.getenv('TRIGGER_DISPATCH')
+        if dispatch:
+            matrix = cls(matrix.jobs, matrix.pr_subsets, dispatch)
+        return matrix
+
+    def jobs_for_pr(self, pr_index: int) -> List[TriggerJob]:
+        """Jobs triggered on the pr_index-th PR of a run (subsets are used round-robin)"""
+        if not self.pr_subsets:
+            return list(self.jobs)
+        subset = self.pr_subsets[pr_index % len(self.pr_subsets)]
+        return [self.jobs_by_name[name] for name in subset]
+
+    def commands_for_pr(self, pr_index: int) -> List[str]:
+        return [job.command for job in self.jobs_for_pr(pr_index)]
+
+    def comments_for_pr(self, pr_index: int) -> List[str]:
+        """Comment bodies to post: one per command, or a single multi-line comment when batched"""
+        commands = self.commands_for_pr(pr_index)
+        if self.dispatch == 'batched':
+            return ['\n'.join(commands)]
+        return commands
+
+    def expected_checks(self, pr_index: int) -> List[str]:
+        """Check names the pass/fail logic waits for on the pr_index-th PR"""
+        return [job.name for job in self.jobs_for_pr(pr_index)]
+
+    def command_for(self, job_name: str) -> str:
+        """Comment command that (re)triggers a job"""
+        job = self.jobs_by_name.get(job_name)
+        return job.command if job else f"/test {job_name}"
@@ -0,0 +1,258 @@
+"""
+Webhook ingestion for check_run, status and pull_request events.
+
+A small local HTTP receiver verifies GitHub's HMAC signature and updates the
+run's in-memory PR state, so results are seen as soon as they are reported
+instead of on the next poll. The monitoring loop only falls back to a slow
+reconciliation poll. Recorded payloads can be replayed into the receiver to
+test it offline.
+"""
+
+import os
+import hmac
+import json
+import hashlib
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+
+import requests
+
+from pr_status import PRStatus, check_run_to_check, status_to_check
+
+HANDLED_EVENTS = ('check_run', 'status', 'pull_request', 'ping')
+
+
+def sign_payload(secret: str, body: bytes) -> str:
+    """Return the X-Hub-Signature-256 header value GitHub would send for body"""
+    digest = hmac.new(secret.encode('utf-8'), body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    """Check an X-Hub-Signature-256 header against the shared secret"""
+    if not signature:
+        return False
+    return hmac.compare_digest(sign_payload(secret, body), signature)
+
+
+class PRStateStore:
+    """Thread-safe in-memory PR state fed by webhook events and reconciliation polls"""
+
+    def __init__(self):
+        self.prs = {}
+        self.head_to_pr = {}
+        self.checks = {}
+        self.condition = threading.Condition()
+        self.version = 0
+        self.logger = logging.getLogger(__name__)
+
+    def track(self, pr_number: int, head_sha: Optional[str] = None):
+        """Start tracking a PR of the run (events for other PRs are ignored)"""
+        with self.condition:
+            self.prs.setdefault(pr_number, {'state': 'open', 'merged': False, 'head_sha': None})
+            if head_sha:
+                self._set_head(pr_number, head_sha)
+
+    def _set_head(self, pr_number: int, head_sha: str):
+        self.prs[pr_number]['head_sha'] = head_sha
+        self.head_to_pr[head_sha] = pr_number
+        self.checks.setdefault(head_sha, {})
+
+    def _notify(self):
+        self.version += 1
+        self.condition.notify_all()
+
+    def reconcile(self, status: PRStatus):
+        """Replace a PR's state with a freshly polled snapshot"""
+        if status.state == 'unknown':
+            return
+        with self.condition:
+            self.prs[status.pr_number] = {'state': status.state, 'merged': status.merged, 'head_sha': None}
+            if status.head_sha:
+                self._set_head(status.pr_number, status.head_sha)
+                self.checks[status.head_sha] = {check['name']: dict(check) for check in status.checks}
+            self._notify()
+
+    def apply_event(self, event: str, payload: Dict) -> bool:
+        """Apply one webhook event; returns True if it touched a tracked PR"""
+        with self.condition:
+            if event == 'pull_request':
+                pr = payload['pull_request']
+                if pr['number'] not in self.prs:
+                    return False
+                self.prs[pr['number']].update(state=pr['state'], merged=pr.get('merged', False))
+                self._set_head(pr['number'], pr['head']['sha'])
+            elif event == 'check_run':
+                check_run = payload['check_run']
+                if not self._store_check(check_run['head_sha'], check_run_to_check(check_run)):
+                    return False
+            elif event == 'status':
+                if not self._store_check(payload['sha'], status_to_check(payload)):
+                    return False
+            else:
+                return False
+            self._notify()
+            return True
+
+    def _store_check(self, head_sha: str, check: Dict) -> bool:
+        """Store a check for a tracked head SHA, ignoring events older than what we have"""
+        if head_sha not in self.head_to_pr:
+            return False
+        checks = self.checks[head_sha]
+        current = checks.get(check['name'])
+        if current is not None:
+            current_time = current.get('completed_at') or current.get('started_at')
+            new_time = check.get('completed_at') or check.get('started_at')
+            if current_time and new_time and new_time < current_time:
+                return False
+        checks[check['name']] = check
+        return True
+
+    def snapshot(self, pr_number: int) -> PRStatus:
+        """Build a snapshot of a tracked PR from the events received so far"""
+        with self.condition:
+            pr = self.prs.get(pr_number)
+            if pr is None:
+                return PRStatus.unknown(pr_number)
+            head_sha = pr['head_sha']
+            checks = list(self.checks.get(head_sha, {}).values()) if head_sha else []
+            return PRStatus.build(pr_number, pr['state'], checks, merged=pr['merged'], head_sha=head_sha)
+
+    def wake(self):
+        """Wake anyone blocked in wait_for_change (e.g. the run was cancelled)"""
+        with self.condition:
+            self._notify()
+
+    def wait_for_change(self, since_version: int, timeout: float) -> int:
+        """Block until an event arrives after since_version (or timeout) and return the new version"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != since_version, timeout=timeout)
+            return self.version
+
+
+class WebhookReceiver:
+    """Local HTTP endpoint that verifies and ingests GitHub webhook deliveries"""
+
+    def __init__(self, store: Optional[PRStateStore], secret: str, host: str = '127.0.0.1', port: int = 8080):
+        self.store = store
+        self.routes = {}
+        self.routes_lock = threading.Lock()
+        self.secret = secret
+        self.host = host
+        self.port = port
+        self.server = None
+        self.thread = None
+        self.logger = logging.getLogger(__name__)
+
+    @classmethod
+    def from_env(cls, store: Optional[PRStateStore] = None) -> Optional['WebhookReceiver']:
+        """The receiver configured by WEBHOOK_*, or None if disabled or no WEBHOOK_SECRET is set
+        (unsigned deliveries could then fake results)"""
+        if os.getenv('WEBHOOK_ENABLED', 'false').lower() != 'true':
+            return None
+        secret = os.getenv('WEBHOOK_SECRET', '')
+        if not secret:
+            logging.getLogger(__name__).warning("WEBHOOK_ENABLED is set but WEBHOOK_SECRET is empty; "
+                                                "not starting the webhook receiver, polling instead")
+            return None
+        return cls(store, secret=secret, host=os.getenv('WEBHOOK_HOST', '127.0.0.1'),
+                   port=int(os.getenv('WEBHOOK_PORT', 8080)))
+
+    def add_route(self, repo_full_name: str, store: PRStateStore):
+        """Send deliveries for repo_full_name to store instead of the default one"""
+        with self.routes_lock:
+            self.routes[repo_full_name] = store
+
+    def store_for_repo(self, repo_full_name: str) -> PRStateStore:
+        """The store deliveries for repo_full_name are routed to, created on first use
+        (runs of the same repo share it: PR numbers do not collide within a repo)"""
+        with self.routes_lock:
+            if repo_full_name not in self.routes:
+                self.routes[repo_full_name] = PRStateStore()
+            return self.routes[repo_full_name]
+
+    def _store_for(self, payload: Dict) -> Optional[PRStateStore]:
+        repository = payload.get('repository') or {}
+        with self.routes_lock:
+            return self.routes.get(repository.get('full_name'), self.store)
+
+    def handle(self, event: str, body: bytes, signature: Optional[str]) -> int:
+        """Process one delivery and return the HTTP status to answer with"""
+        if not verify_signature(self.secret, body, signature):
+            self.logger.warning(f"Rejected {event} webhook with invalid signature")
+            return 401
+        if event not in HANDLED_EVENTS:
+            return 204
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            return 400
+        store = self._store_for(payload)
+        if event == 'ping' or store is None:
+            return 202
+        try:
+            if store.apply_event(event, payload):
+                self.logger.debug(f"Applied {event} webhook")
+        except (KeyError, TypeError, ValueError) as e:
+            self.logger.warning(f"Rejected malformed {event} webhook: {e!r}")
+            return 400
+        return 202
+
+    def _make_handler(self):
+        receiver = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                body = self.rfile.read(length)
+                status = receiver.handle(
+                    self.headers.get('X-GitHub-Event', ''),
+                    body,
+                    self.headers.get('X-Hub-Signature-256')
+                )
+                self.send_response(status)
+                self.end_headers()
+
+            def log_message(self, format, *args):
+                receiver.logger.debug(f"Webhook {self.address_string()} - {format % args}")
+
+        return Handler
+
+    def start(self):
+        """Start serving in a background thread"""
+        self.server = ThreadingHTTPServer((self.host, self.port), self._make_handler())
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        self.logger.info(f"Webhook receiver listening on http://{self.host}:{self.port}")
+
+    def stop(self):
+        """Stop serving"""
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/"
+
+
+def replay_payloads(url: str, secret: str, directory: str) -> List[int]:
+    """POST recorded deliveries ({"event": ..., "payload": {...}} files, in name order) to a receiver"""
+    statuses = []
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith('.json'):
+            continue
+        with open(os.path.join(directory, filename), 'rb') as f:
+            delivery = json.load(f)
+        body = json.dumps(delivery['payload']).encode('utf-8')
+        response = requests.post(url, data=body, headers={
+            'Content-Type': 'application/json',
+            'X-GitHub-Event': delivery['event'],
+            'X-Hub-Signature-256': sign_payload(secret, body)
+        })
+        statuses.append(response.status_code)
+    return statuses